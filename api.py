@@ -0,0 +1,349 @@
+#----------------------------------------------------------------------------#
+# JSON API (/api/v1).
+#
+#   GET /api/v1/venues?fields=id,name,num_upcoming_shows&city=&state=&genre=
+#   GET /api/v1/venues/3?fields=name,upcoming_shows
+#   GET /api/v1/venues/search?q=hop&page=2
+#   GET /api/v1/artists ...             (same shape as venues)
+#   GET /api/v1/shows?fields=start_time,venue_name&city=&cursor=...
+#   GET /api/v1/venues/nearby?lat=&lng=&radius=    (or ?city=&state=)
+#   GET /api/v1/shows/nearby?lat=&lng=&radius=
+#   GET /api/v1/availability?venue_id=3,4&artist_id=7&from=2026-11-01&to=2026-12-01&min_minutes=120
+#
+# `fields` selects the columns to return and only those columns are queried;
+# show queries are added only when a field needs them.
+# Lists are keyset paginated: pass the response's `next_cursor` back as
+# `cursor`. Rows come straight from column queries, no ORM objects are built.
+# Responses are compressed with brotli (when installed) or gzip according to
+# Accept-Encoding.
+#----------------------------------------------------------------------------#
+
+import gzip
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from geo import parse_origin
+from instrumentation import query_budget
+from pagination import decode_cursor, decode_id_cursor, encode_cursor, encode_id_cursor
+
+try:
+    import orjson
+except ImportError:     # optional: the standard library encoder is used instead
+    orjson = None
+    import json
+
+try:
+    import brotli
+except ImportError:     # optional: gzip only
+    brotli = None
+
+
+VENUE_FIELDS = (
+    'id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website_link', 'seeking_talent', 'seeking_description',
+    'num_upcoming_shows', 'upcoming_shows_count', 'past_shows_count',
+    'latitude', 'longitude',
+)
+ARTIST_FIELDS = (
+    'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website_link', 'seeking_venue', 'seeking_description',
+    'num_upcoming_shows', 'upcoming_shows_count', 'past_shows_count',
+)
+SHOW_FIELDS = (
+    'id', 'start_time', 'venue_id', 'venue_name', 'venue_image_link',
+    'artist_id', 'artist_name', 'artist_image_link',
+)
+DETAIL_SHOW_FIELDS = ('upcoming_shows', 'past_shows')
+LIST_DEFAULT = ('id', 'name', 'city', 'state')
+SHOW_DEFAULT = ('id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name')
+
+
+# Serialization
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def serialize(rows, fields):
+    # Column query rows -> dicts. Only the genres column needs converting
+    # (the comma-joined copy becomes a list), everything else is copied as is.
+    data = [dict(zip(fields, row)) for row in rows]
+    if 'genres' in fields:
+        for item in data:
+            item['genres'] = item['genres'].split(',') if item['genres'] else []
+    return data
+
+
+def compress(response):
+    # Compress JSON bodies for clients that accept it, brotli first
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < current_app.config.get('API_COMPRESS_MIN_SIZE', 500):
+        return response
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+# Request arguments
+
+def requested_fields(available, default):
+    raw = request.args.get('fields')
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        abort(400, f"unknown fields: {', '.join(unknown)}")
+    # The id is always returned, it is what clients link with
+    return fields if 'id' in fields else ('id',) + fields
+
+
+def page_size():
+    config = current_app.config
+    limit = request.args.get('limit', config.get('API_PAGE_SIZE', 50), type=int)
+    return min(max(limit, 1), config.get('API_MAX_PAGE_SIZE', 200))
+
+
+def cursor_arg(name, decode):
+    try:
+        return decode(request.args.get(name))
+    except ValueError:
+        abort(400, f'invalid {name}')
+
+
+def id_list(name):
+    # ?venue_id=3&venue_id=4 or ?venue_id=3,4
+    try:
+        return list(dict.fromkeys(int(value) for values in request.args.getlist(name)
+                                  for value in values.split(',') if value.strip()))
+    except ValueError:
+        abort(400, f'invalid {name}')
+
+
+def time_arg(name, default):
+    # ISO date or date and time, without a UTC offset: show times are
+    # stored naive, so an aware value could not be compared with them
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, f'invalid {name}')
+    if moment.tzinfo is not None:
+        abort(400, f'invalid {name}: give a local time without a UTC offset')
+    return moment
+
+
+def create_api(db, Venue, Artist, Shows, CalendarEntry, detail_shows, venue_search, artist_search,
+               venue_locator, schedule, show_calendar):
+    # `detail_shows`, the searches, the locator and the schedule are the
+    # ones the HTML pages use; show listings read the show calendar
+    # (show_calendar.py). Deleted venues and artists are left out everywhere.
+    api = Blueprint('api', __name__, url_prefix='/api/v1')
+    api.after_request(compress)
+
+    def http_error(error):
+        return json_response({'error': {'status': error.code, 'message': error.description}},
+                             status=error.code)
+
+    # By status code: the app's own 404/500 handlers would otherwise render HTML
+    for code in (400, 404, 405, 500):
+        api.register_error_handler(code, http_error)
+
+    def entity_columns(model, fields):
+        # num_upcoming_shows is the name the HTML listings use for the counter
+        return [model.upcoming_shows_count if field == 'num_upcoming_shows'
+                else getattr(model, field) for field in fields]
+
+    def entity_routes(name, model, fields_available, show_fk, counterpart, counterpart_fk,
+                      prefix, search):
+        # list, detail and search endpoints for venues or artists
+
+        @query_budget(1)
+        def listing():
+            fields = requested_fields(fields_available, LIST_DEFAULT)
+            after = cursor_arg('cursor', decode_id_cursor)
+            limit = page_size()
+            query = db.session.query(*entity_columns(model, fields)).filter(model.deleted_at.is_(None))
+            for column in ('city', 'state'):
+                if request.args.get(column):
+                    query = query.filter(getattr(model, column) == request.args[column])
+            if request.args.get('genre'):
+                query = query.filter(model.genre_list.any(name=request.args['genre']))
+            if after is not None:
+                query = query.filter(model.id > after)
+            rows = query.order_by(model.id).limit(limit + 1).all()
+            next_cursor = None
+            if len(rows) > limit:
+                next_cursor = encode_id_cursor(rows[limit - 1][fields.index('id')])
+            return json_response({'data': serialize(rows[:limit], fields),
+                                  'next_cursor': next_cursor})
+
+        @query_budget(3)
+        def detail(entity_id):
+            fields = requested_fields(fields_available + DETAIL_SHOW_FIELDS,
+                                      fields_available + DETAIL_SHOW_FIELDS)
+            columns = [field for field in fields if field not in DETAIL_SHOW_FIELDS]
+            row = db.session.query(*entity_columns(model, columns)).filter(
+                model.id == entity_id, model.deleted_at.is_(None)).first()
+            if row is None:
+                abort(404, f'{name[:-1]} {entity_id} not found')
+            data = serialize([row], columns)[0]
+
+            if any(field in DETAIL_SHOW_FIELDS for field in fields):
+                shows = detail_shows(
+                    show_fk, entity_id, counterpart, counterpart_fk, prefix,
+                    upcoming_after=cursor_arg('upcoming_after', decode_cursor),
+                    past_before=cursor_arg('past_before', decode_cursor),
+                )
+                for field in DETAIL_SHOW_FIELDS:
+                    if field in fields:
+                        data[field] = shows[field]
+                if 'upcoming_shows' in fields:
+                    data['upcoming_cursor'] = shows['upcoming_cursor']
+                if 'past_shows' in fields:
+                    data['past_cursor'] = shows['past_cursor']
+            return json_response(data)
+
+        @query_budget(3)
+        def search_view():
+            # Ranked results cannot be keyset paginated, so search pages by number
+            term = request.args.get('q', '')
+            page = max(request.args.get('page', 1, type=int), 1)
+            if page > current_app.config.get('MAX_PAGE', 1000):
+                abort(400, 'invalid page')
+            per_page = page_size()
+            results = search.search(term, page=page, per_page=per_page)
+            return json_response({
+                'count': results['count'],
+                'data': results['data'],
+                'next_page': page + 1 if page * per_page < results['count'] else None,
+            })
+
+        api.add_url_rule(f'/{name}', f'{name}', listing)
+        api.add_url_rule(f'/{name}/<int:entity_id>', f'{name}_detail', detail)
+        api.add_url_rule(f'/{name}/search', f'{name}_search', search_view)
+
+    def origin():
+        config = current_app.config
+        try:
+            return parse_origin(request.args, venue_locator.gazetteer,
+                                config.get('NEARBY_RADIUS_MILES', 25), config.get('NEARBY_MAX_RADIUS', 500))
+        except (KeyError, ValueError) as error:
+            abort(400, f'invalid location: {error}')
+
+    @api.route('/venues/nearby')
+    @query_budget(1)
+    def venues_nearby():
+        # Venues within the radius, nearest first, with `distance` in miles
+        latitude, longitude, radius = origin()
+        return json_response({'data': venue_locator.nearby(latitude, longitude, radius,
+                                                           limit=page_size())})
+
+    @api.route('/shows/nearby')
+    @query_budget(2)
+    def shows_nearby():
+        # The next shows (?per_venue=, default 3) at venues within the
+        # radius, nearest venue first
+        latitude, longitude, radius = origin()
+        per_venue = min(max(request.args.get('per_venue', 3, type=int), 1), 20)
+        limit = page_size()
+        # A page never needs shows from more than `limit` venues
+        venues = venue_locator.nearby(latitude, longitude, radius, limit=limit)
+        return json_response({'data': venue_locator.nearby_shows(
+            venues, datetime.now(), per_venue=per_venue, limit=limit)})
+
+    @api.route('/availability')
+    @query_budget(2)
+    def availability():
+        # Free time between ?from= and ?to= (default: the next 30 days) for
+        # each ?venue_id= and ?artist_id=, as gaps of at least ?min_minutes=
+        # between their shows. One query per kind, whatever the number of
+        # ids; ids with no shows are free throughout.
+        config = current_app.config
+        ids = {'venues': id_list('venue_id'), 'artists': id_list('artist_id')}
+        if not any(ids.values()):
+            abort(400, 'venue_id or artist_id is required')
+        if sum(map(len, ids.values())) > config.get('AVAILABILITY_MAX_IDS', 100):
+            abort(400, 'too many ids')
+        max_days = config.get('AVAILABILITY_MAX_DAYS', 92)
+        try:
+            start = time_arg('from', datetime.now().replace(second=0, microsecond=0))
+            end = time_arg('to', start + timedelta(days=30))
+            valid = start < end <= start + timedelta(days=max_days)
+        except OverflowError:   # near datetime.max
+            valid = False
+        if not valid:
+            abort(400, 'invalid period')
+        min_minutes = request.args.get('min_minutes', 0, type=int)
+        if not 0 <= min_minutes <= max_days * 24 * 60:
+            abort(400, 'invalid min_minutes')
+        min_length = timedelta(minutes=min_minutes)
+        columns = {'venues': Shows.venue_id, 'artists': Shows.artist_id}
+        data = {}
+        for kind, kind_ids in ids.items():
+            if kind_ids:
+                slots = schedule.free_slots(columns[kind], kind_ids, start, end, min_length)
+                data[kind] = [{'id': owner, 'free': [{'start': slot_start, 'end': slot_end}
+                                                     for slot_start, slot_end in free]}
+                              for owner, free in slots.items()]
+        return json_response({'from': start, 'to': end, 'data': data})
+
+    entity_routes('venues', Venue, VENUE_FIELDS, Shows.venue_id, Artist, Shows.artist_id,
+                  'artist', venue_search)
+    entity_routes('artists', Artist, ARTIST_FIELDS, Shows.artist_id, Venue, Shows.venue_id,
+                  'venue', artist_search)
+
+    @api.route('/shows')
+    @query_budget(1)
+    def shows():
+        # Shows in (start_time, id) order from the show calendar, optionally
+        # for one venue, artist or city. The sort key is always selected
+        # first so the cursor can be built.
+        fields = requested_fields(SHOW_FIELDS, SHOW_DEFAULT)
+        after = cursor_arg('cursor', decode_cursor)
+        limit = page_size()
+        columns = [CalendarEntry.show_id if field == 'id' else getattr(CalendarEntry, field)
+                   for field in fields]
+        query = db.session.query(CalendarEntry.start_time, CalendarEntry.show_id, *columns).filter(
+            show_calendar.visible())
+        for name in ('venue_id', 'artist_id'):
+            if request.args.get(name, type=int):
+                query = query.filter(getattr(CalendarEntry, name) == request.args.get(name, type=int))
+        for name in ('city', 'state'):
+            if request.args.get(name):
+                query = query.filter(getattr(CalendarEntry, name) == request.args[name])
+        if after is not None:
+            query = query.filter(db.tuple_(CalendarEntry.start_time, CalendarEntry.show_id) > after)
+        rows = query.order_by(CalendarEntry.start_time, CalendarEntry.show_id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(*rows[limit - 1][:2])
+        return json_response({'data': serialize((row[2:] for row in rows[:limit]), fields),
+                              'next_cursor': next_cursor})
+
+    return api
@@ -3,34 +3,125 @@
 #----------------------------------------------------------------------------#
 
 import json
+from datetime import date, timedelta
+from itertools import groupby
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+import click
+from functools import lru_cache
+from contextlib import contextmanager
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, g, has_request_context, jsonify, session, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
+from sqlalchemy import orm
+from sqlalchemy.exc import SQLAlchemyError
+from search import Search, prefix_index, trigram_indexes
+from cache import PageCache
+from assets import Assets, create_assets_cli
+from catalog import create_catalog_cli
+from counters import ShowCounters, create_counters_cli
+from show_calendar import ShowCalendar, create_calendar_cli
+from geo import VenueLocator, create_geo_cli, geohash_index, parse_origin
+from scheduling import DEFAULT_SHOW_MINUTES, Schedule, create_schedule_cli
+from recommendations import Recommender, create_recommendations_cli
+from deletions import Deletions, create_deletions_cli, soft_delete_indexes
+from api import create_api
+from pagination import encode_cursor, decode_cursor
+from logs import LogPipeline
+from replicas import ReplicaRouter, RoutingSession, create_replicas_cli
+from instrumentation import DatabaseMetrics, InstrumentedQueuePool, query_budget
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
+class PooledSQLAlchemy(SQLAlchemy):
+  # Applies the DB_POOL_* settings from config.py when the engine is created,
+  # so they follow whichever database URI is configured at that point.
+  def create_engine(self, sa_url, engine_opts):
+    config = self.get_app().config
+    if sa_url.get_backend_name() != 'sqlite':
+      options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+      }
+      # Web workers only: an engine created inside a `flask` command (db
+      # upgrade, catalog import, ...) runs long statements on purpose
+      if (sa_url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT']
+          and click.get_current_context(silent=True) is None):
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+      engine_opts = {**options, **engine_opts}
+    return super().create_engine(sa_url, engine_opts)
+
+  def create_session(self, options):
+    # Sessions that send read-only requests to the replicas (replicas.py)
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
 app = Flask(__name__)
 moment = Moment(app)
-db = SQLAlchemy(app)
+db = PooledSQLAlchemy(app)
 
 # TODO: connect to a local postgresql database
 app.config.from_object('config') # db URI from the config.py file
 migrate = Migrate(app, db)       # database migration using Flask-Migrate
+db_metrics = DatabaseMetrics(app)
+replicas = ReplicaRouter(db, app)    # read-only requests on REPLICA_DATABASE_URIS
+app.cli.add_command(create_replicas_cli(replicas))
+assets = Assets(app)             # fingerprinted bundles, `flask assets build`
+app.cli.add_command(create_assets_cli(assets))
+
+@contextmanager
+def transaction():
+  # Unit of work for the write handlers: commit on success, roll back and
+  # re-raise on error. The session itself is request scoped and removed by
+  # Flask-SQLAlchemy at teardown, so handlers never close it themselves.
+  try:
+    yield db.session
+    db.session.commit()
+  except Exception:
+    db.session.rollback()
+    raise
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+      return f"Genre ID: {self.id}, Genre Name: {self.name}"
+
+# Genre association tables; the (genre_id, ...) indexes serve the genre filters
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id'),
+)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    # Trigram indexes backing search (see search.py); GIN on PostgreSQL.
+    # Partial indexes for the listing (live venues by area) and the purge,
+    # and the geohash index behind the nearby queries (geo.py).
+    __table_args__ = trigram_indexes(db, 'Venue') + soft_delete_indexes(db, 'Venue', 'city', 'state', 'name', 'id') + (
+        geohash_index(db, 'Venue'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -42,11 +133,21 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.String(120))           # genre as an Array
+    genres = db.Column(db.String(120))           # comma-joined, kept for display and search
+    genre_list = db.relationship('Genre', secondary=venue_genres, lazy=True)
     website_link = db.Column(db.String(120))     # website link is not in the above _items
     # Seeking talent is not in the above
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))   # A description field
+    # Denormalized show counts, maintained by ShowCounters (counters.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # City centre from the gazetteer and its geohash, the spatial index (geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
+    # Set on delete; the venue is hidden until purged (deletions.py)
+    deleted_at = db.Column(db.DateTime)
 
     # On Parent Model, passs child model using db.relationships
     show = db.relationship('Shows', backref='venue', lazy=True)
@@ -56,13 +157,17 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    # Trigram indexes backing search (see search.py); GIN on PostgreSQL.
+    # Partial indexes for the listing (live artists by name) and the purge.
+    __table_args__ = trigram_indexes(db, 'Artist') + soft_delete_indexes(db, 'Artist', 'name', 'id')
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.Column(db.String(120))              # comma-joined, kept for display and search
+    genre_list = db.relationship('Genre', secondary=artist_genres, lazy=True)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -71,6 +176,11 @@ class Artist(db.Model):
     # A Seeking venue boolean type
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500)) # A description field
+    # Denormalized show counts, maintained by ShowCounters (counters.py)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set on delete; the artist is hidden until purged (deletions.py)
+    deleted_at = db.Column(db.DateTime)
 
     # On Parent Model, passs child model using db.relationships
     show = db.relationship('Shows', backref='artist', lazy=True)
@@ -78,40 +188,416 @@ class Artist(db.Model):
     def __repr__(self):
       return f"Venue ID: {self.id}, Venue Name: {self.name}, Venue City: {self.city}, Venue State: {self.state}, Venue Address: {self.address}, Venue Phone: {self.phone}, Venue Image-Link: {self.image_link}, FB-Link: {self.facebook_link}, Venue Genres: {self.genres}, Venue Website-link: {self.website_link}, Venue Seek Venue: {self.seeking_venue}"
 
+def default_end_time(context):
+  # Rows inserted without an end time run for the default duration
+  start_time = context.get_current_parameters().get('start_time') or datetime.utcnow()
+  return start_time + timedelta(minutes=DEFAULT_SHOW_MINUTES)
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 class Shows(db.Model):    # Shows table
     __tablename__ = 'Show'
+    # Indexes matching the show queries: per venue / per artist by time for
+    # the detail pages and the conflict checks (scheduling.py), and
+    # (start_time, id) for the keyset-paged feed. On PostgreSQL, exclusion
+    # constraints (migration f3a7d1c9b2e4) also keep shows at one venue or
+    # by one artist from overlapping.
+    __table_args__ = (
+      db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+      db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+      db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+      db.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),
+    )
 
     # Set a primary identifier
     id = db.Column(db.Integer, primary_key=True)  
     # Choosing a datetime format to add to the show attribute
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # When the show ends; venue and artist are booked until then
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
     # Child relationship linking the entry to an artist
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'),nullable=False)
     # Child relationship linking the entry to an venue
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'),nullable=False)
 
     def __repr__(self):
-      return f"Show ID: {self.id}, Show Start: {self.start_time}, Show Artist: {self.artist_id}, Show Venue: {self.venue_id}"
+      return f"Show ID: {self.id}, Show Start: {self.start_time}, Show End: {self.end_time}, Show Artist: {self.artist_id}, Show Venue: {self.venue_id}"
+
+class CounterState(db.Model):
+    # Single row: shows starting at or before rolled_over_at are counted as
+    # past in the Venue/Artist show counters
+    __tablename__ = 'CounterState'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_over_at = db.Column(db.DateTime, nullable=False)
+
+class CalendarEntry(db.Model):
+    # One row per show with the venue and artist fields the show listings
+    # display, maintained by ShowCalendar (show_calendar.py)
+    __tablename__ = 'ShowCalendar'
+    __table_args__ = (
+      db.Index('ix_ShowCalendar_start_time_show_id', 'start_time', 'show_id'),
+      db.Index('ix_ShowCalendar_area_start_time', 'city', 'state', 'start_time', 'show_id'),
+      db.Index('ix_ShowCalendar_venue_id', 'venue_id'),
+      db.Index('ix_ShowCalendar_artist_id', 'artist_id'),
+    )
+
+    show_id = db.Column(db.Integer, db.ForeignKey('Show.id', ondelete='CASCADE'), primary_key=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    venue_name = db.Column(db.String)
+    venue_image_link = db.Column(db.String(500))
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    artist_id = db.Column(db.Integer, nullable=False)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+
+class Recommendation(db.Model):
+    # Precomputed matches, maintained by Recommender (recommendations.py):
+    # kind 'artist' lists venues for the artist source_id, kind 'venue'
+    # artists for the venue. The primary key is the page's lookup order.
+    __tablename__ = 'Recommendation'
+
+    kind = db.Column(db.String(6), primary_key=True)
+    source_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    target_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class RecommendationQueue(db.Model):
+    # Lists to recompute after new shows, drained by `flask recommendations
+    # refresh`; a list appears once per show that changed it
+    __tablename__ = 'RecommendationQueue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(6), nullable=False)
+    source_id = db.Column(db.Integer, nullable=False)
+
+# Genres of each calendar show (its artist's), for genre-filtered listings
+calendar_genres = db.Table('show_calendar_genres',
+    db.Column('show_id', db.Integer, db.ForeignKey('ShowCalendar.show_id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre', db.String(120), primary_key=True),
+    db.Column('start_time', db.DateTime, nullable=False),
+    db.Index('ix_show_calendar_genres_genre', 'genre', 'start_time', 'show_id'),
+)
+
+# Case-insensitive name lookups, and typeahead over live rows (search.py)
+db.Index('ix_Venue_name_lower', db.func.lower(Venue.name))
+db.Index('ix_Artist_name_lower', db.func.lower(Artist.name))
+prefix_index(db, Venue)
+prefix_index(db, Artist)
+
+def assign_genres(entity, names):
+  # Set a venue's or artist's genres: the comma-joined column and the
+  # normalized genre_list links, creating Genre rows on first use.
+  names = list(dict.fromkeys(names))
+  known = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(names))} if names else {}
+  entity.genres = ",".join(names)
+  entity.genre_list = [known.get(name) or Genre(name=name) for name in names]
+
+# In-memory indexes are rebuilt from the primary (replicas.py)
+venue_search = Search(db, Venue, on_build=replicas.use_primary)
+artist_search = Search(db, Artist, on_build=replicas.use_primary)
+
+# Lookups behind ShowForm's artist_id / venue_id validation (forms.py), live rows only
+known_artist_ids.bind(lambda artist_id: db.session.query(Artist.id).filter_by(id=artist_id, deleted_at=None).first() is not None)
+known_venue_ids.bind(lambda venue_id: db.session.query(Venue.id).filter_by(id=venue_id, deleted_at=None).first() is not None)
+show_counters = ShowCounters(db, Venue, Artist, Shows, CounterState)
+show_calendar = ShowCalendar(db, CalendarEntry, calendar_genres, Venue, Artist, Shows, Genre)
+venue_locator = VenueLocator(db, Venue, show_calendar)
+show_schedule = Schedule(db, Shows)
+recommender = Recommender(db, Venue, Artist, Shows, Recommendation, RecommendationQueue,
+                          top_k=app.config.get('RECOMMENDATIONS_TOP_K', 20),
+                          genre_weight=app.config.get('RECOMMENDATION_GENRE_WEIGHT', 0.5))
+deletions = Deletions(db, Venue, Artist, Shows, show_counters, show_calendar, recommender)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=64)
+def datetime_pattern(format):
+  # Compiled babel pattern for a named or literal format
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+@lru_cache(maxsize=32)
+def babel_locale(identifier):
+  return babel.Locale.parse(identifier)
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+  # Memoized on (timestamp, format, locale): listings repeat the same times
+  return datetime_pattern(format).apply(value, babel_locale(locale))
+
+def current_locale():
+  # Best match of the request's Accept-Language among LOCALES, computed once
+  # per request; the default locale outside of requests
+  default = app.config.get('BABEL_DEFAULT_LOCALE', 'en')
+  if not has_request_context():
+    return default
+  if 'locale' not in g:
+    g.locale = request.accept_languages.best_match(app.config.get('LOCALES', [default])) or default
+  return g.locale
+
+def format_datetime(value, format='medium', locale=None):
+  # datetime values are formatted directly; strings are still parsed
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  return _format_datetime(value, format, locale or current_locale())
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+def render_listing(template_name, **context):
+  # Send a listing page while it renders: the template consumes the row
+  # generators in `context` and its output is flushed every STREAM_BUFFER
+  # writes, so the first bytes leave before the last rows are fetched.
+  # Rendered whole when streaming is off, for HTTP/1.0 clients (no chunked
+  # encoding) and when flashed messages are pending, since popping them
+  # changes the session cookie and headers cannot change once streaming.
+  if (not app.config.get('STREAM_TEMPLATES', True)
+      or request.environ.get('SERVER_PROTOCOL') == 'HTTP/1.0'
+      or session.get('_flashes')):
+    return render_template(template_name, **context)
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(app.config.get('STREAM_BUFFER', 100))
+  return Response(stream_with_context(stream))
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Pages are rendered for the cache from the primary (replicas.py)
+page_cache = PageCache(app, vary=current_locale, on_fill=replicas.use_primary)
+
+def venue_listing_tags():
+  # A single-area listing only depends on that area; anything else on all venues
+  city, state = request.args.get('city'), request.args.get('state')
+  if city is not None and state is not None and request.args.get('genre') is None:
+    return [f'area:{city}|{state}']
+  return ['venues']
+
+def invalidate_venue(venue_id, *areas):
+  # After a venue write: its page, the show feed (venue names), the full
+  # listing and every (city, state) area it was or is listed under
+  page_cache.invalidate('venues', 'shows', f'venue:{venue_id}',
+                        *(f'area:{city}|{state}' for city, state in areas))
+
+def invalidate_artist(artist_id):
+  page_cache.invalidate('artists', 'shows', f'artist:{artist_id}')
+
+def invalidate_show(show):
+  # A new show changes the feed, both detail pages and the venue's upcoming
+  # show count in the listings
+  area = db.session.query(Venue.city, Venue.state).filter(Venue.id == show.venue_id).first()
+  tags = ['shows', 'venues', f'venue:{show.venue_id}', f'artist:{show.artist_id}']
+  if area is not None:
+    tags.append(f'area:{area.city}|{area.state}')
+  page_cache.invalidate(*tags)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def with_genre(model_id, link_column, genre):
+  # Filter clause keeping venues/artists tagged with `genre`. `link_column` is
+  # the association table's venue_id/artist_id column; the lookup goes
+  # through its (genre_id, ...) index rather than the comma-joined string.
+  links = link_column.table
+  tagged = db.session.query(link_column).join(Genre, Genre.id == links.c.genre_id
+  ).filter(Genre.name == genre)
+  return model_id.in_(tagged)
+
+def venue_areas(city=None, state=None, genre=None, page=1, per_area=None):
+  # Group venues by (city, state) with their upcoming show counts.
+  # Window functions rank and count the venues inside each area, so only
+  # `per_area` venues per area are returned for the requested page no matter
+  # how many venues there are; the show counts are the stored counters.
+  # A generator: areas are yielded as the rows are fetched, STREAM_CHUNK_SIZE
+  # at a time, so a streamed page never holds the whole listing.
+  per_area = per_area or app.config.get('VENUES_PER_AREA', 20)
+  offset = (page - 1) * per_area
+
+  area = (Venue.city, Venue.state)
+  ranked = db.session.query(
+    Venue.id, Venue.name, Venue.city, Venue.state,
+    Venue.upcoming_shows_count.label('num_upcoming_shows'),
+    db.func.row_number().over(partition_by=area, order_by=(Venue.name, Venue.id)).label('position'),
+    db.func.count().over(partition_by=area).label('area_total'),
+  ).filter(Venue.deleted_at.is_(None))
+  if city is not None:
+    ranked = ranked.filter(Venue.city == city)
+  if state is not None:
+    ranked = ranked.filter(Venue.state == state)
+  if genre is not None:
+    ranked = ranked.filter(with_genre(Venue.id, venue_genres.c.venue_id, genre))
+  ranked = ranked.subquery()
+
+  rows = db.session.query(ranked).filter(
+    ranked.c.position > offset,
+    ranked.c.position <= offset + per_area,
+  ).order_by(ranked.c.state, ranked.c.city, ranked.c.position
+  ).yield_per(app.config.get('STREAM_CHUNK_SIZE', 500))
+
+  # Rows arrive sorted by area, so one linear pass groups them
+  for (venue_city, venue_state), venues in groupby(rows, key=lambda r: (r.city, r.state)):
+    venues = list(venues)
+    total = venues[0].area_total
+    yield {
+      "city": venue_city,
+      "state": venue_state,
+      "venues": [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.num_upcoming_shows,
+      } for venue in venues],
+      "total": total,
+      "has_more": offset + per_area < total,
+    }
+
+def show_feed(after=None, before=None, limit=None, start=None, end=None,
+              city=None, state=None, genre=None):
+  # A page of shows ordered by (start_time, id), read from the show calendar
+  # only: the venue and artist fields are stored with each show, so no joins
+  # on the base tables and no ORM objects. `start`/`end` bound the start
+  # time (end exclusive), `city`/`state` and `genre` narrow the listing.
+  # Paging is keyset based: the cursor is the (start_time, id) of a boundary row.
+  limit = limit or app.config.get('SHOWS_PER_PAGE', 50)
+  entry = CalendarEntry
+  query = db.session.query(
+    entry.show_id,
+    entry.venue_id,
+    entry.artist_id,
+    entry.venue_name,
+    entry.artist_name,
+    entry.artist_image_link,
+    entry.start_time,
+  ).filter(show_calendar.visible())   # not the shows of deleted venues/artists
+  if genre is not None:
+    # Walk the (genre, start_time) index and fetch the matching entries
+    query = query.join(calendar_genres, calendar_genres.c.show_id == entry.show_id
+    ).filter(calendar_genres.c.genre == genre)
+    start_time, show_id = calendar_genres.c.start_time, calendar_genres.c.show_id
+  else:
+    start_time, show_id = entry.start_time, entry.show_id
+  if city is not None:
+    query = query.filter(entry.city == city)
+  if state is not None:
+    query = query.filter(entry.state == state)
+  if start is not None:
+    query = query.filter(start_time >= start)
+  if end is not None:
+    query = query.filter(start_time < end)
+
+  key = db.tuple_(start_time, show_id)
+  if before is not None:
+    # Walk backwards from the cursor, then restore ascending order
+    query = query.filter(key < before).order_by(start_time.desc(), show_id.desc())
+  else:
+    if after is not None:
+      query = query.filter(key > after)
+    query = query.order_by(start_time, show_id)
+
+  rows = query.limit(limit + 1).all()   # one extra row tells us if there is more
+  has_more = len(rows) > limit
+  rows = rows[:limit]
+  if before is not None:
+    rows.reverse()
+
+  data = [{
+    "venue_id": row.venue_id,
+    "artist_id": row.artist_id,
+    "venue_name": row.venue_name,
+    "artist_name": row.artist_name,
+    "artist_image_link": row.artist_image_link,
+    "start_time": row.start_time,
+  } for row in rows]
+
+  prev_cursor = next_cursor = None
+  if rows:
+    first, last = rows[0], rows[-1]
+    if after is not None or (before is not None and has_more):
+      prev_cursor = encode_cursor(first.start_time, first.show_id)
+    if before is not None or has_more:
+      next_cursor = encode_cursor(last.start_time, last.show_id)
+  return {"shows": data, "prev_cursor": prev_cursor, "next_cursor": next_cursor}
+
+def detail_shows(owner_fk, owner_id, counterpart, counterpart_fk, prefix,
+                 upcoming_after=None, past_before=None, limit=None, now=None):
+  # Upcoming and past shows for one venue or artist page.
+  # `owner_fk` is the Show column pointing at the page's venue/artist and
+  # `counterpart` the model on the other side of each show, whose id, name and
+  # image are returned as <prefix>_id, <prefix>_name and <prefix>_image_link.
+  # Both lists are bounded keyset pages (upcoming soonest first, past most
+  # recent first), so the cost does not grow with the length of the show
+  # history. The totals are the owner's stored show counters. Shows with a
+  # deleted counterpart are left out.
+  limit = limit or app.config.get('DETAIL_SHOWS_PER_PAGE', 12)
+  now = now or datetime.now()
+
+  key = db.tuple_(Shows.start_time, Shows.id)
+  base = db.session.query(
+    Shows.id,
+    Shows.start_time,
+    counterpart.id.label(f'{prefix}_id'),
+    counterpart.name.label(f'{prefix}_name'),
+    counterpart.image_link.label(f'{prefix}_image_link'),
+  ).join(counterpart, counterpart.id == counterpart_fk
+  ).filter(owner_fk == owner_id, counterpart.deleted_at.is_(None))
+
+  upcoming = base.filter(Shows.start_time >= now)
+  if upcoming_after is not None:
+    upcoming = upcoming.filter(key > upcoming_after)
+  upcoming = upcoming.order_by(Shows.start_time, Shows.id).limit(limit + 1).all()
+
+  past = base.filter(Shows.start_time < now)
+  if past_before is not None:
+    past = past.filter(key < past_before)
+  past = past.order_by(Shows.start_time.desc(), Shows.id.desc()).limit(limit + 1).all()
+
+  def page(rows):
+    # Trim the look-ahead row and return (dicts, cursor of the last row shown)
+    cursor = None
+    if len(rows) > limit:
+      rows = rows[:limit]
+      cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+    return [{
+      f'{prefix}_id': getattr(row, f'{prefix}_id'),
+      f'{prefix}_name': getattr(row, f'{prefix}_name'),
+      f'{prefix}_image_link': getattr(row, f'{prefix}_image_link'),
+      "start_time": row.start_time,
+    } for row in rows], cursor
+
+  upcoming_shows, upcoming_cursor = page(upcoming)
+  past_shows, past_cursor = page(past)
+  return {
+    "upcoming_shows": upcoming_shows,
+    "past_shows": past_shows,
+    "upcoming_cursor": upcoming_cursor,
+    "past_cursor": past_cursor,
+  }
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
+def page_arg(values):
+  # ?page= of the numbered listings; pages past MAX_PAGE are refused rather
+  # than turned into an offset the database cannot hold
+  page = max(values.get('page', 1, type=int), 1)
+  if page > app.config.get('MAX_PAGE', 1000):
+    abort(400)
+  return page
+
 @app.route('/')
 def index():
   return render_template('pages/home.html')
@@ -121,72 +607,95 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@query_budget(1)
+@page_cache.cached(venue_listing_tags)
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  venues = Venue.query.all()          # Select all from Venue
-  data = []                           # Data var for the final result
-  list_city = []                      # var to store the city and state data
-  list_shows = []                     # var to store the shows for each city
-  for venue in venues:                # loop through each Venue
-    list_city.append((venue.city, venue.state))
-    for city in list_city:
-      # city, state in list = city, state in venue
-      if (venue.city == city[0]) and (venue.state == city[1]): 
-        # Filter the shows per venue
-        shows_list = list(filter(lambda s : s.start_time > datetime.now(), venue.show))
-        list_shows.append({           # list var for the venues entry in the dict
-          "id": venue.id,
-          "name": venue.name,
-          "num_upcoming_shows": len(shows_list) # lenth of the shows list
-        })
-        # Init city, state & show information in dict
-        dict_citystate = { "city" : venue.city, "state" : venue.state } 
-        dict_citystate["venues"] = list_shows
-        data.append(dict_citystate)         # Append dict to the data var
-
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+  # Areas are listed from a single aggregate query; ?city=&state= narrows the
+  # listing to one area, ?genre= to one genre and ?page= walks through venues.
+  page = page_arg(request.args)
+  data = venue_areas(
+    city=request.args.get('city'),
+    state=request.args.get('state'),
+    genre=request.args.get('genre'),
+    page=page,
+  )
+  return render_listing('pages/venues.html', areas=data, page=page,
+                        genre=request.args.get('genre'))
+
+@app.route('/venues/search', methods=['GET', 'POST'])
+@query_budget(3)
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  venues_search = request.form.get("search_term", "")
-  response = {}     # Init empty response dictionary
-   # Add all the queried results to a variable
-  venues_search = Venue.query.filter(Venue.name.ilike(f"${venues_search}$")).all()
-  for venue in venues_search:
-    list_shows = list(filter(lambda s: s.start_time > datetime.now(), venue.shows))
-    ven_shows = {
-      "id": venue.id,
-      "name": venue.name,       # Dict all the venues from the search results
-      "num_upcoming_shows": len(list_shows)
-    }
-    response["count"] = len(venues_search) # Add the number of results to the response dict
-    response["data"] = []           # Empty list
-    response["data"].append(ven_shows)# Add items to the list in the dictionary
-  return render_template('pages/search_venues.html', results=response, search_term=venues_search)
+  # Case-insensitive partial match on name, city, state and genres, e.g.
+  # "Hop" returns "The Musical Hop". GET is accepted so result pages can link.
+  search_term = request.values.get("search_term", "")
+  page = page_arg(request.values)
+  response = venue_search.search(
+    search_term, page=page, per_page=app.config.get('SEARCH_RESULTS_PER_PAGE', 20))
+  return render_template('pages/search_venues.html', results=response,
+                         search_term=search_term, page=page)
+
+@app.route('/venues/typeahead')
+@query_budget(1)
+def venue_typeahead():
+  # Venues whose name starts with ?q=, for picking a venue id by name
+  return jsonify(venue_search.typeahead(request.args.get('q', '')))
+
+@app.route('/venues/nearby')
+@query_budget(2)
+def venues_nearby():
+  # Venues within ?radius= miles of ?lat=&lng= (or of ?city=&state=),
+  # nearest first, with their next shows
+  default_radius = app.config.get('NEARBY_RADIUS_MILES', 25)
+  if not request.args:
+    return render_template('pages/venues_nearby.html', venues=[], shows=[], radius=default_radius)
+  try:
+    latitude, longitude, radius = parse_origin(
+      request.args, venue_locator.gazetteer, default_radius, app.config.get('NEARBY_MAX_RADIUS', 500))
+  except (KeyError, ValueError):
+    abort(400)
+  venues = venue_locator.nearby(latitude, longitude, radius,
+                                limit=app.config.get('NEARBY_VENUES', 50))
+  shows = venue_locator.nearby_shows(venues, datetime.now(), limit=app.config.get('NEARBY_SHOWS', 12))
+  return render_template('pages/venues_nearby.html', venues=venues, shows=shows, radius=radius)
 
 @app.route('/venues/<int:venue_id>')
+@query_budget(4)
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.get(venue_id)     # Obtain the data for that venue_id
-  # Store all the past shows to a var past_shows
-  past_shows = list(filter(lambda p: p.start_time < datetime.now(), venue.show))
-  # Store all the upcoming shows to a var upcoming_shows
-  upcoming_shows = list(filter(lambda u: u.start_time >= datetime.now(), venue.show))
+  venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()
+  try:
+    shows = detail_shows(
+      Shows.venue_id, venue_id, Artist, Shows.artist_id, 'artist',
+      upcoming_after=decode_cursor(request.args.get('upcoming_after')),
+      past_before=decode_cursor(request.args.get('past_before')),
+    )
+  except ValueError:
+    abort(400)
+  recommendations = recommender.fetch('venue', venue_id, app.config.get('RECOMMENDATIONS_SHOWN', 6))
+  # The page shows artist names and images, so artist edits refresh it
+  page_cache.tag(*(f"artist:{show['artist_id']}"
+                   for show in shows['upcoming_shows'] + shows['past_shows']))
+  page_cache.tag(*(f"artist:{match['id']}" for match in recommendations))
 
   ven_dict = {
-        **venue.__dict__,         # Build a dictionary on the original venue varieble
-        **{                       # Add this additional fields top the database
-            'past_shows': past_shows,
-            'upcoming_shows': upcoming_shows,
-            'past_shows_count': len(past_shows),            
-            'upcoming_shows_count': len(upcoming_shows)            
-        }}
-
+    "id": venue.id,
+    "name": venue.name,
+    "genres": venue.genres.split(",") if venue.genres else [],
+    "city": venue.city,
+    "state": venue.state,
+    "address": venue.address,
+    "phone": venue.phone,
+    "website": venue.website_link,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    "upcoming_shows_count": venue.upcoming_shows_count,
+    "past_shows_count": venue.past_shows_count,
+    "recommendations": recommendations,
+    **shows,
+  }
   return render_template('pages/show_venue.html', venue=ven_dict)
 
 #  Create Venue
@@ -205,116 +714,123 @@ def create_venue_submission():
 
   if form.validate():             # If form field has entries
     try:
-      new_venue = Venue(          # Relay to Venue class
-        name=form.name.data,      # Assign entries to the class attributes
-        city=form.city.data,
-        state=form.state.data,
-        address=form.address.data,
-        phone=form.phone.data,
-        genres=",".join(form.genres.data),    # combine genres
-        facebook_link=form.facebook_link.data,
-        image_link=form.image_link.data,
-        seeking_talent=form.seeking_talent.data,
-        seeking_description=form.seeking_description.data,
-        website_link=form.website_link.data,
-      )
-      db.session.add(new_venue)         # Add to database and commit
-      db.session.commit()
+      with transaction():
+        new_venue = Venue(          # Relay to Venue class
+          name=form.name.data,      # Assign entries to the class attributes
+          city=form.city.data,
+          state=form.state.data,
+          address=form.address.data,
+          phone=form.phone.data,
+          facebook_link=form.facebook_link.data,
+          image_link=form.image_link.data,
+          seeking_talent=form.seeking_talent.data,
+          seeking_description=form.seeking_description.data,
+          website_link=form.website_link.data,
+        )
+        venue_locator.locate(new_venue)       # position, and the gazetteer's city spelling
+        assign_genres(new_venue, form.genres.data)
+        db.session.add(new_venue)         # Add to database, committed on exit
+      venue_search.invalidate()
+      page_cache.invalidate('venues', f'area:{new_venue.city}|{new_venue.state}')
     # on successful db insert, flash success
       flash('Venue ' + request.form['name'] + ' was successfully listed!')
     # TODO: on unsuccessful db insert, flash an error instead.
-    except Exception:
-      db.session.rollback()
+    except SQLAlchemyError:
+      app.logger.exception('Venue could not be listed')
       flash('An error occured. Venue ' + request.form['name'] + ' could not be listed.')
-    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    finally:
-      db.session.close()
   else:
     flash("Venue was not listed!")
 
-    # return render_template('pages/home.html')
-    return redirect(url_for('venues'))
-
-  @app.route('/venues/<venue_id>', methods=['DELETE'])
-  def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail. 
-    venue = Venue.query.get(venue_id)           # Obtain data based on id
-    if venue:
-      try:
-        venue_name = venue.name         # save the name to a variable
-        db.session.delete(venue_name)   # delete this entry
-        db.session.commit()             # commit to database
-        flash("Selected Venue: " + venue_name + " has been deleted succesfully.")
-      except:
-        db.session.rollback()
-      finally:
-        db.session.close()
-    else:
-      return redirect(url_for('venues'))
-  
-
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
   # return render_template('pages/home.html')
+  return redirect(url_for('venues'))
+
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # Soft delete: the venue leaves every page at once and its shows are
+  # removed later, in batches, by `flask deletions purge` (deletions.py)
+  try:
+    with transaction():
+      venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()
+      venue_name, area = venue.name, (venue.city, venue.state)
+      deletions.delete(venue)
+  except SQLAlchemyError:
+    app.logger.exception('Venue %s could not be deleted', venue_id)
+    return jsonify({'success': False}), 500
+  venue_search.invalidate()
+  invalidate_venue(venue_id, area)
+  flash("Selected Venue: " + venue_name + " has been deleted succesfully.")
+  return jsonify({'success': True, 'redirect': url_for('index')})
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@query_budget(1)
+@page_cache.cached('artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  
-  artists = db.session.query(Artist.id, Artist.name).all()
+  # ?genre= lists only the artists tagged with that genre
+  genre = request.args.get('genre')
+  artists = db.session.query(Artist.id, Artist.name).filter(Artist.deleted_at.is_(None))
+  if genre is not None:
+    artists = artists.filter(with_genre(Artist.id, artist_genres.c.artist_id, genre))
+  artists = artists.order_by(Artist.name, Artist.id).yield_per(app.config.get('STREAM_CHUNK_SIZE', 500))
 
-  return render_template('pages/artists.html', artists=artists)
+  return render_listing('pages/artists.html', artists=artists, genre=genre)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
+@query_budget(3)
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  response = {}
-  artist_search = request.form.get('search_term', '')
-  # Query all the artists based on the input
-  # Store these results in a variable
-  artists = Artist.query.filter(Artist.name.ilike(f"${artist_search}$")).all()                               
-  response["count"] = len(artists)      # Add the num of artists to the dict                  
-  # Init empty list in data var in dict
-  response["data"] = []
-  for artist in artists:    
-    upcoming_shows = 0          # Now for the upcoming shows enry
-    for show in artist.shows:
-      if show.start_time > datetime.now():# All the upcoming shows
-        upcoming_shows += 1
-    art = {
-      "name" : artist.name,   # Add the name to the art-dictionary
-      "id" : artist.id,
-      "upcoming_shows" : upcoming_shows # Place these in the art-dictionary
-    }
-    response["data"].append(art)      # Add all to the response["data"] field
-
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  # Case-insensitive partial match on name, city, state and genres, e.g.
+  # "band" returns "The Wild Sax Band".
+  search_term = request.values.get('search_term', '')
+  page = page_arg(request.values)
+  response = artist_search.search(
+    search_term, page=page, per_page=app.config.get('SEARCH_RESULTS_PER_PAGE', 20))
+  return render_template('pages/search_artists.html', results=response,
+                         search_term=search_term, page=page)
+
+@app.route('/artists/typeahead')
+@query_budget(1)
+def artist_typeahead():
+  # Artists whose name starts with ?q=, for picking an artist id by name
+  return jsonify(artist_search.typeahead(request.args.get('q', '')))
 
 @app.route('/artists/<int:artist_id>')
+@query_budget(4)
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  artist = Artist.query.get(artist_id)
-  # Store all the past shows to a var past_shows
-  past_shows = list(filter(lambda p: p.start_time < datetime.today(), artist.show))
-  # Store all the upcoming shows to a var upcoming_shows
-  upcoming_shows = list(filter(lambda u: u.start_time >= datetime.today(), artist.show))
-  ven_dict = {
-        **artist.__dict__,        # Dictionary the existing artist variable
-        **{                       # Add this dictionary values to the dictionary
-            'past_shows': past_shows,
-            'upcoming_shows': upcoming_shows,
-            'past_shows_count': len(past_shows),            
-            'upcoming_shows_count': len(upcoming_shows)            
-        }}
-
-  return render_template('pages/show_artist.html', artist=ven_dict)
+  artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()
+  try:
+    shows = detail_shows(
+      Shows.artist_id, artist_id, Venue, Shows.venue_id, 'venue',
+      upcoming_after=decode_cursor(request.args.get('upcoming_after')),
+      past_before=decode_cursor(request.args.get('past_before')),
+    )
+  except ValueError:
+    abort(400)
+  recommendations = recommender.fetch('artist', artist_id, app.config.get('RECOMMENDATIONS_SHOWN', 6))
+  page_cache.tag(*(f"venue:{show['venue_id']}"
+                   for show in shows['upcoming_shows'] + shows['past_shows']))
+  page_cache.tag(*(f"venue:{match['id']}" for match in recommendations))
+
+  art_dict = {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": artist.genres.split(",") if artist.genres else [],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website_link,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "upcoming_shows_count": artist.upcoming_shows_count,
+    "past_shows_count": artist.past_shows_count,
+    "recommendations": recommendations,
+    **shows,
+  }
+  return render_template('pages/show_artist.html', artist=art_dict)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -322,7 +838,7 @@ def show_artist(artist_id):
 def edit_artist(artist_id):
   form = ArtistForm()
   # TODO: populate form with fields from artist with ID <artist_id>
-  artist = Artist.query.get(artist_id)          # Query data based on id
+  artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()   # Query data based on id
   # separate genres from ","
   form.genres.data = artist.genres.split(",")   
 
@@ -336,24 +852,25 @@ def edit_artist_submission(artist_id):
 
   if form.validate():             # if form field has entries
     try:
-      artist = Artist.queryget(artist_id)       # Query the data based in id
-      artist.name = form.name.data
-      artist.city = form.city.data
-      artist.state = form.state.data
-      artist.phone = form.phone.data
-      artist.genres=",".join(form.genres.data)      # Combine the genres
-      artist.facebook_link = form.facebook_link.data
-      artist.image_link = form.image_link.data
-      artist.seeking_venue = form.seeking_venue.data
-      artist.seeking_description = form.seeking_description.data
-      artist.website_link = form.website_link.data
-      db.session.add(artist)              # Add to database and commit
-      db.session.commit()
-      flash("Artist "+artist.name+" was edited succesfully")
-    except:
-      db.session.rollback()
-    finally:
-      db.session.close()
+      with transaction():
+        artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()   # Query the data based in id
+        artist.name = form.name.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.phone = form.phone.data
+        assign_genres(artist, form.genres.data)
+        artist.facebook_link = form.facebook_link.data
+        artist.image_link = form.image_link.data
+        artist.seeking_venue = form.seeking_venue.data
+        artist.seeking_description = form.seeking_description.data
+        artist.website_link = form.website_link.data
+        show_calendar.artist_changed(artist)
+      artist_search.invalidate()
+      invalidate_artist(artist_id)
+      flash("Artist "+form.name.data+" was edited succesfully")
+    except SQLAlchemyError:
+      app.logger.exception('Artist %s could not be edited', artist_id)
+      flash("An error occured. Artist "+form.name.data+" could not be edited.")
   else:
     flash("Artist was not edited!")
 
@@ -363,7 +880,7 @@ def edit_artist_submission(artist_id):
 def edit_venue(venue_id):
   form = VenueForm()
   # TODO: populate form with values from venue with ID <venue_id>
-  venue = Venue.query.get(venue_id)                 # Query venue data on id
+  venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()   # Query venue data on id
   form.genres.data = venue.genres.split(",")        # separate the data in this entry by the ","
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
@@ -374,24 +891,29 @@ def edit_venue_submission(venue_id):
   form = VenueForm(request.form)
   if form.validate():           # If inputs are in the form fields
     try:
-      venue = Venue.query.get(venue_id)     # Query the data based in id
-      venue.name = form.name.data
-      venue.city = form.city.data
-      venue.state = form.state.data
-      venue.phone = form.phone.data
-      venue.genres=",".join(form.genres.data)     # combine the genres
-      venue.facebook_link = form.facebook_link.data
-      venue.image_link = form.image_link.data
-      venue.seeking_venue = form.seeking_venue.data
-      venue.seeking_description = form.seeking_description.data
-      venue.website_link = form.website_link.data
-      db.session.add(venue)           # Add to database an commit
-      db.session.commit()
+      with transaction():
+        venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()   # Query the data based in id
+        old_area = (venue.city, venue.state)
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.address = form.address.data
+        venue.phone = form.phone.data
+        assign_genres(venue, form.genres.data)
+        venue.facebook_link = form.facebook_link.data
+        venue.image_link = form.image_link.data
+        venue.seeking_talent = form.seeking_talent.data
+        venue.seeking_description = form.seeking_description.data
+        venue.website_link = form.website_link.data
+        venue_locator.locate(venue)
+        new_area = (venue.city, venue.state)
+        show_calendar.venue_changed(venue)
+      venue_search.invalidate()
+      invalidate_venue(venue_id, old_area, new_area)
       flash("Venue "+form.name.data+" was edited succesfully")
-    except Exception:
-      db.session.rollback()
-    finally:
-      db.session.close()
+    except SQLAlchemyError:
+      app.logger.exception('Venue %s could not be edited', venue_id)
+      flash("An error occured. Venue "+form.name.data+" could not be edited.")
   else:
     flash("Venue was not edited!")
   return redirect(url_for('show_venue', venue_id=venue_id))
@@ -412,63 +934,77 @@ def create_artist_submission():
   form = ArtistForm(request.form)
   if form.validate():           # Fields have input
     try:
-      new_artist = Artist(      # Relay to the Artist class, assigning to each input varieble
-        name=form.name.data,
-        city=form.city.data,
-        state=form.state.data,
-        phone=form.phone.data,
-        genres=",".join(form.genres.data),
-        image_link= form.image_link.data,
-        facebook_link=form.facebook_link.data,
-        website_link=form.website_link.data,
-        seeking_venue=form.seeking_venue.data,
-        seeking_description=form.seeking_description.data,
-      )
-      db.session.add(new_artist)    # Add to database and commit
-      db.session.commit()
+      with transaction():
+        new_artist = Artist(      # Relay to the Artist class, assigning to each input varieble
+          name=form.name.data,
+          city=form.city.data,
+          state=form.state.data,
+          phone=form.phone.data,
+          image_link= form.image_link.data,
+          facebook_link=form.facebook_link.data,
+          website_link=form.website_link.data,
+          seeking_venue=form.seeking_venue.data,
+          seeking_description=form.seeking_description.data,
+        )
+        assign_genres(new_artist, form.genres.data)
+        db.session.add(new_artist)    # Add to database, committed on exit
+      artist_search.invalidate()
+      page_cache.invalidate('artists')
     # on successful db insert, flash success
       flash('Artist ' + request.form['name'] + ' was successfully listed!')
-    except Exception:
-    # TODO: on unsuccessful db insert, flash an error instead.    
-      db.session.rollback()
-      flash('Artist' + request.form['name'] + ' was added unsuccessfully !')
-    # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
-    finally:
-      db.session.close()
+    except SQLAlchemyError:
+      app.logger.exception('Artist could not be listed')
+      flash('Artist ' + request.form['name'] + ' was added unsuccessfully !')
   else:
     flash("Artist was not added!")
 
   return render_template('pages/home.html')
 
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  # Soft delete, purged like venues
+  try:
+    with transaction():
+      artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()
+      artist_name = artist.name
+      deletions.delete(artist)
+  except SQLAlchemyError:
+    app.logger.exception('Artist %s could not be deleted', artist_id)
+    return jsonify({'success': False}), 500
+  artist_search.invalidate()
+  invalidate_artist(artist_id)
+  flash("Selected Artist: " + artist_name + " has been deleted succesfully.")
+  return jsonify({'success': True, 'redirect': url_for('index')})
+
 
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@query_budget(1)
+@page_cache.cached('shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  data = []       # data list for the final results
-  # Query the Shows table joining Artist & Venue with the id column
-  shows = db.session.query(Shows
-          ).join(Artist, Artist.id == Shows.artist_id
-          ).join(Venue, Venue.id == Shows.venue_id
-          ).all()
-  
-  for show in shows: 
-    # Loop through the query, assign to a dictionary
-    show_dict = {
-      "venue_id": show.venue_id,
-      "artist_id": show.artist_id,
-      "venue_name": show.venue.name,      
-      "artist_name": show.artist.name, 
-      "artist_image_link": show.artist.image_link,
-      # Change-type the start_time variable to string
-      "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-    }
-    data.append(show_dict)      # Append the dictioary to the data list
-
-  return render_template('pages/shows.html', shows=data)
+  # displays list of shows at /shows, one keyset page at a time.
+  # ?after=<cursor> moves forward, ?before=<cursor> moves back;
+  # ?from=&to= (YYYY-MM-DD, inclusive), ?city=&state= and ?genre= filter.
+  filters = {name: request.args.get(name) or None
+             for name in ('from', 'to', 'city', 'state', 'genre')}
+  try:
+    start = date.fromisoformat(filters['from']) if filters['from'] else None
+    end = date.fromisoformat(filters['to']) + timedelta(days=1) if filters['to'] else None
+    page = show_feed(
+      after=decode_cursor(request.args.get('after')),
+      before=decode_cursor(request.args.get('before')),
+      start=start and datetime.combine(start, datetime.min.time()),
+      end=end and datetime.combine(end, datetime.min.time()),
+      city=filters['city'],
+      state=filters['state'],
+      genre=filters['genre'],
+    )
+  except ValueError:
+    abort(400)
+  filters = {name: value for name, value in filters.items() if value is not None}
+  return render_listing('pages/shows.html', filters=filters, **page)
 
 @app.route('/shows/create')
 def create_shows():
@@ -482,31 +1018,126 @@ def create_show_submission():
   # TODO: insert form data as a new Show record in the db, instead
   form = ShowForm(request.form)
   if form.validate():
+    venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+    start_time = form.start_time.data
+    end_time = start_time + timedelta(minutes=form.duration.data)
     try:
-      new_show = Shows(                       # Show class with form data
-        artist_id=form.artist_id.data,
-        venue_id=form.venue_id.data,
-        start_time=form.start_time.data,
-      )
-      db.session.add(new_show)                # Add & commit this to the databse
-      db.session.commit()
+      with transaction():
+        # Checked in the inserting transaction; on PostgreSQL the exclusion
+        # constraints also catch a conflicting show listed concurrently
+        conflicts = show_schedule.conflicts(venue_id, artist_id, start_time, end_time)
+        if not conflicts:
+          new_show = Shows(                       # Show class with form data
+            artist_id=artist_id,
+            venue_id=venue_id,
+            start_time=start_time,
+            end_time=end_time,
+          )
+          db.session.add(new_show)                # Add this to the database, committed on exit
+          show_counters.record_show(new_show)     # venue/artist show counters, same transaction
+          show_calendar.add_show(new_show)        # and the show calendar
+          recommender.show_added(new_show)        # queue both recommendation lists
+      if conflicts:
+        flash("Show was not added. " + " ".join(
+          "The {} already has a show from {} to {}.".format(
+            'venue' if show.venue_id == venue_id else 'artist',
+            show.start_time.strftime('%Y-%m-%d %H:%M'), show.end_time.strftime('%Y-%m-%d %H:%M'))
+          for show in conflicts))
+        return render_template('forms/new_show.html', form=form)
+      invalidate_show(new_show)
 
     # on successful db insert, flash success
       flash('Show was successfully listed!')
-    # TODO: on unsuccessful db insert, flash an error instead.
-    except Exception:
-      db.session.rollback()
+    except SQLAlchemyError:
+      app.logger.exception('Show could not be listed')
       flash("Show was unsuccessfully added!")
-
-    # e.g., flash('An error occurred. Show could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    finally:
-      db.session.commit()
   else:
-    flash("Show was not added")
+    # e.g. an unknown artist or venue id, caught before any insert
+    flash("Show was not added. " + " ".join(
+      message for messages in form.errors.values() for message in messages))
     
   return render_template('pages/home.html')
 
+#  Catalog import / export (flask catalog ...)
+#  ----------------------------------------------------------------
+
+def catalog_imported(kind):
+  # Bulk imports touch too many pages to invalidate one by one
+  if kind == 'shows':
+    show_counters.check(repair=True)    # shows are bulk inserted, recount
+    show_calendar.refresh()
+    db.session.commit()
+  elif kind == 'venues':
+    venue_locator.locate_all()          # new venues have no shows yet
+    db.session.commit()
+  page_cache.clear()
+  venue_search.invalidate()
+  artist_search.invalidate()
+
+app.cli.add_command(create_catalog_cli(db, Venue, Artist, Shows, Genre, on_import=catalog_imported,
+                                       schedule=show_schedule))
+app.cli.add_command(create_schedule_cli(show_schedule))
+def recommendations_refreshed(refreshed):
+  # Drop the cached detail pages showing the lists that were recomputed
+  page_cache.invalidate(*(f'{kind}:{source_id}' for kind, ids in refreshed.items() for source_id in ids))
+
+app.cli.add_command(create_recommendations_cli(recommender, on_build=page_cache.clear,
+                                               on_refresh=recommendations_refreshed))
+
+#  Show counters (flask counters ...)
+#  ----------------------------------------------------------------
+
+def counters_changed(changed):
+  # Drop the cached pages displaying the counts that changed
+  tags = set()
+  venue_ids = changed.get(Venue, [])
+  if venue_ids:
+    tags.add('venues')
+    tags.update(f'venue:{venue_id}' for venue_id in venue_ids)
+    areas = db.session.query(Venue.city, Venue.state).filter(Venue.id.in_(venue_ids)).distinct()
+    tags.update(f'area:{city}|{state}' for city, state in areas)
+  tags.update(f'artist:{artist_id}' for artist_id in changed.get(Artist, []))
+  if tags:
+    page_cache.invalidate(*tags)
+
+app.cli.add_command(create_counters_cli(show_counters, on_change=counters_changed))
+app.cli.add_command(create_calendar_cli(show_calendar, on_refresh=lambda: page_cache.invalidate('shows')))
+
+#  Deleted venues and artists (flask deletions ...)
+#  ----------------------------------------------------------------
+
+app.cli.add_command(create_deletions_cli(deletions, on_change=counters_changed))
+
+#  Venue locations (flask geo ...)
+#  ----------------------------------------------------------------
+
+def venues_located(renamed):
+  # Cities respelled by the gazetteer move venues between areas and change
+  # the copies in the show calendar
+  if renamed:
+    show_calendar.refresh()
+    db.session.commit()
+  page_cache.clear()
+  venue_search.invalidate()
+
+app.cli.add_command(create_geo_cli(venue_locator, on_change=venues_located))
+
+#  JSON API (/api/v1)
+#  ----------------------------------------------------------------
+
+app.register_blueprint(create_api(db, Venue, Artist, Shows, CalendarEntry, detail_shows, venue_search, artist_search,
+                                  venue_locator, show_schedule, show_calendar))
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/metrics')
+def metrics():
+  # Connection pool and per-route query count metrics as JSON
+  if not app.config.get('METRICS_ENABLED'):
+    abort(404)
+  return jsonify({**db_metrics.snapshot(), 'replicas': replicas.snapshot()})
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -517,20 +1148,14 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    # JSON logs and access log written from a background thread (logs.py)
+    log_pipeline = LogPipeline(app)
 
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
-# Default port:
+# Default port (development server; in production use gunicorn.conf.py or asgi.py):
 if __name__ == '__main__':
     app.run()
 
@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point, for uvicorn / hypercorn or gunicorn's UvicornWorker.
+#
+#   uvicorn asgi:application --workers 4
+#
+# The Flask views stay synchronous (Flask-SQLAlchemy sessions are blocking);
+# asgiref runs each request in its thread pool, so an ASGI server front end
+# handles slow clients and keep-alive connections without tying up a thread
+# per idle connection. asgiref and uvicorn are pinned in requirements.txt;
+# uvicorn 0.29 still ships the uvicorn.workers.UvicornWorker class that
+# gunicorn.conf.py names.
+#----------------------------------------------------------------------------#
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+application = WsgiToAsgi(app)
@@ -0,0 +1,257 @@
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+#   flask assets build    # bundle, minify, fingerprint and precompress
+#   flask assets clean    # drop build outputs the manifest no longer names
+#
+# The bundles in ASSET_BUNDLES are concatenated and minified into one file
+# each; every other file under static/ is copied as is. Each output is named
+# after a hash of its content (css/site.3f9a0c1d2e4b.css) and written to
+# static/dist/ with .gz and (when brotli is installed) .br variants, and
+# static/dist/manifest.json maps the logical names to them. Templates link
+# with asset_url('img/front-splash.jpg') or, for bundles,
+#
+#   {% for url in asset_urls('css/site.css') %}...{% endfor %}
+#
+# which yields the built file, or the bundle's sources one by one when
+# nothing has been built (development). Files under /static/dist/ are
+# served precompressed when the client accepts it and cached for a year:
+# a changed file gets a new name.
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:     # optional: gzip variants only
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:     # optional: the built-in CSS minifier is used instead
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:     # optional: scripts are concatenated unminified
+    rjsmin = None
+
+
+# Outputs worth storing compressed, and the smallest worth compressing
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.eot', '.ttf', '.otf', '.json')
+COMPRESS_MIN_SIZE = 1024
+
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)''', re.S)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP = re.compile(r'^//[#@] sourceMappingURL=.*$', re.M)
+
+
+def minify_css(text):
+    # Drop comments and the whitespace around punctuation; strings are
+    # copied untouched. Conservative: "a :hover" keeps its space.
+    def replace(match):
+        string, comment, space = match.groups()
+        if string:
+            return string
+        if comment:
+            return ''
+        before = match.string[match.start() - 1] if match.start() else ''
+        after = match.string[match.end()] if match.end() < len(match.string) else ''
+        if before in '{};,:>' or after in '{};,>' or not before or not after:
+            return ''
+        return ' '
+    return CSS_TOKENS.sub(replace, text).strip()
+
+
+def fingerprint(name, content):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+class Assets:
+
+    def __init__(self, app=None):
+        self._manifest = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSET_BUNDLES', {})
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.app = app
+        self.dist = os.path.join(app.static_folder, 'dist')
+        # More specific than the static rule, so it wins for /static/dist/...
+        app.add_url_rule(f'{app.static_url_path}/dist/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals.update(asset_url=self.url, asset_urls=self.urls)
+
+    # Templates
+
+    def manifest(self):
+        # Loaded once; in debug mode re-read whenever a build rewrites it
+        path = os.path.join(self.dist, 'manifest.json')
+        if self._manifest is None or self.app.debug:
+            try:
+                with open(path) as stream:
+                    self._manifest = json.load(stream)
+            except FileNotFoundError:
+                self._manifest = {}
+        return self._manifest
+
+    def url(self, name):
+        built = self.manifest().get(name)
+        if built is None:
+            return url_for('static', filename=name)
+        return url_for('assets', filename=built)
+
+    def urls(self, bundle):
+        if bundle in self.manifest():
+            return [self.url(bundle)]
+        return [self.url(source) for source in self.app.config['ASSET_BUNDLES'][bundle]]
+
+    # Serving
+
+    def serve(self, filename):
+        accepted = request.accept_encodings
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.isfile(os.path.join(self.dist, filename + suffix)):
+                response = send_from_directory(
+                    self.dist, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist, filename)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = (
+            f"public, max-age={self.app.config['ASSETS_MAX_AGE']}, immutable")
+        return response
+
+    # Build
+
+    def sources(self):
+        # Every file under static/ outside dist/, as posix paths
+        for directory, subdirectories, files in os.walk(self.app.static_folder):
+            if directory == self.app.static_folder and 'dist' in subdirectories:
+                subdirectories.remove('dist')
+            for name in files:
+                path = os.path.join(directory, name)
+                yield os.path.relpath(path, self.app.static_folder).replace(os.sep, '/')
+
+    def read(self, name):
+        with open(os.path.join(self.app.static_folder, name), 'rb') as stream:
+            return stream.read()
+
+    def write(self, name, content):
+        path = os.path.join(self.dist, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as stream:
+            stream.write(content)
+        written = [name]
+        if name.endswith(COMPRESSIBLE) and len(content) >= COMPRESS_MIN_SIZE:
+            # mtime=0 keeps the output identical between builds
+            with open(path + '.gz', 'wb') as stream:
+                stream.write(gzip.compress(content, compresslevel=9, mtime=0))
+            written.append(name + '.gz')
+            if brotli is not None:
+                with open(path + '.br', 'wb') as stream:
+                    stream.write(brotli.compress(content))
+                written.append(name + '.br')
+        return written
+
+    def bundle_css(self, sources, output, manifest):
+        # Relative url()s are resolved against each source and pointed at the
+        # fingerprinted copy, relative to where the bundle is written
+        parts = []
+        for source in sources:
+            base = posixpath.dirname(source)
+            text = self.read(source).decode('utf-8')
+            parts.append(CSS_URL.sub(
+                lambda match, base=base: self._relink(match, base, output, manifest), text))
+        text = '\n'.join(parts)
+        return (rcssmin.cssmin(text) if rcssmin is not None else minify_css(text)).encode('utf-8')
+
+    def _relink(self, match, base, output, manifest):
+        # Absolute and data: urls are kept; missing files keep their path,
+        # which dist/ mirrors
+        target = match.group(2).strip()
+        if re.match(r'^([a-z]+:|/|#)', target, re.I):
+            return match.group(0)
+        split = re.search(r'[?#]', target)
+        path, suffix = (target[:split.start()], target[split.start():]) if split else (target, '')
+        name = posixpath.normpath(posixpath.join(base, path))
+        built = manifest.get(name, name)
+        relative = posixpath.relpath(built, posixpath.dirname(output))
+        return f'url("{relative}{suffix}")'
+
+    def bundle_js(self, sources):
+        # Joined with ';' so two sources never merge into one statement;
+        # source map links would resolve against the bundle, so they go
+        parts = [SOURCE_MAP.sub('', self.read(source).decode('utf-8')) for source in sources]
+        text = ';\n'.join(parts)
+        return (rjsmin.jsmin(text) if rjsmin is not None else text).encode('utf-8')
+
+    def build(self):
+        # Returns the manifest; files first so bundles can link to them
+        bundles = self.app.config['ASSET_BUNDLES']
+        manifest, written = {}, []
+        for name in self.sources():
+            content = self.read(name)
+            manifest[name] = fingerprint(name, content)
+            written.extend(self.write(manifest[name], content))
+        for output, sources in bundles.items():
+            if output.endswith('.css'):
+                content = self.bundle_css(sources, output, manifest)
+            else:
+                content = self.bundle_js(sources)
+            manifest[output] = fingerprint(output, content)
+            written.extend(self.write(manifest[output], content))
+
+        with open(os.path.join(self.dist, 'manifest.json'), 'w') as stream:
+            json.dump(manifest, stream, indent=2, sort_keys=True)
+        self._manifest = manifest
+        return manifest, written
+
+    def clean(self):
+        # Remove outputs not named by the current manifest. Run it once the
+        # pages linking the previous build are no longer served.
+        keep = {'manifest.json'}
+        for built in self.manifest().values():
+            keep.update((built, built + '.gz', built + '.br'))
+        removed = []
+        for directory, _, files in os.walk(self.dist):
+            for name in files:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.dist).replace(os.sep, '/')
+                if relative not in keep:
+                    os.remove(path)
+                    removed.append(relative)
+        return removed
+
+
+def create_assets_cli(assets):
+    cli = AppGroup('assets', help='Build the static asset bundles.')
+
+    @cli.command('build')
+    def build_command():
+        manifest, written = assets.build()
+        for output in assets.app.config['ASSET_BUNDLES']:
+            size = os.path.getsize(os.path.join(assets.dist, manifest[output]))
+            click.echo(f'{output} -> {manifest[output]} ({size} bytes)')
+        click.echo(f'{len(written)} files written to {assets.dist}')
+
+    @cli.command('clean')
+    def clean_command():
+        removed = assets.clean()
+        click.echo(f'{len(removed)} stale files removed')
+
+    return cli
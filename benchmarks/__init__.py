@@ -0,0 +1,2 @@
+# Benchmark scripts for Fyyur. Run from the repository root, e.g.
+#   python -m benchmarks.indexes --database sqlite:////tmp/fyyur-bench.db
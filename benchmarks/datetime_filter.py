@@ -0,0 +1,68 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmark of the `datetime` Jinja filter.
+#
+# Compares the previous filter (dateutil parse + babel format on every call)
+# with format_datetime in app.py, on a show listing's worth of values.
+#
+#   python -m benchmarks.datetime_filter --values 5000 --distinct 500
+#----------------------------------------------------------------------------#
+
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import app, format_datetime, _format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+    # The filter as it was before the formatting cache
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='datetime filter micro-benchmark')
+    parser.add_argument('--values', type=int, default=5000,
+                        help='values formatted per render')
+    parser.add_argument('--distinct', type=int, default=500,
+                        help='distinct start times among them')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    base = datetime(2026, 1, 1, 20)
+    times = [base + timedelta(hours=rng.randrange(24 * 365)) for _ in range(args.distinct)]
+    values = [rng.choice(times) for _ in range(args.values)]
+    strings = [value.strftime('%Y-%m-%d %H:%M:%S') for value in values]
+
+    assert all(legacy_format_datetime(s, 'full') == format_datetime(v, 'full', 'en')
+               for s, v in zip(strings[:100], values[:100]))
+
+    def cold(render):
+        def run():
+            _format_datetime.cache_clear()
+            render()
+        return run
+
+    cases = [
+        ('legacy, string values', lambda: [legacy_format_datetime(s, 'full') for s in strings]),
+        ('new, string values', cold(lambda: [format_datetime(s, 'full', 'en') for s in strings])),
+        ('new, datetime values, cold cache', cold(lambda: [format_datetime(v, 'full', 'en') for v in values])),
+        ('new, datetime values, warm cache', lambda: [format_datetime(v, 'full', 'en') for v in values]),
+    ]
+    with app.app_context():
+        for label, case in cases:
+            best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+            print(f"{label:36} {best * 1000:9.2f} ms  ({best / args.values * 1e6:.2f} us/value)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#----------------------------------------------------------------------------#
+# Index benchmark.
+#
+# Seeds a synthetic catalog, then runs the query functions from app.py with
+# and without the Show / lowercase-name indexes (migration 8a4d6e0c2f15).
+# Every statement the functions issue is captured and EXPLAINed, so the
+# plans shown are for the exact SQL the app runs.
+#
+#   python -m benchmarks.indexes --database sqlite:////tmp/fyyur-bench.db
+#   python -m benchmarks.indexes --database postgresql://localhost/fyyur_bench --shows 1000000
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import (app, db, Venue, Artist, Shows, detail_shows, show_calendar, show_counters,
+                 show_feed, venue_areas, venue_locator)
+from benchmarks.seed import seed
+
+INDEX_NAMES = (
+    'ix_Show_venue_id_start_time',
+    'ix_Show_artist_id_start_time',
+    'ix_Show_start_time_id',
+    'ix_Venue_name_lower',
+    'ix_Artist_name_lower',
+)
+
+
+def benchmark_indexes():
+    tables = (Shows.__table__, Venue.__table__, Artist.__table__)
+    return [index for table in tables for index in table.indexes if index.name in INDEX_NAMES]
+
+
+def query_cases():
+    # (label, callable) pairs covering each query shape the indexes target
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    venue_name = db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+    return [
+        ('venue page shows', lambda: detail_shows(
+            Shows.venue_id, venue_id, Artist, Shows.artist_id, 'artist')),
+        ('artist page shows', lambda: detail_shows(
+            Shows.artist_id, artist_id, Venue, Shows.venue_id, 'venue')),
+        ('show feed, first page', lambda: show_feed()),
+        ('show feed, from now', lambda: show_feed(after=(datetime.now(), 0))),
+        ('venue areas', lambda: list(venue_areas())),
+        ('venues nearby', lambda: venue_locator.nearby(32.7555, -97.3308, 25)),
+        ('venue by name', lambda: Venue.query.filter(
+            db.func.lower(Venue.name) == venue_name.lower()).first()),
+    ]
+
+
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    # SQLite returns (id, parent, notused, detail); PostgreSQL one text column
+    return [row[-1] for row in rows]
+
+
+def run_cases(repeat):
+    results = []
+    for label, case in query_cases():
+        with captured_statements() as statements:
+            case()
+        plans = [explain(statement, parameters) for statement, parameters in statements]
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - start)
+            db.session.rollback()
+        timings.sort()
+        results.append((label, timings[len(timings) // 2], plans))
+    return results
+
+
+def report(title, results):
+    print(f"\n=== {title} ===")
+    for label, median, plans in results:
+        print(f"\n{label}: median {median * 1000:.2f} ms")
+        for plan in plans:
+            for line in plan:
+                print(f"    {line}")
+            print("    --")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='EXPLAIN plans and timings with and without the Show indexes')
+    parser.add_argument('--database', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur-bench.db'))
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--reseed', action='store_true',
+                        help='drop and regenerate the catalog')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    with app.app_context():
+        if args.reseed:
+            db.drop_all()
+        db.create_all()
+        if not db.session.query(Shows.id).first():
+            print(f"Seeding {args.venues} venues, {args.artists} artists, {args.shows} shows...")
+            seed(db, Venue, Artist, Shows,
+                 venues=args.venues, artists=args.artists, shows=args.shows,
+                 counters=show_counters, calendar=show_calendar, locator=venue_locator)
+
+        indexes = benchmark_indexes()
+        for index in indexes:
+            # IF EXISTS: a previous interrupted run may have left them dropped
+            db.session.execute(db.text(f'DROP INDEX IF EXISTS "{index.name}"'))
+        db.session.commit()
+        report('without indexes', run_cases(args.repeat))
+
+        for index in indexes:
+            index.create(bind=db.engine)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        report('with indexes', run_cases(args.repeat))
+
+
+if __name__ == '__main__':
+    main()
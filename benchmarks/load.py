@@ -0,0 +1,157 @@
+#----------------------------------------------------------------------------#
+# Load test.
+#
+# Drives a running server with a growing number of concurrent clients and
+# reports throughput and latency percentiles at each step. The step with the
+# highest throughput whose p95 stays under --latency-ms is the capacity of
+# the serving mode at that latency. With --server the harness starts each
+# command itself, so serving modes can be compared in one run:
+#
+#   python -m benchmarks.load http://127.0.0.1:5000 \
+#       --server 'python app.py' \
+#       --server 'gunicorn -c gunicorn.conf.py app:app'
+#
+# Paths default to the read-heavy pages and are requested round robin.
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import shlex
+import subprocess
+import threading
+import time
+from itertools import count
+from urllib.parse import urlsplit
+
+from instrumentation import percentile
+
+DEFAULT_PATHS = (
+    '/venues', '/artists', '/shows', '/venues/1', '/artists/1',
+    '/venues/search?search_term=the', '/artists/search?search_term=band',
+)
+
+
+class Client(threading.Thread):
+    # One keep-alive connection issuing requests back to back until `stop`
+
+    def __init__(self, host, port, paths, stop, offset):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.paths = paths
+        self.stop = stop
+        self.offset = offset
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        conn = None
+        for i in count(self.offset):
+            if self.stop.is_set():
+                break
+            path = self.paths[i % len(self.paths)]
+            start = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    self.errors += 1
+                if response.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn = None
+                continue
+            self.latencies.append(time.perf_counter() - start)
+        if conn is not None:
+            conn.close()
+
+
+def run_step(host, port, paths, concurrency, duration):
+    stop = threading.Event()
+    clients = [Client(host, port, paths, stop, offset) for offset in range(concurrency)]
+    for client in clients:
+        client.start()
+    time.sleep(duration)
+    stop.set()
+    for client in clients:
+        client.join()
+    latencies = [latency for client in clients for latency in client.latencies]
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(client.errors for client in clients),
+        'rps': len(latencies) / duration,
+        'p50': percentile(latencies, 0.5) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def wait_for(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on {host}:{port}')
+
+
+def measure(args, host, port):
+    print(f"{'clients':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    best = None
+    concurrency = 1
+    while concurrency <= args.max_concurrency:
+        step = run_step(host, port, args.paths, concurrency, args.duration)
+        print(f"{step['concurrency']:>8} {step['rps']:>9.1f} {step['p50']:>8.1f} "
+              f"{step['p95']:>8.1f} {step['p99']:>8.1f} {step['errors']:>7}")
+        if step['p95'] > args.latency_ms:
+            break
+        if best is None or step['rps'] > best['rps']:
+            best = step
+        concurrency *= 2
+    if best is None:
+        print(f'p95 exceeded {args.latency_ms} ms even with one client')
+    else:
+        print(f"capacity at p95 <= {args.latency_ms} ms: {best['rps']:.1f} req/s "
+              f"with {best['concurrency']} clients")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput at a fixed latency target')
+    parser.add_argument('url', help='base URL, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--paths', nargs='+', default=list(DEFAULT_PATHS))
+    parser.add_argument('--duration', type=float, default=10, help='seconds per step')
+    parser.add_argument('--latency-ms', type=float, default=200, help='p95 target')
+    parser.add_argument('--max-concurrency', type=int, default=256)
+    parser.add_argument('--server', action='append', default=[],
+                        help='command starting the server under test; repeatable')
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+    if not args.server:
+        measure(args, host, port)
+        return
+    for command in args.server:
+        print(f'\n=== {command} ===')
+        server = subprocess.Popen(shlex.split(command), stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            wait_for(host, port)
+            measure(args, host, port)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#----------------------------------------------------------------------------#
+# Route benchmark.
+#
+# Seeds a synthetic catalog at the chosen scale, then requests every GET
+# route of the app through the Flask test client and records latency
+# percentiles, queries per request (from the app's per-endpoint query
+# metrics, which also see the queries of streamed pages) and the peak memory allocated while handling one request. Results can be stored
+# as a baseline and later runs compared against it; a run that is slower
+# than the baseline by more than --tolerance, or issues more queries, is
+# reported as a regression and exits with status 1. Timings depend on the
+# machine, so baselines are not committed: without one at the --baseline
+# path the run only reports, and says how to record one.
+#
+#   python -m benchmarks.routes --scale small --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.routes --scale small --baseline benchmarks/baseline.json
+#   python -m benchmarks.routes --database postgresql://localhost/fyyur_bench --scale large
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app import app, db, db_metrics, Venue, Artist, Shows, show_calendar, show_counters, venue_locator
+from benchmarks.seed import seed
+from instrumentation import percentile
+
+# (venues, artists, shows)
+SCALES = {
+    'tiny': (100, 100, 1000),
+    'small': (1000, 2000, 100000),
+    'large': (10000, 20000, 1000000),
+}
+
+# Endpoints with no meaningful GET benchmark
+SKIPPED = {'static', 'assets', 'metrics'}
+
+
+def sample_ids():
+    venue = db.session.query(Venue.id, Venue.city, Venue.state, Venue.name).order_by(Venue.id).first()
+    artist = db.session.query(Artist.id, Artist.name).order_by(Artist.id).first()
+    return venue, artist
+
+
+def route_cases():
+    # (label, endpoint, url) for every GET route; routes with arguments get
+    # the first venue/artist, listings and searches a few typical variants
+    venue, artist = sample_ids()
+    word = venue.name.split()[1].lower()
+    cases = {
+        'index': ['/'],
+        'venues': ['/venues', f'/venues?city={venue.city}&state={venue.state}', '/venues?genre=Jazz'],
+        'artists': ['/artists', '/artists?genre=Jazz'],
+        'shows': ['/shows', f'/shows?city={venue.city}', '/shows?genre=Jazz'],
+        'search_venues': [f'/venues/search?search_term={word}'],
+        'search_artists': [f'/artists/search?search_term={word}'],
+        'venue_typeahead': [f'/venues/typeahead?q={word[:3]}'],
+        'artist_typeahead': [f'/artists/typeahead?q={word[:3]}'],
+        'api.venues': ['/api/v1/venues', '/api/v1/venues?fields=name,num_upcoming_shows,genres'],
+        'api.artists': ['/api/v1/artists'],
+        'api.shows': ['/api/v1/shows', f'/api/v1/shows?city={venue.city}'],
+        'api.venues_search': [f'/api/v1/venues/search?q={word}'],
+        'venues_nearby': [f'/venues/nearby?city={venue.city}&state={venue.state}'],
+        'api.venues_nearby': [f'/api/v1/venues/nearby?city={venue.city}&state={venue.state}'],
+        'api.shows_nearby': [f'/api/v1/shows/nearby?city={venue.city}&state={venue.state}'],
+        'api.artists_search': [f'/api/v1/artists/search?q={word}'],
+    }
+    ids = {'venue_id': venue.id, 'artist_id': artist.id, 'entity_id': venue.id}
+
+    found, missing = [], []
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.endpoint in SKIPPED:
+            continue
+        if rule.endpoint in cases:
+            urls = cases[rule.endpoint]
+        elif all(argument in ids for argument in rule.arguments):
+            values = dict(ids, entity_id=artist.id) if rule.endpoint.startswith('api.artists') else ids
+            urls = [rule.build({name: values[name] for name in rule.arguments})[1]]
+        else:
+            missing.append(rule.endpoint)
+            continue
+        found.extend((url, rule.endpoint, url) for url in urls)
+    return sorted(set(found), key=lambda case: case[0]), missing
+
+
+def endpoint_queries(endpoint):
+    # Queries issued so far by `endpoint`, counted up to the end of each
+    # request, streamed bodies included
+    stats = db_metrics.snapshot()['requests'].get(endpoint)
+    return stats['queries'] if stats else 0
+
+
+def fetch(client, url):
+    # The whole body: streamed pages do most of their work while it is read
+    response = client.get(url)
+    response.get_data()
+    response.close()
+    return response
+
+
+def measure(client, endpoint, url, requests, warmup):
+    for _ in range(warmup):
+        fetch(client, url)
+    latencies, queries, status = [], [], None
+    for _ in range(requests):
+        before = endpoint_queries(endpoint)
+        start = time.perf_counter()
+        response = fetch(client, url)
+        latencies.append(time.perf_counter() - start)
+        status = response.status_code
+        queries.append(endpoint_queries(endpoint) - before)
+
+    # Memory in a separate request: tracing slows everything down
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fetch(client, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'status': status,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries': max(queries),
+        'peak_kib': peak / 1024,
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    # Regressions: p50 slower by more than both the tolerance and
+    # min_delta_ms (sub-millisecond routes are noisy), or more queries
+    regressions = []
+    for label, result in results.items():
+        before = baseline.get(label)
+        if before is None:
+            continue
+        slower = result['p50_ms'] - before['p50_ms']
+        if slower > before['p50_ms'] * tolerance and slower > min_delta_ms:
+            regressions.append(f"{label}: p50 {before['p50_ms']:.2f} -> {result['p50_ms']:.2f} ms")
+        if result['queries'] > before['queries']:
+            regressions.append(f"{label}: queries {before['queries']} -> {result['queries']}")
+    return regressions
+
+
+def report(results, baseline):
+    print(f"{'route':<60} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'queries':>7} {'peak KiB':>9} {'vs base':>8}")
+    for label, result in results.items():
+        change = ''
+        if baseline and label in baseline and baseline[label]['p50_ms']:
+            change = f"{result['p50_ms'] / baseline[label]['p50_ms'] - 1:+.0%}"
+        print(f"{label[:60]:<60} {result['status']:>6} {result['p50_ms']:>8.2f} "
+              f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries']:>7} "
+              f"{result['peak_kib']:>9.0f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency, queries and memory for every route')
+    parser.add_argument('--database', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur-routes.db'))
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--cache', action='store_true', help='keep the page cache enabled')
+    parser.add_argument('--reseed', action='store_true', help='drop and regenerate the catalog')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed p50 slowdown before flagging, as a fraction')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='ignore p50 slowdowns smaller than this')
+    args = parser.parse_args()
+
+    # Read before the run, which takes a while
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)['results']
+    elif args.baseline:
+        print(f'No baseline at {args.baseline}, comparison skipped; '
+              f'record one with --save-baseline {args.baseline}')
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    app.config['CACHE_ENABLED'] = args.cache
+    app.config['SLOW_QUERY_MS'] = float('inf')
+    venues, artists, shows = SCALES[args.scale]
+
+    with app.app_context():
+        if args.reseed:
+            db.drop_all()
+        db.create_all()
+        if not db.session.query(Shows.id).first():
+            print(f"Seeding {venues} venues, {artists} artists, {shows} shows...")
+            seed(db, Venue, Artist, Shows, venues=venues, artists=artists, shows=shows,
+                 counters=show_counters, calendar=show_calendar, locator=venue_locator)
+        cases, missing = route_cases()
+
+    client = app.test_client()
+    results = {}
+    for label, endpoint, url in cases:
+        results[label] = dict(measure(client, endpoint, url, args.requests, args.warmup),
+                              endpoint=endpoint)
+
+    report(results, baseline)
+    if missing:
+        print(f"\nnot benchmarked (needs arguments): {', '.join(sorted(missing))}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as stream:
+            json.dump({'scale': args.scale, 'database': args.database.split(':', 1)[0],
+                       'results': results}, stream, indent=2, sort_keys=True)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print('\nregressions:')
+            for line in regressions:
+                print(f'  {line}')
+            raise SystemExit(1)
+        print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#----------------------------------------------------------------------------#
+# Scheduling benchmark.
+#
+# Seeds a synthetic catalog (a million shows by default), then times the
+# show conflict check and the availability query from scheduling.py at
+# random venues, artists and times, and prints the plan of each. The
+# conflict check reads a bounded range of the (venue_id, start_time) and
+# (artist_id, start_time) indexes, so its time should not grow with the
+# number of shows: the run fails if its median exceeds --budget-ms.
+#
+#   python -m benchmarks.scheduling --database sqlite:////tmp/fyyur-schedule.db
+#   python -m benchmarks.scheduling --database postgresql://localhost/fyyur_bench --shows 5000000
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import app, db, Venue, Artist, Shows, show_schedule
+from benchmarks.indexes import captured_statements, explain
+from benchmarks.seed import seed
+
+
+def timed(case, probes):
+    # In one transaction, as the checks run within a request's
+    timings = []
+    for probe in probes:
+        start = time.perf_counter()
+        case(*probe)
+        timings.append(time.perf_counter() - start)
+    db.session.rollback()
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Timings of the show conflict check and availability query')
+    parser.add_argument('--database', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur-schedule.db'))
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--probes', type=int, default=1000)
+    parser.add_argument('--budget-ms', type=float, default=1.0,
+                        help='largest acceptable median for the conflict check')
+    parser.add_argument('--reseed', action='store_true',
+                        help='drop and regenerate the catalog')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    with app.app_context():
+        if args.reseed:
+            db.drop_all()
+        db.create_all()
+        if not db.session.query(Shows.id).first():
+            print(f"Seeding {args.venues} venues, {args.artists} artists, {args.shows} shows...")
+            seed(db, Venue, Artist, Shows,
+                 venues=args.venues, artists=args.artists, shows=args.shows)
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+        rng = random.Random(0)
+        venue_ids = [id for (id,) in db.session.query(Venue.id)]
+        artist_ids = [id for (id,) in db.session.query(Artist.id)]
+        total = db.session.query(db.func.count(Shows.id)).scalar()
+        now = datetime.now()
+
+        def probe():
+            start = now + timedelta(minutes=rng.randint(-525600, 525600))
+            return rng.choice(venue_ids), rng.choice(artist_ids), start, start + timedelta(hours=2)
+
+        def availability(venue_id, artist_id, start, end):
+            show_schedule.free_slots(Shows.venue_id, [venue_id], start, start + timedelta(days=30))
+
+        def bulk_availability(venue_id, artist_id, start, end):
+            show_schedule.free_slots(Shows.venue_id, rng.sample(venue_ids, min(50, len(venue_ids))),
+                                     start, start + timedelta(days=30))
+
+        cases = [
+            ('conflict check', show_schedule.conflicts),
+            ('free slots, one venue, 30 days', availability),
+            ('free slots, 50 venues, 30 days', bulk_availability),
+        ]
+        print(f"\n=== {total} shows, {args.probes} probes ===")
+        over_budget = False
+        for label, case in cases:
+            with captured_statements() as statements:
+                case(*probe())
+            plans = [explain(statement, parameters) for statement, parameters in statements]
+            median, p99 = timed(case, [probe() for _ in range(args.probes)])
+            print(f"\n{label}: median {median * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms")
+            for plan in plans:
+                for line in plan:
+                    print(f"    {line}")
+            if case is show_schedule.conflicts and median * 1000 > args.budget_ms:
+                over_budget = True
+                print(f"    median over the {args.budget_ms} ms budget")
+        if over_budget:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#----------------------------------------------------------------------------#
+# Synthetic catalog generator shared by the benchmark scripts.
+#----------------------------------------------------------------------------#
+
+import random
+from datetime import datetime, timedelta
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Fort Worth', 'TX'),
+    ('Seattle', 'WA'), ('Chicago', 'IL'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Portland', 'OR'), ('Denver', 'CO'),
+]
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+]
+WORDS = [
+    'Musical', 'Hop', 'Park', 'Square', 'Live', 'Coffee', 'Dueling',
+    'Pianos', 'Bar', 'Wild', 'Sax', 'Band', 'Guns', 'Petals', 'Blue',
+    'Room', 'Hall', 'Lounge', 'Echo', 'Velvet', 'Crystal', 'Garden',
+]
+
+
+SHOW_MINUTES = 120
+
+
+def _name(rng, index):
+    return f"The {rng.choice(WORDS)} {rng.choice(WORDS)} {index}"
+
+
+def _genres(rng):
+    return ",".join(rng.sample(GENRES, rng.randint(1, 3)))
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed(db, Venue, Artist, Shows, venues=1000, artists=1000, shows=10000,
+         seed=0, chunk_size=5000, now=None, counters=None, calendar=None, locator=None):
+    # Bulk insert a reproducible catalog; the same arguments always produce
+    # the same rows. Shows are spread over two years centred on `now`.
+    # Pass the app's ShowCounters, ShowCalendar and VenueLocator to rebuild
+    # the derived show counters and calendar tables and geocode the venues.
+    rng = random.Random(seed)
+    now = now or datetime.now()
+
+    def venue_rows():
+        for i in range(venues):
+            city, state = rng.choice(CITIES)
+            yield {
+                'name': _name(rng, i), 'city': city, 'state': state,
+                'address': f"{rng.randint(1, 999)} Main St",
+                'phone': f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+                'genres': _genres(rng), 'image_link': 'https://example.com/venue.jpg',
+                'seeking_talent': rng.random() < 0.3,
+            }
+
+    def artist_rows():
+        for i in range(artists):
+            city, state = rng.choice(CITIES)
+            yield {
+                'name': _name(rng, i), 'city': city, 'state': state,
+                'genres': _genres(rng), 'image_link': 'https://example.com/artist.jpg',
+                'seeking_venue': rng.random() < 0.3,
+            }
+
+    def show_rows(venue_ids, artist_ids):
+        # Two-hour shows in two-hour slots; a draw that would double-book a
+        # venue or artist is redrawn, as the app (and on PostgreSQL the
+        # exclusion constraints) would refuse it
+        slots = 525600 // SHOW_MINUTES
+        if shows > min(len(venue_ids), len(artist_ids)) * (2 * slots + 1) // 2:
+            raise ValueError('too many shows for the venues and artists to host without overlaps')
+        booked = set()
+        for _ in range(shows):
+            while True:
+                venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+                slot = rng.randint(-slots, slots)
+                if ('venue', venue_id, slot) not in booked and ('artist', artist_id, slot) not in booked:
+                    break
+            booked.update((('venue', venue_id, slot), ('artist', artist_id, slot)))
+            start_time = now + timedelta(minutes=slot * SHOW_MINUTES)
+            yield {
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'end_time': start_time + timedelta(minutes=SHOW_MINUTES),
+            }
+
+    def insert(model, rows):
+        for chunk in _chunks(rows, chunk_size):
+            db.session.execute(model.__table__.insert(), chunk)
+        db.session.commit()
+
+    def link_genres(model):
+        # Fill the normalized genre links from the comma-joined column
+        links = model.genre_list.property.secondary
+        Genre = model.genre_list.property.mapper.class_
+        owner = next(column.name for column in links.c if column.name != 'genre_id')
+        genre_ids = dict(db.session.query(Genre.name, Genre.id))
+        missing = [{'name': name} for name in GENRES if name not in genre_ids]
+        if missing:
+            db.session.execute(Genre.__table__.insert(), missing)
+            genre_ids = dict(db.session.query(Genre.name, Genre.id))
+        insert_links = (
+            {owner: owner_id, 'genre_id': genre_ids[name]}
+            for owner_id, genres in db.session.query(model.id, model.genres)
+            for name in genres.split(',')
+        )
+        for chunk in _chunks(insert_links, chunk_size):
+            db.session.execute(links.insert(), chunk)
+        db.session.commit()
+
+    insert(Venue, venue_rows())
+    insert(Artist, artist_rows())
+    link_genres(Venue)
+    link_genres(Artist)
+    venue_ids = [id for (id,) in db.session.query(Venue.id)]
+    artist_ids = [id for (id,) in db.session.query(Artist.id)]
+    insert(Shows, show_rows(venue_ids, artist_ids))
+    if locator is not None:
+        locator.locate_all(chunk_size=chunk_size)
+        db.session.commit()
+    if counters is not None:
+        counters.check(repair=True)
+        db.session.commit()
+    if calendar is not None:
+        calendar.refresh()
+        db.session.commit()
@@ -0,0 +1,232 @@
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered GET pages are stored per path, query string and locale, together
+# with the versions of the tags they depend on ("venue:3", "area:Austin|TX",
+# "shows", ...). Write handlers bump the tags they touch; an entry is only
+# served while every tag it recorded is still at the same version, so
+# invalidation never has to find or scan keys. Entries also carry an ETag so
+# browsers revalidating with If-None-Match get a 304. Streamed pages are
+# stored once the last chunk has been sent, unless they outgrow
+# CACHE_MAX_ENTRY_BYTES. Pages rendered for the cache call `on_fill` first,
+# which the app uses to read them from the primary: a replica lagging
+# behind the write that invalidated a page would otherwise store its old
+# content under the new tag versions.
+#
+# Backends: an in-process LRU with TTL (default) or any Redis-compatible
+# client (CACHE_BACKEND = 'redis', CACHE_REDIS_URL).
+#----------------------------------------------------------------------------#
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, request, session
+
+
+class MemoryBackend:
+    # Bounded LRU of entries with per-entry expiry. Tag versions live in a
+    # separate dict that is never evicted, so a version cannot reset to a
+    # value an old entry recorded.
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class RedisBackend:
+    # Same interface over a Redis-compatible client: entries are pickled
+    # with SETEX, tag versions are plain counters read with one MGET.
+
+    def __init__(self, client, ttl=60, prefix='fyyur:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, pickle.dumps(value))
+
+    def versions(self, tags):
+        if not tags:
+            return []
+        raw = self.client.mget([self.prefix + 'tag:' + tag for tag in tags])
+        return [int(value) if value is not None else 0 for value in raw]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(self.prefix + 'tag:' + tag)
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class PageCache:
+
+    def __init__(self, app=None, vary=None, on_fill=None):
+        self.backend = None
+        self.vary = vary      # extra key component, e.g. the request locale
+        self.on_fill = on_fill
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_ENABLED', True)
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_TTL', 60)
+        app.config.setdefault('CACHE_MAXSIZE', 1024)
+        app.config.setdefault('CACHE_MAX_ENTRY_BYTES', 1024 * 1024)
+        self.app = app
+
+    def get_backend(self):
+        # Built on first use so the config can still change after import
+        if self.backend is None:
+            config = self.app.config
+            if config['CACHE_BACKEND'] == 'redis':
+                import redis    # optional dependency, only for this backend
+                client = redis.Redis.from_url(config['CACHE_REDIS_URL'])
+                self.backend = RedisBackend(client, ttl=config['CACHE_TTL'])
+            else:
+                self.backend = MemoryBackend(config['CACHE_MAXSIZE'], config['CACHE_TTL'])
+        return self.backend
+
+    def make_key(self):
+        args = sorted(request.args.items(multi=True))
+        query = '&'.join(f'{name}={value}' for name, value in args)
+        extra = self.vary() if self.vary else ''
+        return f'page:{request.path}?{query}|{extra}'
+
+    def tag(self, *tags):
+        # Record dependencies discovered while rendering (e.g. the artists
+        # listed on a venue page), at their version now: a write to one of
+        # them before the view returns then leaves the entry stale instead
+        # of storing the old content under the new version. A no-op outside
+        # cached views.
+        if 'cache_tags' in g:
+            new = [tag for tag in dict.fromkeys(tags) if tag not in g.cache_tags]
+            g.cache_tags.update(zip(new, self.get_backend().versions(new)))
+
+    def invalidate(self, *tags):
+        self.get_backend().bump(tags)
+
+    def clear(self):
+        self.get_backend().clear()
+
+    def _store(self, backend, key, body, mimetype, tags):
+        entry = {
+            'body': body,
+            'mimetype': mimetype,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'tags': tags,
+        }
+        backend.set(key, entry)
+        return entry
+
+    def _tee(self, chunks, backend, key, mimetype, tags):
+        # Pass a streamed body through, keeping a copy to store at the end.
+        # A client that disconnects early closes the generator before the
+        # store, so partial pages are never cached.
+        limit = self.app.config['CACHE_MAX_ENTRY_BYTES']
+        parts, size = [], 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= limit:
+                    parts.append(chunk)
+                else:
+                    parts = None    # too big to cache, keep streaming
+            yield chunk
+        if parts is not None:
+            self._store(backend, key, b''.join(parts), mimetype, tags)
+
+    def cached(self, *tags):
+        # Cache a GET view. `tags` are format strings filled from the view
+        # arguments, e.g. 'venue:{venue_id}'; a callable receives the view
+        # arguments and returns the tags.
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if (request.method != 'GET' or not self.app.config['CACHE_ENABLED']
+                        or session.get('_flashes')):
+                    return view(**kwargs)
+
+                backend = self.get_backend()
+                key = self.make_key()
+                entry = backend.get(key)
+                if entry is not None and backend.versions(entry['tags']) == list(entry['tags'].values()):
+                    response = make_response(entry['body'])
+                    response.mimetype = entry['mimetype']
+                else:
+                    declared = set()
+                    for tag in tags:
+                        if callable(tag):
+                            declared.update(tag(**kwargs))
+                        else:
+                            declared.add(tag.format(**kwargs))
+                    # Snapshot before rendering: a write committed meanwhile
+                    # bumps past this version and the entry is never served
+                    snapshot = dict(zip(declared, backend.versions(list(declared))))
+                    if self.on_fill is not None:
+                        self.on_fill()
+                    g.cache_tags = dict(snapshot)
+                    response = make_response(view(**kwargs))
+                    snapshot = dict(g.cache_tags)
+                    if response.status_code != 200:
+                        return response
+                    if response.is_streamed:
+                        # Headers are already final: no ETag on this one
+                        response.response = self._tee(
+                            response.iter_encoded(), backend, key, response.mimetype, snapshot)
+                        return response
+                    entry = self._store(backend, key, response.get_data(), response.mimetype, snapshot)
+
+                response.set_etag(entry['etag'])
+                response.headers['Cache-Control'] = 'no-cache'   # always revalidate
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
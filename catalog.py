@@ -0,0 +1,428 @@
+#----------------------------------------------------------------------------#
+# Catalog import / export.
+#
+#   flask catalog import venues venues.csv
+#   flask catalog import shows shows.jsonl --chunk-size 5000 --errors bad.txt
+#   flask catalog export shows shows.csv
+#
+# Rows are streamed from CSV or JSON Lines and validated with the same
+# VenueForm / ArtistForm / ShowForm the web forms use. Valid rows are
+# inserted in chunks, one transaction per chunk. Shows may reference venues
+# and artists by id or by name (plus city/state when a name is ambiguous),
+# and last `duration` minutes (or until `end_time`; default 120). Shows that
+# overlap a stored show, or an earlier row of the file, at the same venue or
+# with the same artist are rejected; ids and overlaps are looked up once
+# per chunk, not per row.
+# Invalid rows, and JSON Lines that do not parse as an object, are reported
+# with their line number and skipped. If a chunk
+# fails in the database, it is retried row by row so only the offending rows
+# are lost. Exports stream from a server-side cursor in chunks, so memory
+# stays bounded at any catalog size. Deleted venues and artists
+# (deletions.py) are neither exported nor matched by name.
+#
+# After an import the app drops its cached pages (on_import). The import
+# runs in its own process: with CACHE_BACKEND = 'memory' each server
+# process keeps its own cache, which the import cannot reach, and serves
+# its pages until they expire (CACHE_TTL). Use the 'redis' backend to have
+# imports show up at once.
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+import sys
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+from forms import ArtistForm, ShowForm, VenueForm, known_artist_ids, known_venue_ids
+from scheduling import PendingShows
+
+VENUE_FIELDS = (
+    'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website_link', 'seeking_talent', 'seeking_description',
+)
+ARTIST_FIELDS = (
+    'name', 'city', 'state', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website_link', 'seeking_venue', 'seeking_description',
+)
+SHOW_EXPORT_FIELDS = ('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'start_time', 'end_time')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 't')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def open_path(path, mode):
+    # '-' is stdin/stdout; files are opened with newline='' for the csv module
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    # Yield (line number, dict of strings) without loading the whole file;
+    # a line that is not a JSON object yields the error message instead
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield line_no, f'invalid JSON: {error}'
+                continue
+            yield line_no, row if isinstance(row, dict) else 'invalid JSON: not an object'
+
+
+def form_data(row, multi=('genres',), booleans=()):
+    # Turn an input row into the MultiDict a browser would have posted
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None or key is None:
+            continue
+        if key in multi:
+            values = value if isinstance(value, list) else str(value).split(',')
+            for item in values:
+                if item.strip():
+                    data.add(key, item.strip())
+        elif key in booleans:
+            if str(value).strip().lower() in TRUE_VALUES or value is True:
+                data.add(key, 'y')
+        else:
+            data.add(key, str(value).strip())
+    return data
+
+
+def show_end(form):
+    return form.start_time.data + timedelta(minutes=form.duration.data)
+
+
+def form_id(field):
+    try:
+        return int(field.data)
+    except (TypeError, ValueError):
+        return None
+
+
+def form_errors(form):
+    return '; '.join(f"{field}: {', '.join(messages)}" for field, messages in form.errors.items())
+
+
+class Importer:
+
+    def __init__(self, db, models, chunk_size, report, schedule=None):
+        self.db = db
+        self.Venue, self.Artist, self.Shows, self.Genre = models
+        self.chunk_size = chunk_size
+        self.report = report        # callable(line_no, message)
+        self.schedule = schedule    # scheduling.Schedule, to reject conflicting shows
+        self.inserted = 0
+        self.rejected = 0
+        self._genre_ids = None
+        self._names = {}            # model -> {lower(name): [(id, city, state)]}
+
+    def reject(self, line_no, message):
+        self.rejected += 1
+        self.report(line_no, message)
+
+    # Venues and artists
+
+    def genre_ids(self, names):
+        if self._genre_ids is None:
+            self._genre_ids = dict(self.db.session.query(self.Genre.name, self.Genre.id))
+        missing = [name for name in names if name not in self._genre_ids]
+        if missing:
+            for name in missing:
+                genre = self.Genre(name=name)
+                self.db.session.add(genre)
+                self.db.session.flush()
+                self._genre_ids[name] = genre.id
+        return [self._genre_ids[name] for name in names]
+
+    def import_entities(self, rows, model, form_class, fields, boolean):
+        links = model.genre_list.property.secondary
+        owner_column = next(column.name for column in links.c if column.name != 'genre_id')
+
+        def insert(chunk):
+            entities = []
+            for line_no, form in chunk:
+                values = {field: getattr(form, field).data for field in fields if field != 'genres'}
+                entities.append(model(genres=','.join(form.genres.data), **values))
+            self.db.session.add_all(entities)
+            self.db.session.flush()         # assigns ids for the genre links
+            link_rows = [
+                {owner_column: entity.id, 'genre_id': genre_id}
+                for entity, (_, form) in zip(entities, chunk)
+                for genre_id in self.genre_ids(list(dict.fromkeys(form.genres.data)))
+            ]
+            if link_rows:
+                self.db.session.execute(links.insert(), link_rows)
+
+        self._run(rows, insert, lambda row: form_class(
+            formdata=form_data(row, booleans=(boolean,)), meta={'csrf': False}))
+
+    # Shows
+
+    def resolve(self, model, row, prefix):
+        # Id from <prefix>_id, or looked up by <prefix>_name (+ city/state)
+        if row.get(f'{prefix}_id'):
+            return str(row[f'{prefix}_id']).strip(), None
+        name = (row.get(f'{prefix}_name') or '').strip().lower()
+        if not name:
+            return None, f'{prefix}_id or {prefix}_name is required'
+        cache = self._names.setdefault(model, {})
+        if name not in cache:
+            cache[name] = self.db.session.query(model.id, model.city, model.state).filter(
+                self.db.func.lower(model.name) == name, model.deleted_at.is_(None)).all()
+        matches = cache[name]
+        city, state = row.get(f'{prefix}_city'), row.get(f'{prefix}_state')
+        if city:
+            matches = [m for m in matches if (m.city or '').lower() == city.strip().lower()]
+        if state:
+            matches = [m for m in matches if m.state == state.strip()]
+        if not matches:
+            return None, f'no {prefix} named {row.get(f"{prefix}_name")!r}'
+        if len(matches) > 1:
+            return None, f'{prefix} name {row.get(f"{prefix}_name")!r} is ambiguous, add {prefix}_city/{prefix}_state'
+        return str(matches[0].id), None
+
+    def import_shows(self, rows):
+        # Valid rows of the chunk being read, not yet in the database
+        pending = PendingShows(self.schedule.max_duration) if self.schedule else None
+
+        def validate(row):
+            data = dict(row)
+            for model, prefix in ((self.Venue, 'venue'), (self.Artist, 'artist')):
+                ref, error = self.resolve(model, row, prefix)
+                if error:
+                    return error
+                if not ref.isdigit():
+                    return f'{prefix}_id: not a valid id'
+                data[f'{prefix}_id'] = ref
+            start_time = str(row.get('start_time') or '').strip()
+            try:
+                start = datetime.fromisoformat(start_time)
+                data['start_time'] = start.strftime(TIME_FORMAT)
+                end_time = data.pop('end_time', None)
+                if end_time and not row.get('duration'):
+                    # Exported rows carry end_time; ShowForm takes minutes
+                    minutes = (datetime.fromisoformat(str(end_time).strip()) - start).total_seconds() // 60
+                    data['duration'] = str(int(minutes))
+            except ValueError:
+                pass        # left for ShowForm to report
+            return ShowForm(formdata=form_data(data, multi=()), meta={'csrf': False})
+
+        # The stored shows each form of the chunk overlaps
+        stored_conflicts = {}
+
+        @contextmanager
+        def prepare(forms):
+            # The chunk's venue and artist ids and stored conflicts, looked
+            # up in one query each rather than row by row
+            venue_ids = {form_id(form.venue_id) for form in forms} - {None}
+            artist_ids = {form_id(form.artist_id) for form in forms} - {None}
+            with known_venue_ids.preloaded(self.live_ids(self.Venue, venue_ids)), \
+                    known_artist_ids.preloaded(self.live_ids(self.Artist, artist_ids)):
+                if pending is not None:
+                    timed = [form for form in forms
+                             if form_id(form.venue_id) is not None and form_id(form.artist_id) is not None
+                             and form.start_time.data is not None and form.duration.data is not None]
+                    stored_conflicts.update(zip(timed, self.schedule.conflicts_for([
+                        (int(form.venue_id.data), int(form.artist_id.data), form.start_time.data, show_end(form))
+                        for form in timed])))
+                try:
+                    yield
+                finally:
+                    stored_conflicts.clear()
+
+        def check(form):
+            if pending is None:
+                return None
+            venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+            start, end = form.start_time.data, show_end(form)
+            clashes = pending.conflicts(venue_id, artist_id, start, end)
+            if clashes:
+                return f"overlaps an earlier row's show with the same {' and '.join(clashes)}"
+            stored = stored_conflicts[form]
+            if stored:
+                return 'overlaps show ' + ', '.join(str(show.id) for show in stored)
+            pending.add(venue_id, artist_id, start, end)
+            return None
+
+        def insert(chunk):
+            if pending is not None:
+                pending.clear()     # inserted now, the next chunk checks them in the database
+            self.db.session.execute(self.Shows.__table__.insert(), [{
+                'venue_id': int(form.venue_id.data),
+                'artist_id': int(form.artist_id.data),
+                'start_time': form.start_time.data,
+                'end_time': show_end(form),
+            } for _, form in chunk])
+
+        self._run(rows, insert, validate, check, prepare)
+
+    def live_ids(self, model, ids):
+        if not ids:
+            return set()
+        return {row.id for row in self.db.session.query(model.id).filter(
+            model.id.in_(ids), model.deleted_at.is_(None))}
+
+    # Shared chunk loop
+
+    def _run(self, rows, insert, validate, check=None, prepare=None):
+        # `prepare(forms)` is entered around the validation of a chunk's
+        # forms, to look up what they need in bulk; `check(form)` returns why
+        # a valid row is still rejected, or None
+        for chunk in chunked(rows, self.chunk_size):
+            forms = [(line_no, row if isinstance(row, str) else validate(row)) for line_no, row in chunk]
+            valid = []
+            built = [form for _, form in forms if not isinstance(form, str)]
+            with prepare(built) if prepare is not None else nullcontext():
+                for line_no, form in forms:
+                    if isinstance(form, str):
+                        self.reject(line_no, form)
+                    elif not form.validate():
+                        self.reject(line_no, form_errors(form))
+                    elif check is not None and (problem := check(form)):
+                        self.reject(line_no, problem)
+                    else:
+                        valid.append((line_no, form))
+            if valid:
+                self._commit(valid, insert)
+
+    def _commit(self, valid, insert):
+        try:
+            insert(valid)
+            self.db.session.commit()
+            self.inserted += len(valid)
+            return
+        except SQLAlchemyError:
+            self.db.session.rollback()
+            self._genre_ids = None      # genres created in the failed chunk are gone
+        # Isolate the rows the database rejected
+        for line_no, form in valid:
+            try:
+                insert([(line_no, form)])
+                self.db.session.commit()
+                self.inserted += 1
+            except SQLAlchemyError as error:
+                self.db.session.rollback()
+                self._genre_ids = None
+                self.reject(line_no, str(error.orig if hasattr(error, 'orig') else error).splitlines()[0])
+
+
+class Exporter:
+
+    def __init__(self, db, models, chunk_size):
+        self.db = db
+        self.Venue, self.Artist, self.Shows, self.Genre = models
+        self.chunk_size = chunk_size
+
+    def rows(self, kind):
+        if kind == 'venues':
+            model, fields = self.Venue, VENUE_FIELDS
+        elif kind == 'artists':
+            model, fields = self.Artist, ARTIST_FIELDS
+        else:
+            query = self.db.session.query(
+                self.Shows.id, self.Shows.venue_id, self.Venue.name, self.Shows.artist_id,
+                self.Artist.name, self.Shows.start_time, self.Shows.end_time,
+            ).join(self.Venue, self.Venue.id == self.Shows.venue_id
+            ).join(self.Artist, self.Artist.id == self.Shows.artist_id
+            ).filter(self.Venue.deleted_at.is_(None), self.Artist.deleted_at.is_(None)
+            ).order_by(self.Shows.id)
+            for row in query.yield_per(self.chunk_size):
+                values = dict(zip(SHOW_EXPORT_FIELDS, row))
+                values['start_time'] = values['start_time'].strftime(TIME_FORMAT)
+                values['end_time'] = values['end_time'].strftime(TIME_FORMAT)
+                yield values
+            return
+        columns = [model.id] + [getattr(model, field) for field in fields]
+        query = self.db.session.query(*columns).filter(model.deleted_at.is_(None)).order_by(model.id)
+        for row in query.yield_per(self.chunk_size):
+            yield dict(zip(('id',) + fields, row))
+
+    def write(self, kind, stream, fmt):
+        count = 0
+        if fmt == 'csv':
+            fields = {'venues': ('id',) + VENUE_FIELDS, 'artists': ('id',) + ARTIST_FIELDS,
+                      'shows': SHOW_EXPORT_FIELDS}[kind]
+            writer = csv.DictWriter(stream, fieldnames=fields)
+            writer.writeheader()
+            for row in self.rows(kind):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in self.rows(kind):
+                stream.write(json.dumps(row) + '\n')
+                count += 1
+        return count
+
+
+def create_catalog_cli(db, Venue, Artist, Shows, Genre, on_import=None, schedule=None):
+    # `on_import` runs after a successful import, e.g. to drop cached pages;
+    # with a `schedule`, imported shows are checked for conflicts
+    models = (Venue, Artist, Shows, Genre)
+    cli = AppGroup('catalog', help='Bulk import and export of venues, artists and shows.')
+    kinds = click.Choice(['venues', 'artists', 'shows'])
+    formats = click.Choice(['csv', 'jsonl'])
+
+    @cli.command('import')
+    @click.argument('kind', type=kinds)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+    @click.option('--format', 'fmt', type=formats, help='Defaults to the file extension.')
+    @click.option('--chunk-size', default=1000, show_default=True)
+    @click.option('--errors', type=click.File('w'),
+                  help='Where to report rejected rows (default stderr).')
+    def import_command(kind, path, fmt, chunk_size, errors):
+        errors = errors or sys.stderr
+        importer = Importer(db, models, chunk_size,
+                            lambda line_no, message: errors.write(f'{path}:{line_no}: {message}\n'),
+                            schedule)
+        with open_path(path, 'r') as stream, \
+                current_app.test_request_context():
+            rows = read_rows(stream, detect_format(path, fmt))
+            if kind == 'venues':
+                importer.import_entities(rows, Venue, VenueForm, VENUE_FIELDS, 'seeking_talent')
+            elif kind == 'artists':
+                importer.import_entities(rows, Artist, ArtistForm, ARTIST_FIELDS, 'seeking_venue')
+            else:
+                importer.import_shows(rows)
+        if importer.inserted and on_import is not None:
+            on_import(kind)
+        click.echo(f'{kind}: {importer.inserted} imported, {importer.rejected} rejected')
+
+    @cli.command('export')
+    @click.argument('kind', type=kinds)
+    @click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+    @click.option('--format', 'fmt', type=formats, help='Defaults to the file extension.')
+    @click.option('--chunk-size', default=1000, show_default=True)
+    def export_command(kind, path, fmt, chunk_size):
+        with open_path(path, 'w') as stream:
+            count = Exporter(db, models, chunk_size).write(kind, stream, detect_format(path, fmt))
+        click.echo(f'{kind}: {count} exported', err=path == '-')
+
+    return cli
@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# Venue and Artist rows carry upcoming_shows_count / past_shows_count so the
+# listing, search and detail pages read them instead of counting the show
+# history. A show counts as past once its start_time is at or before the
+# watermark in CounterState, which only the roll-over job advances:
+#
+#   flask counters rollover           # run every minute, e.g. from cron
+#   flask counters check [--repair]   # recount and report (or fix) drift
+#
+# New shows are counted in the transaction that inserts them. That
+# transaction holds a shared lock on the watermark row, and the roll-over
+# holds an exclusive one, so a show is never classified against a watermark
+# that moves before it commits.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+
+class ShowCounters:
+
+    def __init__(self, db, Venue, Artist, Shows, CounterState):
+        self.db = db
+        self.Shows = Shows
+        self.State = CounterState
+        # (model, Show column pointing at it)
+        self.owners = ((Venue, Shows.venue_id), (Artist, Shows.artist_id))
+
+    def _state(self, exclusive=False):
+        # The watermark row, locked for the rest of the transaction
+        query = self.State.query.with_for_update(read=not exclusive)
+        state = query.first()
+        if state is None:
+            # Fresh database: nothing has been counted yet
+            state = self.State(rolled_over_at=datetime.now())
+            self.db.session.add(state)
+            self.db.session.flush()
+        return state
+
+    def watermark(self):
+        return self._state().rolled_over_at
+
+    def record_show(self, show):
+        # Count a show being inserted in the current transaction
+        column = 'past_shows_count' if show.start_time <= self.watermark() else 'upcoming_shows_count'
+        for model, show_fk in self.owners:
+            counter = getattr(model, column)
+            self.db.session.query(model).filter(model.id == getattr(show, show_fk.key)).update(
+                {counter: counter + 1}, synchronize_session=False)
+
+    def remove_shows(self, shows):
+        # Uncount shows being deleted in the current transaction (rows with
+        # venue_id, artist_id and start_time). Returns {model: [ids]}.
+        watermark = self.watermark()
+        changed = {}
+        for model, show_fk in self.owners:
+            deltas = {}
+            for show in shows:
+                delta = deltas.setdefault(getattr(show, show_fk.key), {'upcoming': 0, 'past': 0})
+                delta['past' if show.start_time <= watermark else 'upcoming'] -= 1
+            if deltas:
+                self._apply(model, [{'row_id': row_id, **delta} for row_id, delta in deltas.items()])
+                changed[model] = list(deltas)
+        return changed
+
+    def rollover(self, now=None):
+        # Move shows that started since the last roll-over from upcoming to
+        # past. Returns {model: [ids whose counts changed]}.
+        now = now or datetime.now()
+        state = self._state(exclusive=True)
+        if now <= state.rolled_over_at:
+            return {}
+        changed = {}
+        for model, show_fk in self.owners:
+            started = self.db.session.query(show_fk, self.db.func.count(self.Shows.id)).filter(
+                self.Shows.start_time > state.rolled_over_at,
+                self.Shows.start_time <= now,
+            ).group_by(show_fk).all()
+            if started:
+                self._apply(model, [{
+                    'row_id': owner_id, 'upcoming': -count, 'past': count,
+                } for owner_id, count in started])
+                changed[model] = [owner_id for owner_id, _ in started]
+        state.rolled_over_at = now
+        return changed
+
+    def check(self, repair=False):
+        # Recount against the watermark. Returns (model, id, stored, actual)
+        # for each row that drifted, with counts as (upcoming, past) pairs.
+        watermark = self._state(exclusive=repair).rolled_over_at
+        db = self.db
+        drift = []
+        for model, show_fk in self.owners:
+            rows = db.session.query(
+                model.id, model.upcoming_shows_count, model.past_shows_count,
+                db.func.count(self.Shows.id).filter(self.Shows.start_time > watermark),
+                db.func.count(self.Shows.id).filter(self.Shows.start_time <= watermark),
+            ).outerjoin(self.Shows, show_fk == model.id).group_by(model.id)
+            wrong = [(model, row_id, (upcoming, past), (actual_upcoming, actual_past))
+                     for row_id, upcoming, past, actual_upcoming, actual_past in rows
+                     if (upcoming, past) != (actual_upcoming, actual_past)]
+            if repair and wrong:
+                self._apply(model, [{
+                    'row_id': row_id,
+                    'upcoming': actual[0] - stored[0],
+                    'past': actual[1] - stored[1],
+                } for _, row_id, stored, actual in wrong])
+            drift.extend(wrong)
+        return drift
+
+    def _apply(self, model, deltas):
+        # One executemany UPDATE adding the deltas to each row's counters
+        table = model.__table__
+        db = self.db
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('row_id')).values(
+                upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming'),
+                past_shows_count=table.c.past_shows_count + db.bindparam('past'),
+            ), deltas)
+
+
+def create_counters_cli(counters, on_change=None):
+    # `on_change` receives {model: [ids]} after counts change, e.g. to drop
+    # cached pages that show them
+    db = counters.db
+    cli = AppGroup('counters', help='Maintain the denormalized show counters.')
+
+    @cli.command('rollover')
+    def rollover_command():
+        changed = counters.rollover()
+        db.session.commit()
+        if changed and on_change is not None:
+            on_change(changed)
+        click.echo(f'{sum(len(ids) for ids in changed.values())} rows rolled over')
+
+    @cli.command('check')
+    @click.option('--repair', is_flag=True, help='Fix the rows that drifted.')
+    def check_command(repair):
+        drift = counters.check(repair=repair)
+        for model, row_id, stored, actual in drift:
+            click.echo(f'{model.__tablename__} {row_id}: stored {stored}, actual {actual}')
+        if repair:
+            db.session.commit()
+            if drift and on_change is not None:
+                changed = {}
+                for model, row_id, _, _ in drift:
+                    changed.setdefault(model, []).append(row_id)
+                on_change(changed)
+        else:
+            db.session.rollback()
+        click.echo(f"{len(drift)} rows {'repaired' if repair else 'drifted'}")
+        if drift and not repair:
+            raise SystemExit(1)
+
+    return cli
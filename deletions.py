@@ -0,0 +1,149 @@
+#----------------------------------------------------------------------------#
+# Deleting venues and artists.
+#
+# DELETE /venues/<id> and DELETE /artists/<id> only set deleted_at, a one
+# row update however long the show history is. From then on the row is left
+# out of every listing, search, show calendar read, recommendation and
+# nearby query: the pages read live rows (deleted_at IS NULL) through
+# partial indexes, and the calendar skips the shows of the few rows
+# awaiting purge, found through their own partial index (migration
+# c7e1a5d3f9b2).
+#
+# The purge then removes a deleted row's shows batch by batch, each
+# batch in its own short transaction (its calendar rows, the show counters
+# of both sides, the shows), and once none are left its genre links,
+# recommendations and the row itself. Reads never wait on it, and writes
+# only for one batch of rows:
+#
+#   flask deletions purge     # run every few minutes, e.g. from cron
+#   flask deletions status    # rows awaiting purge
+#
+# Until purged, the shows of a deleted row still book its counterpart in the
+# conflict checks (scheduling.py) and still count in the counterpart's show
+# counters. A show listed for a row while it was being deleted is purged
+# with the others, as the row goes only once no show is left.
+#----------------------------------------------------------------------------#
+
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+
+def deleted_ids(db, model):
+    # SELECT of the ids of `model` rows awaiting purge
+    return db.select(model.id).where(model.deleted_at.isnot(None))
+
+
+def soft_delete_indexes(db, table, *listing):
+    # For a model's __table_args__: a partial index on the `listing` columns
+    # over the live rows, and one over the rows awaiting purge
+    live, deleted = db.text('deleted_at IS NULL'), db.text('deleted_at IS NOT NULL')
+    return (
+        db.Index(f'ix_{table}_live', *listing, postgresql_where=live, sqlite_where=live),
+        db.Index(f'ix_{table}_deleted_at', 'deleted_at', postgresql_where=deleted, sqlite_where=deleted),
+    )
+
+
+class Deletions:
+
+    def __init__(self, db, Venue, Artist, Shows, counters, calendar, recommender):
+        self.db = db
+        self.Shows = Shows
+        self.counters = counters
+        self.calendar = calendar
+        self.recommender = recommender
+        # model -> (recommendation kind, Show column pointing at it)
+        self.owners = {Venue: ('venue', Shows.venue_id), Artist: ('artist', Shows.artist_id)}
+
+    def delete(self, entity):
+        # Soft delete, in the caller's transaction
+        entity.deleted_at = datetime.now()
+
+    def pending(self):
+        # (model, id) of the rows awaiting purge, oldest deletion first
+        return [(model, row_id) for model in self.owners
+                for (row_id,) in self.db.session.query(model.id).filter(
+                    model.deleted_at.isnot(None)).order_by(model.deleted_at, model.id)]
+
+    def purge_step(self, model, row_id, batch_size):
+        # One batch of a deleted row's shows or, once none are left, the row
+        # itself; the caller commits. Returns (shows removed, {model: ids
+        # whose show counters changed}).
+        kind, show_fk = self.owners[model]
+        Shows, db = self.Shows, self.db
+        # Locked so that concurrent purges take turns instead of uncounting
+        # the same shows twice
+        if db.session.query(model.id).filter(
+                model.id == row_id, model.deleted_at.isnot(None)).with_for_update().first() is None:
+            return 0, {}
+        shows = db.session.query(Shows.id, Shows.venue_id, Shows.artist_id, Shows.start_time
+        ).filter(show_fk == row_id).order_by(Shows.start_time).limit(batch_size).all()
+        if shows:
+            show_ids = [show.id for show in shows]
+            self.calendar.remove_shows(show_ids)
+            changed = self.counters.remove_shows(shows)
+            db.session.execute(Shows.__table__.delete().where(Shows.id.in_(show_ids)))
+            return len(shows), changed
+        links = model.genre_list.property.secondary
+        owner = next(column for column in links.c if column.name != 'genre_id')
+        db.session.execute(links.delete().where(owner == row_id))
+        self.recommender.forget(kind, row_id)
+        table = model.__table__
+        db.session.execute(table.delete().where(table.c.id == row_id))
+        return 0, {}
+
+    def purge(self, batch_size=500, pause=0.0, on_change=None):
+        # Purge every pending row, committing after each batch and sleeping
+        # `pause` seconds between batches. Yields (model, id, shows removed)
+        # as rows are purged. `on_change` receives {model: [ids]} after show
+        # counters change. An interrupted purge resumes where it stopped.
+        db = self.db
+        for model, row_id in self.pending():
+            removed = 0
+            while True:
+                try:
+                    count, changed = self.purge_step(model, row_id, batch_size)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                if changed and on_change is not None:
+                    on_change(changed)
+                if not count:
+                    break
+                removed += count
+                if pause:
+                    time.sleep(pause)
+            yield model, row_id, removed
+
+
+def create_deletions_cli(deletions, on_change=None):
+    # `on_change` receives {model: [ids]} after show counters change, e.g.
+    # to drop cached pages that show them
+    db = deletions.db
+    cli = AppGroup('deletions', help='Purge deleted venues and artists.')
+
+    @cli.command('purge')
+    @click.option('--batch-size', default=500, show_default=True,
+                  help='Shows deleted per transaction.')
+    @click.option('--pause', default=0.05, show_default=True,
+                  help='Seconds to wait between batches.')
+    def purge_command(batch_size, pause):
+        purged = 0
+        for model, row_id, removed in deletions.purge(batch_size, pause, on_change):
+            click.echo(f'{model.__tablename__} {row_id}: purged with {removed} shows')
+            purged += 1
+        click.echo(f'{purged} deleted rows purged')
+
+    @cli.command('status')
+    def status_command():
+        pending = deletions.pending()
+        for model, row_id in pending:
+            show_fk = deletions.owners[model][1]
+            shows = db.session.query(deletions.Shows.id).filter(show_fk == row_id).count()
+            click.echo(f'{model.__tablename__} {row_id}: {shows} shows left')
+        click.echo(f'{len(pending)} deleted rows awaiting purge')
+
+    return cli
@@ -6,13 +6,19 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
+        # route benchmark against the stored baseline (benchmarks/routes.py)
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m benchmarks.routes --baseline benchmarks/baseline.json", capture=True
         )
-    if result.failed and not confirm("Tests failed. Continue?"):
+    if result.failed and not confirm("Benchmarks regressed. Continue?"):
         abort("Aborted at user request.")
 
 
+def assets():
+    # fingerprinted bundles in static/dist, committed with the release (assets.py)
+    local("FLASK_APP=app.py flask assets build")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -24,6 +30,7 @@ def push():
 
 def prepare():
     test()
+    assets()
     commit()
     push()
 
@@ -47,6 +54,7 @@ def heroku_test():
 def deploy():
     pull()
     test()
+    assets()
     commit()
     heroku()
     heroku_test()
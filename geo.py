@@ -0,0 +1,296 @@
+#----------------------------------------------------------------------------#
+# Venue locations.
+#
+# Venues are geocoded offline from the bundled gazetteer (data/gazetteer.csv:
+# city, state, latitude, longitude), so a venue is placed at its city's
+# centre, and its city is stored with the gazetteer's spelling ("fort
+# worth" becomes "Fort Worth") so listings group one area under one name.
+# A city the gazetteer does not know gets its spaces collapsed and, when
+# typed all in one case, title case ("lake placid", "LAKE PLACID" and
+# "Lake Placid" are one area); mixed case such as "McKinney" is kept.
+# Each located venue also stores the geohash of its position, and the
+# btree index on it is the spatial index: the cells covering a search
+# circle are prefixes, each one index range scan, on PostgreSQL and SQLite
+# alike (LIKE 'cell%' over varchar_pattern_ops on PostgreSQL, whose
+# collation may not sort bytewise; a plain range on SQLite). Candidates are then measured exactly and ranked by distance.
+#
+#   GET /venues/nearby?lat=32.75&lng=-97.33&radius=25
+#   GET /venues/nearby?city=Fort Worth&state=TX
+#   flask geo locate [--all]    # geocode venues without a position
+#----------------------------------------------------------------------------#
+
+import csv
+import math
+import os
+
+import click
+from flask.cli import AppGroup
+
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.csv')
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.09
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9     # ~5 m cells; searches use shorter prefixes
+
+
+# Geohash
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate longitude, latitude, starting with longitude
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (height, width) in degrees of a cell at this precision
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_box(latitude, longitude, radius):
+    lat_delta = radius / MILES_PER_DEGREE
+    lng_delta = radius / (MILES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (max(latitude - lat_delta, -90.0), max(longitude - lng_delta, -180.0),
+            min(latitude + lat_delta, 90.0), min(longitude + lng_delta, 180.0))
+
+
+def covering_cells(latitude, longitude, radius, max_cells=16):
+    # Geohash prefixes whose cells cover the circle: the finest precision
+    # that needs at most `max_cells` of them
+    south, west, north, east = bounding_box(latitude, longitude, radius)
+
+    def grid(precision):
+        height, width = cell_size(precision)
+        rows = range(int((south + 90) // height), min(int((north + 90) // height), 2 ** (5 * precision // 2) - 1) + 1)
+        columns = range(int((west + 180) // width), min(int((east + 180) // width), 2 ** ((5 * precision + 1) // 2) - 1) + 1)
+        return height, width, rows, columns
+
+    precision = 1
+    while precision < GEOHASH_PRECISION:
+        _, _, rows, columns = grid(precision + 1)
+        if len(rows) * len(columns) > max_cells:
+            break
+        precision += 1
+    height, width, rows, columns = grid(precision)
+    return sorted({geohash(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+                   for row in rows for column in columns})
+
+
+def distance(lat1, lng1, lat2, lng2):
+    # Great-circle distance in miles (haversine)
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def geohash_index(db, table):
+    # For a model's __table_args__: the geohash index. varchar_pattern_ops
+    # lets PostgreSQL range-scan it for LIKE 'cell%' whatever the collation.
+    return db.Index(f'ix_{table}_geohash', 'geohash', postgresql_ops={'geohash': 'varchar_pattern_ops'})
+
+
+def cell_filter(db, column, cell):
+    # Rows whose geohash starts with `cell`. SQLite only indexes LIKE under
+    # NOCASE, but compares bytewise, so there the cell is one range.
+    if db.engine.dialect.name == 'sqlite':
+        return db.and_(column >= cell, column < cell + '~')
+    return column.like(cell + '%')
+
+
+# Gazetteer
+
+def place_key(city, state):
+    # "St. Louis", "st louis" and " ST  LOUIS " are the same place
+    return ' '.join((city or '').replace('.', ' ').split()).casefold(), (state or '').strip().upper()
+
+
+def city_name(city):
+    # Spelling stored for a city the gazetteer does not know
+    city = ' '.join((city or '').split())
+    return city.title() if city in (city.lower(), city.upper()) else city
+
+
+class Gazetteer:
+
+    def __init__(self, path=GAZETTEER):
+        self.path = path
+        self._places = None
+
+    def places(self):
+        # (city key, state) -> (city, state, latitude, longitude), read once
+        if self._places is None:
+            places = {}
+            with open(self.path, newline='', encoding='utf-8') as stream:
+                for row in csv.DictReader(stream):
+                    places[place_key(row['city'], row['state'])] = (
+                        row['city'], row['state'], float(row['latitude']), float(row['longitude']))
+            self._places = places
+        return self._places
+
+    def lookup(self, city, state):
+        return self.places().get(place_key(city, state))
+
+
+def parse_origin(args, gazetteer, default_radius, max_radius):
+    # (latitude, longitude, radius) from ?lat=&lng= or ?city=&state=, and
+    # ?radius= in miles. Raises ValueError on anything unusable.
+    if args.get('lat') or args.get('lng'):
+        latitude, longitude = float(args['lat']), float(args['lng'])
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('coordinates out of range')
+    else:
+        place = gazetteer.lookup(args.get('city'), args.get('state'))
+        if place is None:
+            raise ValueError('unknown place')
+        latitude, longitude = place[2], place[3]
+    radius = float(args.get('radius') or default_radius)
+    if not 0 < radius <= max_radius:
+        raise ValueError('radius out of range')
+    return latitude, longitude, radius
+
+
+class VenueLocator:
+
+    def __init__(self, db, Venue, calendar, gazetteer=None):
+        # `calendar` is the ShowCalendar the next shows are read from
+        self.db = db
+        self.Venue = Venue
+        self.calendar = calendar
+        self.Entry = calendar.Entry
+        self.gazetteer = gazetteer or Gazetteer()
+
+    def position(self, city, state):
+        # Values to store for a venue in (city, state); position fields are
+        # None when the gazetteer does not know the place
+        place = self.gazetteer.lookup(city, state)
+        if place is None:
+            return {'city': city_name(city), 'latitude': None, 'longitude': None, 'geohash': None}
+        return {'city': place[0], 'latitude': place[2], 'longitude': place[3],
+                'geohash': geohash(place[2], place[3])}
+
+    def locate(self, venue):
+        # Geocode a venue being written; returns whether it was placed
+        for name, value in self.position(venue.city, venue.state).items():
+            setattr(venue, name, value)
+        return venue.geohash is not None
+
+    def locate_all(self, everything=False, chunk_size=500):
+        # Geocode venues in id order, one executemany UPDATE per chunk.
+        # Returns (located, renamed): venues placed, and those whose city
+        # spelling changed (their copies in other tables need refreshing).
+        Venue, db = self.Venue, self.db
+        table = Venue.__table__
+        update = table.update().where(table.c.id == db.bindparam('row_id')).values(
+            city=db.bindparam('new_city'), latitude=db.bindparam('new_latitude'),
+            longitude=db.bindparam('new_longitude'), geohash=db.bindparam('new_geohash'))
+        located = renamed = 0
+        after = 0
+        while True:
+            query = db.session.query(Venue.id, Venue.city, Venue.state).filter(Venue.id > after)
+            if not everything:
+                query = query.filter(Venue.geohash.is_(None))
+            rows = query.order_by(Venue.id).limit(chunk_size).all()
+            if not rows:
+                return located, renamed
+            changes = []
+            for row_id, city, state in rows:
+                values = self.position(city, state)
+                if values['geohash'] is None and values['city'] == city:
+                    continue
+                located += values['geohash'] is not None
+                renamed += values['city'] != city
+                changes.append({'row_id': row_id, **{'new_' + name: value for name, value in values.items()}})
+            if changes:
+                db.session.execute(update, changes)
+            after = rows[-1].id
+
+    # Queries
+
+    def nearby(self, latitude, longitude, radius, limit=None):
+        # Venues within `radius` miles, nearest first, as dicts with a
+        # distance. One query: a range scan of the geohash index per cell.
+        Venue, db = self.Venue, self.db
+        cells = covering_cells(latitude, longitude, radius)
+        rows = db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+            Venue.upcoming_shows_count,
+        ).filter(Venue.deleted_at.is_(None),
+                 db.or_(*(cell_filter(db, Venue.geohash, cell) for cell in cells)))
+        venues = []
+        for row in rows:
+            miles = distance(latitude, longitude, row.latitude, row.longitude)
+            if miles <= radius:
+                venues.append({
+                    'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state,
+                    'num_upcoming_shows': row.upcoming_shows_count,
+                    'distance': round(miles, 1),
+                })
+        venues.sort(key=lambda venue: (venue['distance'], venue['name'], venue['id']))
+        return venues[:limit] if limit else venues
+
+    def nearby_shows(self, venues, now, per_venue=3, limit=None):
+        # The next `per_venue` shows at each of `venues` (from nearby()),
+        # nearest venue first and then by start time; read from the show
+        # calendar in one query
+        if not venues:
+            return []
+        Entry, db = self.Entry, self.db
+        distances = {venue['id']: venue['distance'] for venue in venues}
+        ranked = db.session.query(
+            Entry.show_id, Entry.start_time, Entry.venue_id, Entry.venue_name,
+            Entry.artist_id, Entry.artist_name, Entry.artist_image_link,
+            db.func.row_number().over(
+                partition_by=Entry.venue_id, order_by=(Entry.start_time, Entry.show_id),
+            ).label('position'),
+        ).filter(Entry.venue_id.in_(list(distances)), Entry.start_time > now,
+                 self.calendar.visible()).subquery()
+        rows = db.session.query(ranked).filter(ranked.c.position <= per_venue)
+        shows = [{
+            'id': row.show_id,
+            'start_time': row.start_time,
+            'venue_id': row.venue_id,
+            'venue_name': row.venue_name,
+            'artist_id': row.artist_id,
+            'artist_name': row.artist_name,
+            'artist_image_link': row.artist_image_link,
+            'distance': distances[row.venue_id],
+        } for row in rows]
+        shows.sort(key=lambda show: (show['distance'], show['start_time'], show['id']))
+        return shows[:limit] if limit else shows
+
+
+def create_geo_cli(locator, on_change=None):
+    # `on_change(renamed)` runs after venues were located, e.g. to refresh
+    # tables holding copies of venue cities and drop cached pages
+    db = locator.db
+    cli = AppGroup('geo', help='Geocode venues from the bundled gazetteer.')
+
+    @cli.command('locate')
+    @click.option('--all', 'everything', is_flag=True,
+                  help='Geocode every venue, not only those without a position.')
+    @click.option('--chunk-size', default=500, show_default=True)
+    def locate_command(everything, chunk_size):
+        located, renamed = locator.locate_all(everything=everything, chunk_size=chunk_size)
+        db.session.commit()
+        if (located or renamed) and on_change is not None:
+            on_change(renamed)
+        missing = db.session.query(locator.Venue.id).filter(locator.Venue.geohash.is_(None)).count()
+        click.echo(f'{located} venues located ({renamed} renamed), {missing} not in the gazetteer')
+
+    return cli
@@ -0,0 +1,43 @@
+#----------------------------------------------------------------------------#
+# Production serving.
+#
+#   gunicorn -c gunicorn.conf.py app:app                 # threaded workers
+#   WORKER_CLASS=uvicorn.workers.UvicornWorker \
+#       gunicorn -c gunicorn.conf.py asgi:application    # ASGI, see asgi.py
+#
+# The views block on the database, so concurrency comes from threads: each
+# worker process runs THREADS requests at once, and by default that matches
+# the connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW) so a thread never
+# waits for a connection. Total database connections are at most
+# WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW); keep that below the
+# server's max_connections.
+#----------------------------------------------------------------------------#
+
+import multiprocessing
+import os
+
+import config
+
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '5000'))
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('THREADS', config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW))
+
+# Import the app once in the master and fork it, so workers share the
+# loaded code. Engines are created on first use, after the fork.
+preload_app = True
+
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound the growth of in-process caches
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    pool = config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+    if worker_class == 'gthread' and threads > pool:
+        server.log.warning('THREADS=%d exceeds the connection pool (%d); requests will '
+                           'queue for connections (see DB_POOL_TIMEOUT)', threads, pool)
@@ -0,0 +1,218 @@
+#----------------------------------------------------------------------------#
+# Database instrumentation.
+#
+# Connection pool metrics (checkout wait time, saturation) and per-request
+# query counts and database time, collected from SQLAlchemy events and
+# exposed as a snapshot dictionary. Query timing listens on the Engine class
+# and pool metrics come from InstrumentedQueuePool, so both cover engines
+# Flask-SQLAlchemy creates lazily. Pool metrics are kept per bind: the
+# primary's pool, and each replica's (labelled by replicas.py).
+#
+# Every response gets a Server-Timing header, statements slower than
+# SLOW_QUERY_MS are logged with the route that issued them, and views
+# declaring a @query_budget are checked against it (QUERY_BUDGET_STRICT makes
+# overruns raise, which fails the request under the test client).
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that reports how long each checkout waited for a connection
+    # and how many of its connections are in use afterwards, under its bind's
+    # label
+    metrics = None
+    label = 'primary'
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool: keep reporting under the label
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_checkout_timeout(self.label, time.perf_counter() - start)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_checkout(
+                self.label,
+                time.perf_counter() - start,
+                self.checkedout(),
+                self.size() + max(self._max_overflow, 0),
+            )
+        return record
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    # Declare the most queries a view may issue per request
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class DatabaseMetrics:
+
+    def __init__(self, app=None, samples=1000):
+        self._lock = threading.Lock()
+        # bind label -> checkout stats of its pool
+        self._pools = defaultdict(lambda: {
+            'waits': deque(maxlen=samples),
+            'checkouts': 0,
+            'timeouts': 0,
+            'checked_out': 0,
+            'peak_checked_out': 0,
+            'capacity': None,
+        })
+        # endpoint -> [requests, queries, max queries, database seconds]
+        self._requests = defaultdict(lambda: [0, 0, 0, 0.0])
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('QUERY_BUDGET_STRICT', False)
+        InstrumentedQueuePool.metrics = self
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_response)
+        app.teardown_request(self._end_request)
+
+    # Pool
+
+    def record_checkout(self, label, wait, checked_out, capacity):
+        with self._lock:
+            pool = self._pools[label]
+            pool['waits'].append(wait)
+            pool['checkouts'] += 1
+            pool['checked_out'] = checked_out
+            pool['peak_checked_out'] = max(pool['peak_checked_out'], checked_out)
+            pool['capacity'] = capacity
+
+    def record_checkout_timeout(self, label, wait):
+        with self._lock:
+            pool = self._pools[label]
+            pool['waits'].append(wait)
+            pool['timeouts'] += 1
+
+    # Requests
+
+    # The start time is kept on the statement's execution context: a
+    # statement that fails never reaches _after_execute, and its start time
+    # goes with its context instead of lingering on the pooled connection
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if has_request_context() and 'query_count' in g:
+            g.query_count += 1
+            g.query_time += elapsed
+        if elapsed * 1000 >= self.app.config['SLOW_QUERY_MS']:
+            route = request.endpoint if has_request_context() else None
+            self.app.logger.warning('Slow query (%.1f ms) in %s: %s',
+                                    elapsed * 1000, route, ' '.join(statement.split())[:1000])
+
+    def _start_request(self):
+        g.request_start = time.perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+
+    def _finish_response(self, response):
+        if 'query_count' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        response.headers.add('Server-Timing', f'db;dur={g.query_time * 1000:.1f};desc="{g.query_count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total * 1000:.1f}')
+
+        # A streamed body runs its queries after this point: its budget is
+        # checked at teardown instead, where it can only be logged
+        g.streamed = response.is_streamed
+        if not g.streamed:
+            self._check_budget(self.app.config['QUERY_BUDGET_STRICT'])
+        return response
+
+    def _check_budget(self, strict):
+        view = self.app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        if limit is not None and g.query_count > limit:
+            message = f'{request.endpoint} issued {g.query_count} queries, budget is {limit}'
+            if strict:
+                raise QueryBudgetExceeded(message)
+            self.app.logger.warning(message)
+
+    def _end_request(self, exc=None):
+        if 'query_count' not in g:
+            return
+        if g.get('streamed'):
+            self._check_budget(strict=False)
+        with self._lock:
+            stats = self._requests[request.endpoint or request.path]
+            stats[0] += 1
+            stats[1] += g.query_count
+            stats[2] = max(stats[2], g.query_count)
+            stats[3] += g.query_time
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pools': {label: self._pool_snapshot(pool) for label, pool in self._pools.items()},
+                'requests': {
+                    endpoint: {
+                        'requests': count,
+                        'queries': queries,
+                        'queries_per_request': queries / count if count else 0,
+                        'max_queries': peak,
+                        'db_ms_per_request': db_time * 1000 / count if count else 0,
+                    }
+                    for endpoint, (count, queries, peak, db_time) in self._requests.items()
+                },
+            }
+
+    @staticmethod
+    def _pool_snapshot(pool):
+        waits, capacity = list(pool['waits']), pool['capacity']
+        return {
+            'checkouts': pool['checkouts'],
+            'timeouts': pool['timeouts'],
+            'checked_out_at_last_checkout': pool['checked_out'],
+            'peak_checked_out': pool['peak_checked_out'],
+            'capacity': capacity,
+            'saturation': pool['checked_out'] / capacity if capacity else None,
+            'peak_saturation': pool['peak_checked_out'] / capacity if capacity else None,
+            'checkout_wait_ms': {
+                'p50': percentile(waits, 0.5) * 1000,
+                'p95': percentile(waits, 0.95) * 1000,
+                'max': max(waits, default=0.0) * 1000,
+            },
+        }
@@ -0,0 +1,229 @@
+#----------------------------------------------------------------------------#
+# Logging pipeline.
+#
+# Request threads never write log files: app.logger and the access logger
+# put records on a bounded queue and a listener thread formats them as JSON
+# lines and writes them to rotating files. When the queue is full records
+# are dropped (counted in LogPipeline.dropped) rather than blocking the
+# request.
+#
+#   {"time": "...", "level": "INFO", "logger": "fyyur.access",
+#    "message": "GET /venues 200", "route": "venues", "method": "GET",
+#    "path": "/venues", "status": 200, "latency_ms": 4.2, "queries": 1}
+#
+# Records logged during a request carry its route, latency so far and query
+# count. The access log writes one record per request once the response
+# (streamed bodies included) is finished. INFO records and access lines can
+# be sampled; errors, 5xx responses and slow requests are always kept.
+#----------------------------------------------------------------------------#
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message'}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items()
+                    if key not in STANDARD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class PipelineHandler(QueueHandler):
+    # Puts records on the pipeline's queue, adding the request fields while
+    # still on the request thread, and sampling INFO and below
+
+    def __init__(self, pipeline, sample_rate):
+        super().__init__(None)      # the pipeline's queue, per process
+        self.pipeline = pipeline
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if (record.levelno < logging.WARNING and self.sample_rate < 1
+                and not getattr(record, 'keep', False) and random.random() >= self.sample_rate):
+            return False
+        return super().filter(record)
+
+    def prepare(self, record):
+        # The listener formats later, on another thread: resolve everything
+        # that depends on this one now
+        if has_request_context():
+            record.__dict__.setdefault('route', request.endpoint)
+            record.__dict__.setdefault('method', request.method)
+            record.__dict__.setdefault('path', request.path)
+            if 'log_start' in g:
+                record.__dict__.setdefault(
+                    'latency_ms', round((time.perf_counter() - g.log_start) * 1000, 1))
+            if 'query_count' in g:
+                record.__dict__.setdefault('queries', g.query_count)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.__dict__.pop('keep', None)
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.start()
+        try:
+            self.pipeline.queue.put_nowait(record)
+        except queue.Full:
+            self.pipeline.dropped += 1
+
+
+class LogPipeline:
+
+    def __init__(self, app=None):
+        self.queue = None
+        self.listener = None
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('LOG_LEVEL', 'INFO')
+        config.setdefault('LOG_FILE', 'fyyur.log')
+        config.setdefault('ACCESS_LOG_FILE', 'access.log')
+        config.setdefault('LOG_ROTATE_WHEN', None)
+        config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+        config.setdefault('LOG_BACKUP_COUNT', 5)
+        config.setdefault('LOG_QUEUE_SIZE', 10000)
+        config.setdefault('LOG_INFO_SAMPLE_RATE', 1.0)
+        config.setdefault('ACCESS_LOG_SAMPLE_RATE', 1.0)
+        config.setdefault('ACCESS_LOG_SLOW_MS', 500)
+        self.app = app
+
+        # (logger, file) pairs; the listener routes each record by logger name
+        self.files = {app.logger.name: config['LOG_FILE']}
+        app.logger.setLevel(config['LOG_LEVEL'])
+        app.logger.removeHandler(default_handler)     # synchronous writes to stderr
+        app.logger.addHandler(PipelineHandler(self, config['LOG_INFO_SAMPLE_RATE']))
+        if config['ACCESS_LOG_FILE']:
+            self.access_logger = logging.getLogger('fyyur.access')
+            self.access_logger.setLevel(logging.INFO)
+            self.access_logger.propagate = False
+            self.access_logger.addHandler(PipelineHandler(self, config['ACCESS_LOG_SAMPLE_RATE']))
+            self.files[self.access_logger.name] = config['ACCESS_LOG_FILE']
+            app.before_request(self._start_request)
+            app.after_request(self._finish_response)
+            app.teardown_request(self._log_request)
+
+    # Listener
+
+    def file_handler(self, path):
+        # '-' logs to stderr; {pid} in the name gives each worker its own
+        # file, as rotation is not safe across processes
+        if path == '-':
+            handler = logging.StreamHandler(sys.stderr)
+        else:
+            path = path.format(pid=os.getpid())
+            config = self.app.config
+            if config['LOG_ROTATE_WHEN']:
+                handler = TimedRotatingFileHandler(
+                    path, when=config['LOG_ROTATE_WHEN'], backupCount=config['LOG_BACKUP_COUNT'],
+                    delay=True, utc=True)
+            else:
+                handler = RotatingFileHandler(
+                    path, maxBytes=config['LOG_MAX_BYTES'], backupCount=config['LOG_BACKUP_COUNT'],
+                    delay=True)
+        handler.setFormatter(JsonFormatter())
+        return handler
+
+    def start(self):
+        # Started on first use in each process: a listener thread started
+        # before a fork (gunicorn preload_app) does not run in the workers,
+        # and the queue it drained is not shared with them
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.app.config['LOG_QUEUE_SIZE'])
+            handlers = {name: self.file_handler(path) for name, path in self.files.items()}
+            self.listener = QueueListener(self.queue, RoutingHandler(handlers))
+            self.listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self):
+        # Drain the queue and close the files
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+            self._pid = None
+
+    # Access log
+
+    def _start_request(self):
+        g.log_start = time.perf_counter()
+
+    def _finish_response(self, response):
+        g.log_status = response.status_code
+        return response
+
+    def _log_request(self, exc=None):
+        # Teardown runs after a streamed body has been sent, so the latency
+        # and query count cover the whole response
+        if 'log_start' not in g:
+            return
+        status = 500 if exc is not None else g.get('log_status', 500)
+        latency_ms = round((time.perf_counter() - g.log_start) * 1000, 1)
+        self.access_logger.info(
+            '%s %s %s', request.method, request.full_path.rstrip('?'), status,
+            extra={
+                'status': status,
+                'latency_ms': latency_ms,
+                'remote_addr': request.remote_addr,
+                'user_agent': request.user_agent.string,
+                'keep': status >= 500 or latency_ms >= self.app.config['ACCESS_LOG_SLOW_MS'],
+            })
+
+
+class RoutingHandler(logging.Handler):
+    # Sends each record to the file of its logger: fyyur.access records to
+    # the access log, everything else to the application log
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+        self.default = next(iter(handlers.values()))
+
+    def emit(self, record):
+        self.handlers.get(record.name, self.default).handle(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
@@ -6,6 +6,7 @@ from logging.config import fileConfig
 from flask import current_app
 
 from alembic import context
+from sqlalchemy import text
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -74,6 +75,9 @@ def run_migrations_online():
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Backfills and index builds may take minutes on a real database
+            connection.execute(text('SET statement_timeout = 0'))
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
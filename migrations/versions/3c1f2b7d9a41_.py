@@ -0,0 +1,39 @@
+"""trigram search indexes
+
+Revision ID: 3c1f2b7d9a41
+Revises: e5f992258ab3
+Create Date: 2026-10-18 09:12:04.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f2b7d9a41'
+down_revision = 'e5f992258ab3'
+branch_labels = None
+depends_on = None
+
+SEARCH_FIELDS = ('name', 'city', 'state', 'genres')
+
+
+def upgrade():
+    # pg_trgm GIN indexes let the ILIKE '%term%' searches in search.py use an
+    # index scan; other databases get plain indexes.
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    if is_postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        for field in SEARCH_FIELDS:
+            op.create_index(
+                f'ix_{table}_{field}_trgm', table, [field],
+                postgresql_using='gin',
+                postgresql_ops={field: 'gin_trgm_ops'},
+            )
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        for field in SEARCH_FIELDS:
+            op.drop_index(f'ix_{table}_{field}_trgm', table_name=table)
@@ -0,0 +1,32 @@
+"""show access path and lowercase name indexes
+
+Revision ID: 8a4d6e0c2f15
+Revises: 3c1f2b7d9a41
+Create Date: 2026-10-18 11:40:27.530911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d6e0c2f15'
+down_revision = '3c1f2b7d9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'])
+    op.create_index('ix_Venue_name_lower', 'Venue', [sa.text('lower(name)')])
+    op.create_index('ix_Artist_name_lower', 'Artist', [sa.text('lower(name)')])
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_lower', table_name='Artist')
+    op.drop_index('ix_Venue_name_lower', table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
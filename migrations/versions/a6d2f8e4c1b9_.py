@@ -0,0 +1,32 @@
+"""recommendation lookup table
+
+Revision ID: a6d2f8e4c1b9
+Revises: f3a7d1c9b2e4
+Create Date: 2026-10-19 00:52:13.408226
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f8e4c1b9'
+down_revision = 'f3a7d1c9b2e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask recommendations build`
+    op.create_table('Recommendation',
+    sa.Column('kind', sa.String(length=6), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'source_id', 'rank')
+    )
+
+
+def downgrade():
+    op.drop_table('Recommendation')
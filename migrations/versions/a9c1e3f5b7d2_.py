@@ -0,0 +1,33 @@
+"""geohash index usable for LIKE under any collation
+
+Revision ID: a9c1e3f5b7d2
+Revises: f6b8d0e2a4c7
+Create Date: 2026-10-19 11:02:57.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c1e3f5b7d2'
+down_revision = 'f6b8d0e2a4c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nearby queries match geohash cells with LIKE 'cell%' on PostgreSQL,
+    # which only a pattern_ops index serves under a non-C collation.
+    # SQLite keeps its plain index, scanned as a bytewise range.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Venue_geohash', table_name='Venue')
+    op.create_index('ix_Venue_geohash', 'Venue', [sa.text('geohash varchar_pattern_ops')])
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Venue_geohash', table_name='Venue')
+    op.create_index('ix_Venue_geohash', 'Venue', ['geohash'], unique=False)
@@ -0,0 +1,77 @@
+"""normalized genres
+
+Revision ID: b71e93d4c5a0
+Revises: 8a4d6e0c2f15
+Create Date: 2026-10-18 13:02:51.204716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e93d4c5a0'
+down_revision = '8a4d6e0c2f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    venue_genres = op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genres_genre_id', 'venue_genres', ['genre_id', 'venue_id'])
+    artist_genres = op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genres_genre_id', 'artist_genres', ['genre_id', 'artist_id'])
+
+    # Data migration: split the comma-joined genres strings into links.
+    # The string columns are kept; they remain the display/search copy.
+    bind = op.get_bind()
+    genre_ids = {}
+
+    def links(table, owner_column):
+        rows = []
+        for owner_id, genres in bind.execute(
+                sa.text(f'SELECT id, genres FROM "{table}" WHERE genres IS NOT NULL')):
+            names = [name.strip() for name in genres.split(',') if name.strip()]
+            for name in dict.fromkeys(names):
+                if name not in genre_ids:
+                    genre_ids[name] = len(genre_ids) + 1
+                rows.append({owner_column: owner_id, 'genre_id': genre_ids[name]})
+        return rows
+
+    venue_links = links('Venue', 'venue_id')
+    artist_links = links('Artist', 'artist_id')
+    if genre_ids:
+        op.bulk_insert(genre, [{'id': id, 'name': name} for name, id in genre_ids.items()])
+        if bind.dialect.name == 'postgresql':
+            bind.execute(sa.text(
+                """SELECT setval('"Genre_id_seq"', (SELECT MAX(id) FROM "Genre"))"""))
+    if venue_links:
+        op.bulk_insert(venue_genres, venue_links)
+    if artist_links:
+        op.bulk_insert(artist_genres, artist_links)
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres_genre_id', table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index('ix_venue_genres_genre_id', table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
@@ -0,0 +1,49 @@
+"""denormalized show counters
+
+Revision ID: c4e8f1a92d67
+Revises: b71e93d4c5a0
+Create Date: 2026-10-18 20:14:07.518302
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8f1a92d67'
+down_revision = 'b71e93d4c5a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+    counter_state = op.create_table('CounterState',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_over_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Data migration: count the existing shows against a fresh watermark
+    now = datetime.now()
+    bind = op.get_bind()
+    for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        bind.execute(sa.text(f'''
+            UPDATE "{table}" SET
+              upcoming_shows_count = (SELECT COUNT(*) FROM "Show"
+                WHERE "Show".{column} = "{table}".id AND "Show".start_time > :now),
+              past_shows_count = (SELECT COUNT(*) FROM "Show"
+                WHERE "Show".{column} = "{table}".id AND "Show".start_time <= :now)
+        '''), {'now': now})
+    op.bulk_insert(counter_state, [{'id': 1, 'rolled_over_at': now}])
+
+
+def downgrade():
+    op.drop_table('CounterState')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
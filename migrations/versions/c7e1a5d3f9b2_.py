@@ -0,0 +1,60 @@
+"""soft-deleted venues and artists
+
+Revision ID: c7e1a5d3f9b2
+Revises: a6d2f8e4c1b9
+Create Date: 2026-10-19 02:14:37.902415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1a5d3f9b2'
+down_revision = 'a6d2f8e4c1b9'
+branch_labels = None
+depends_on = None
+
+SEARCH_FIELDS = ('name', 'city', 'state', 'genres')
+LISTING_COLUMNS = {'Venue': ['city', 'state', 'name', 'id'], 'Artist': ['name', 'id']}
+
+
+def create_trigram_indexes(table, where=None):
+    for field in SEARCH_FIELDS:
+        op.create_index(
+            f'ix_{table}_{field}_trgm', table, [field],
+            postgresql_using='gin',
+            postgresql_ops={field: 'gin_trgm_ops'},
+            postgresql_where=where,
+        )
+
+
+def upgrade():
+    # deleted_at marks rows awaiting `flask deletions purge`. Partial
+    # indexes serve the listings over live rows and the purge's lookup of
+    # deleted ones; on PostgreSQL the trigram search indexes are rebuilt
+    # over live rows only.
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    live, deleted = sa.text('deleted_at IS NULL'), sa.text('deleted_at IS NOT NULL')
+    for table, columns in LISTING_COLUMNS.items():
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.create_index(f'ix_{table}_live', table, columns,
+                        postgresql_where=live, sqlite_where=live)
+        op.create_index(f'ix_{table}_deleted_at', table, ['deleted_at'],
+                        postgresql_where=deleted, sqlite_where=deleted)
+        if is_postgres:
+            for field in SEARCH_FIELDS:
+                op.drop_index(f'ix_{table}_{field}_trgm', table_name=table)
+            create_trigram_indexes(table, where=live)
+
+
+def downgrade():
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    for table in LISTING_COLUMNS:
+        if is_postgres:
+            for field in SEARCH_FIELDS:
+                op.drop_index(f'ix_{table}_{field}_trgm', table_name=table)
+            create_trigram_indexes(table)
+        op.drop_index(f'ix_{table}_deleted_at', table_name=table)
+        op.drop_index(f'ix_{table}_live', table_name=table)
+        op.drop_column(table, 'deleted_at')
@@ -0,0 +1,70 @@
+"""show calendar summary tables
+
+Revision ID: d5a3b9c0e7f2
+Revises: c4e8f1a92d67
+Create Date: 2026-10-18 21:02:44.183920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a3b9c0e7f2'
+down_revision = 'c4e8f1a92d67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowCalendar',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('venue_name', sa.String(), nullable=True),
+    sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('state', sa.String(length=120), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=True),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+    sa.ForeignKeyConstraint(['show_id'], ['Show.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+    op.create_index('ix_ShowCalendar_start_time_show_id', 'ShowCalendar', ['start_time', 'show_id'])
+    op.create_index('ix_ShowCalendar_area_start_time', 'ShowCalendar', ['city', 'state', 'start_time', 'show_id'])
+    op.create_index('ix_ShowCalendar_venue_id', 'ShowCalendar', ['venue_id'])
+    op.create_index('ix_ShowCalendar_artist_id', 'ShowCalendar', ['artist_id'])
+    op.create_table('show_calendar_genres',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['show_id'], ['ShowCalendar.show_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id', 'genre')
+    )
+    op.create_index('ix_show_calendar_genres_genre', 'show_calendar_genres', ['genre', 'start_time', 'show_id'])
+
+    # Data migration: fill the calendar from the existing shows
+    op.execute('''
+        INSERT INTO "ShowCalendar" (show_id, start_time, venue_id, venue_name, venue_image_link,
+                                    city, state, artist_id, artist_name, artist_image_link)
+        SELECT s.id, s.start_time, s.venue_id, v.name, v.image_link, v.city, v.state,
+               s.artist_id, a.name, a.image_link
+        FROM "Show" s JOIN "Venue" v ON v.id = s.venue_id JOIN "Artist" a ON a.id = s.artist_id
+    ''')
+    op.execute('''
+        INSERT INTO show_calendar_genres (show_id, genre, start_time)
+        SELECT s.id, g.name, s.start_time
+        FROM "Show" s JOIN artist_genres ag ON ag.artist_id = s.artist_id
+        JOIN "Genre" g ON g.id = ag.genre_id
+    ''')
+
+
+def downgrade():
+    op.drop_index('ix_show_calendar_genres_genre', table_name='show_calendar_genres')
+    op.drop_table('show_calendar_genres')
+    op.drop_index('ix_ShowCalendar_artist_id', table_name='ShowCalendar')
+    op.drop_index('ix_ShowCalendar_venue_id', table_name='ShowCalendar')
+    op.drop_index('ix_ShowCalendar_area_start_time', table_name='ShowCalendar')
+    op.drop_index('ix_ShowCalendar_start_time_show_id', table_name='ShowCalendar')
+    op.drop_table('ShowCalendar')
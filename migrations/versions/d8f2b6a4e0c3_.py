@@ -0,0 +1,32 @@
+"""typeahead prefix indexes
+
+Revision ID: d8f2b6a4e0c3
+Revises: c7e1a5d3f9b2
+Create Date: 2026-10-19 04:37:21.551870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f2b6a4e0c3'
+down_revision = 'c7e1a5d3f9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # lower(name) over live rows for the typeahead's LIKE 'prefix%';
+    # text_pattern_ops makes it usable whatever PostgreSQL's collation
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    key = sa.text('lower(name) text_pattern_ops' if is_postgres else 'lower(name)')
+    live = sa.text('deleted_at IS NULL')
+    for table in ('Venue', 'Artist'):
+        op.create_index(f'ix_{table}_name_prefix', table, [key],
+                        postgresql_where=live, sqlite_where=live)
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index(f'ix_{table}_name_prefix', table_name=table)
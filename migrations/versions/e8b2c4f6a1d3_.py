@@ -0,0 +1,261 @@
+"""venue positions and geohash index
+
+Revision ID: e8b2c4f6a1d3
+Revises: d5a3b9c0e7f2
+Create Date: 2026-10-18 22:10:31.604117
+
+"""
+import csv
+import io
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2c4f6a1d3'
+down_revision = 'd5a3b9c0e7f2'
+branch_labels = None
+depends_on = None
+
+
+# geo.py's geohash(), place_key() and gazetteer as they were at this
+# revision, frozen so that later changes to geo.py or data/gazetteer.csv
+# cannot change what this migration does
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(latitude, longitude, precision=9):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def place_key(city, state):
+    return ' '.join((city or '').replace('.', ' ').split()).casefold(), (state or '').strip().upper()
+
+
+GAZETTEER = '''\
+city,state,latitude,longitude
+Birmingham,AL,33.5186,-86.8104
+Montgomery,AL,32.3792,-86.3077
+Huntsville,AL,34.7304,-86.5861
+Anchorage,AK,61.2181,-149.9003
+Juneau,AK,58.3019,-134.4197
+Phoenix,AZ,33.4484,-112.0740
+Tucson,AZ,32.2226,-110.9747
+Mesa,AZ,33.4152,-111.8315
+Scottsdale,AZ,33.4942,-111.9261
+Tempe,AZ,33.4255,-111.9400
+Little Rock,AR,34.7465,-92.2896
+Fayetteville,AR,36.0626,-94.1574
+Los Angeles,CA,34.0522,-118.2437
+San Diego,CA,32.7157,-117.1611
+San Jose,CA,37.3382,-121.8863
+San Francisco,CA,37.7749,-122.4194
+Oakland,CA,37.8044,-122.2712
+Berkeley,CA,37.8715,-122.2730
+Sacramento,CA,38.5816,-121.4944
+Fresno,CA,36.7378,-119.7871
+Long Beach,CA,33.7701,-118.1937
+Santa Barbara,CA,34.4208,-119.6982
+Santa Cruz,CA,36.9741,-122.0308
+Anaheim,CA,33.8366,-117.9143
+Riverside,CA,33.9806,-117.3755
+Pasadena,CA,34.1478,-118.1445
+Denver,CO,39.7392,-104.9903
+Boulder,CO,40.0150,-105.2705
+Colorado Springs,CO,38.8339,-104.8214
+Hartford,CT,41.7658,-72.6734
+New Haven,CT,41.3083,-72.9279
+Wilmington,DE,39.7391,-75.5398
+Dover,DE,39.1582,-75.5244
+Washington,DC,38.9072,-77.0369
+Miami,FL,25.7617,-80.1918
+Orlando,FL,28.5383,-81.3792
+Tampa,FL,27.9506,-82.4572
+Jacksonville,FL,30.3322,-81.6557
+Tallahassee,FL,30.4383,-84.2807
+St. Petersburg,FL,27.7676,-82.6403
+Fort Lauderdale,FL,26.1224,-80.1373
+Atlanta,GA,33.7490,-84.3880
+Savannah,GA,32.0809,-81.0912
+Athens,GA,33.9519,-83.3576
+Honolulu,HI,21.3069,-157.8583
+Boise,ID,43.6150,-116.2023
+Chicago,IL,41.8781,-87.6298
+Springfield,IL,39.7817,-89.6501
+Evanston,IL,42.0451,-87.6877
+Indianapolis,IN,39.7684,-86.1581
+Bloomington,IN,39.1653,-86.5264
+Fort Wayne,IN,41.0793,-85.1394
+Des Moines,IA,41.5868,-93.6250
+Iowa City,IA,41.6611,-91.5302
+Wichita,KS,37.6872,-97.3301
+Kansas City,KS,39.1141,-94.6275
+Lawrence,KS,38.9717,-95.2353
+Louisville,KY,38.2527,-85.7585
+Lexington,KY,38.0406,-84.5037
+New Orleans,LA,29.9511,-90.0715
+Baton Rouge,LA,30.4515,-91.1871
+Lafayette,LA,30.2241,-92.0198
+Portland,ME,43.6591,-70.2568
+Augusta,ME,44.3106,-69.7795
+Baltimore,MD,39.2904,-76.6122
+Annapolis,MD,38.9784,-76.4922
+Boston,MA,42.3601,-71.0589
+Cambridge,MA,42.3736,-71.1097
+Worcester,MA,42.2626,-71.8023
+Detroit,MI,42.3314,-83.0458
+Ann Arbor,MI,42.2808,-83.7430
+Grand Rapids,MI,42.9634,-85.6681
+Minneapolis,MN,44.9778,-93.2650
+St. Paul,MN,44.9537,-93.0900
+Duluth,MN,46.7867,-92.1005
+Jackson,MS,32.2988,-90.1848
+Oxford,MS,34.3665,-89.5192
+Kansas City,MO,39.0997,-94.5786
+St. Louis,MO,38.6270,-90.1994
+Columbia,MO,38.9517,-92.3341
+Billings,MT,45.7833,-108.5007
+Missoula,MT,46.8721,-113.9940
+Omaha,NE,41.2565,-95.9345
+Lincoln,NE,40.8136,-96.7026
+Las Vegas,NV,36.1699,-115.1398
+Reno,NV,39.5296,-119.8138
+Manchester,NH,42.9956,-71.4548
+Portsmouth,NH,43.0718,-70.7626
+Newark,NJ,40.7357,-74.1724
+Jersey City,NJ,40.7178,-74.0431
+Hoboken,NJ,40.7440,-74.0324
+Asbury Park,NJ,40.2204,-74.0121
+Albuquerque,NM,35.0844,-106.6504
+Santa Fe,NM,35.6870,-105.9378
+New York,NY,40.7128,-74.0060
+Brooklyn,NY,40.6782,-73.9442
+Queens,NY,40.7282,-73.7949
+Bronx,NY,40.8448,-73.8648
+Buffalo,NY,42.8864,-78.8784
+Rochester,NY,43.1566,-77.6088
+Albany,NY,42.6526,-73.7562
+Syracuse,NY,43.0481,-76.1474
+Ithaca,NY,42.4440,-76.5019
+Charlotte,NC,35.2271,-80.8431
+Raleigh,NC,35.7796,-78.6382
+Durham,NC,35.9940,-78.8986
+Asheville,NC,35.5951,-82.5515
+Chapel Hill,NC,35.9132,-79.0558
+Fargo,ND,46.8772,-96.7898
+Bismarck,ND,46.8083,-100.7837
+Columbus,OH,39.9612,-82.9988
+Cleveland,OH,41.4993,-81.6944
+Cincinnati,OH,39.1031,-84.5120
+Dayton,OH,39.7589,-84.1916
+Toledo,OH,41.6528,-83.5379
+Oklahoma City,OK,35.4676,-97.5164
+Tulsa,OK,36.1540,-95.9928
+Portland,OR,45.5152,-122.6784
+Eugene,OR,44.0521,-123.0868
+Salem,OR,44.9429,-123.0351
+Philadelphia,PA,39.9526,-75.1652
+Pittsburgh,PA,40.4406,-79.9959
+Harrisburg,PA,40.2732,-76.8867
+Providence,RI,41.8240,-71.4128
+Charleston,SC,32.7765,-79.9311
+Columbia,SC,34.0007,-81.0348
+Greenville,SC,34.8526,-82.3940
+Sioux Falls,SD,43.5446,-96.7311
+Rapid City,SD,44.0805,-103.2310
+Nashville,TN,36.1627,-86.7816
+Memphis,TN,35.1495,-90.0490
+Knoxville,TN,35.9606,-83.9207
+Chattanooga,TN,35.0456,-85.3097
+Houston,TX,29.7604,-95.3698
+San Antonio,TX,29.4241,-98.4936
+Dallas,TX,32.7767,-96.7970
+Austin,TX,30.2672,-97.7431
+Fort Worth,TX,32.7555,-97.3308
+El Paso,TX,31.7619,-106.4850
+Arlington,TX,32.7357,-97.1081
+Denton,TX,33.2148,-97.1331
+Lubbock,TX,33.5779,-101.8552
+Corpus Christi,TX,27.8006,-97.3964
+Salt Lake City,UT,40.7608,-111.8910
+Provo,UT,40.2338,-111.6585
+Burlington,VT,44.4759,-73.2121
+Montpelier,VT,44.2601,-72.5754
+Richmond,VA,37.5407,-77.4360
+Virginia Beach,VA,36.8529,-75.9780
+Norfolk,VA,36.8508,-76.2859
+Charlottesville,VA,38.0293,-78.4767
+Arlington,VA,38.8816,-77.0910
+Seattle,WA,47.6062,-122.3321
+Spokane,WA,47.6588,-117.4260
+Tacoma,WA,47.2529,-122.4443
+Olympia,WA,47.0379,-122.9007
+Bellingham,WA,48.7519,-122.4787
+Charleston,WV,38.3498,-81.6326
+Morgantown,WV,39.6295,-79.9559
+Milwaukee,WI,43.0389,-87.9065
+Madison,WI,43.0731,-89.4012
+Cheyenne,WY,41.1400,-104.8202
+Jackson,WY,43.4799,-110.7624
+'''
+
+
+def gazetteer():
+    # (city key, state) -> (city, state, latitude, longitude)
+    return {place_key(row['city'], row['state']): (
+                row['city'], row['state'], float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(io.StringIO(GAZETTEER))}
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_Venue_geohash'), 'Venue', ['geohash'], unique=False)
+
+    # Data migration: place the existing venues at their city's centre, one
+    # UPDATE per distinct (city, state), respelling the city as the
+    # gazetteer does (also in the show calendar's copies)
+    bind = op.get_bind()
+    places = gazetteer()
+    areas = bind.execute(sa.text('SELECT DISTINCT city, state FROM "Venue"')).fetchall()
+    for city, state in areas:
+        place = places.get(place_key(city, state))
+        if place is None:
+            continue
+        params = {'city': city, 'state': state, 'new_city': place[0],
+                  'latitude': place[2], 'longitude': place[3], 'geohash': geohash(place[2], place[3])}
+        bind.execute(sa.text('''
+            UPDATE "ShowCalendar" SET city = :new_city
+            WHERE venue_id IN (SELECT id FROM "Venue" WHERE city = :city AND state = :state)
+        '''), params)
+        bind.execute(sa.text('''
+            UPDATE "Venue" SET city = :new_city, latitude = :latitude, longitude = :longitude,
+              geohash = :geohash
+            WHERE city = :city AND state = :state
+        '''), params)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Venue_geohash'), table_name='Venue')
+    op.drop_column('Venue', 'geohash')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
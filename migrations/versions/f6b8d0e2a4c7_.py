@@ -0,0 +1,30 @@
+"""recommendation refresh queue
+
+Revision ID: f6b8d0e2a4c7
+Revises: d8f2b6a4e0c3
+Create Date: 2026-10-19 09:12:44.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b8d0e2a4c7'
+down_revision = 'd8f2b6a4e0c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by new shows, drained by `flask recommendations refresh`
+    op.create_table('RecommendationQueue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=6), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('RecommendationQueue')
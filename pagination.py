@@ -0,0 +1,52 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination cursors.
+#
+# Cursors are opaque, URL-safe tokens holding the sort key of the last row
+# of a page: (start_time, id) for shows, the id alone for venues and
+# artists. They are shared by the HTML pages and the JSON API.
+#----------------------------------------------------------------------------#
+
+import base64
+import binascii
+from datetime import datetime
+
+
+def _encode(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(cursor):
+    return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+
+
+def encode_cursor(start_time, show_id):
+    # Opaque position of a show in the (start_time, id) ordering
+    return _encode(f'{start_time.isoformat()}|{show_id}')
+
+
+def decode_cursor(cursor):
+    # Inverse of encode_cursor; raises ValueError on a malformed cursor
+    if not cursor:
+        return None
+    try:
+        start_time, show_id = _decode(cursor).rsplit('|', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'invalid cursor: {cursor!r}')
+
+
+def encode_id_cursor(row_id):
+    # Opaque position of a row in id order
+    return _encode(f'id|{row_id}')
+
+
+def decode_id_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        kind, row_id = _decode(cursor).split('|', 1)
+        if kind != 'id':
+            raise ValueError(cursor)
+        return int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'invalid cursor: {cursor!r}')
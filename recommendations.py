@@ -0,0 +1,400 @@
+#----------------------------------------------------------------------------#
+# Artist / venue recommendations.
+#
+# For each artist, the venues seeking talent that fit it, and for each venue
+# the artists seeking a venue, precomputed into the Recommendation table so
+# a detail page reads its list with one primary key range scan:
+#
+#   flask recommendations build    # recompute every list, e.g. nightly
+#   flask recommendations refresh  # recompute the queued lists, e.g. every
+#                                  # few minutes from cron
+#
+# A match scores GENRE_WEIGHT * genre similarity + the rest * show history:
+#   - genre similarity is the cosine of the two genre sets;
+#   - show history scores the paths artist -> venue -> artist -> venue in
+#     the bipartite graph of who played where (N Nt N, N being the
+#     artist x venue matrix normalized by the square roots of the degrees),
+#     i.e. "artists who played where you played also played here", scaled
+#     to 1 for the source's best candidate.
+# Pairs that already share a show are not recommended. The build uses
+# NumPy/SciPy sparse matrices when installed and plain Python otherwise.
+# A new show only queues the lists of its artist and venue (the
+# RecommendationQueue table): recomputing one reads its 3-hop neighbourhood
+# in the show graph, whose size has no bound for a busy venue or artist, so
+# the refresh command does it out of the request. The other lists catch up
+# at the next build. Deleted venues and artists
+# (deletions.py) are neither sources nor targets, and their lists go when
+# they are purged.
+#----------------------------------------------------------------------------#
+
+import math
+from collections import defaultdict
+
+import click
+from flask.cli import AppGroup
+
+from deletions import deleted_ids
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:     # optional: the build falls back to plain Python
+    np = sparse = None
+
+KINDS = ('artist', 'venue')     # the kind of the source; targets are the other one
+
+
+class Graph:
+    # One direction of the match: sources, the targets they played with
+    # (edges / back), genre ids, and the targets open to recommendation
+
+    def __init__(self):
+        self.edges = defaultdict(set)           # source -> targets played with
+        self.back = defaultdict(set)            # target -> sources played with
+        self.source_genres = defaultdict(set)
+        self.target_genres = defaultdict(set)
+        self.eligible = set()                   # targets seeking a match
+
+    def genre_index(self):
+        # genre id -> eligible targets tagged with it
+        index = defaultdict(list)
+        for target in self.eligible:
+            for genre in self.target_genres[target]:
+                index[genre].append(target)
+        return index
+
+
+def rank(graph, source, top_k, genre_weight, genre_index=None):
+    # [(target, score)] best first, for one source, in plain Python
+    played = graph.edges.get(source, set())
+    genres = graph.source_genres.get(source, set())
+    if genre_index is None:
+        genre_index = graph.genre_index()
+
+    scores = defaultdict(float)
+    if genres and genre_weight:
+        shared = defaultdict(int)
+        for genre in genres:
+            for target in genre_index.get(genre, ()):
+                shared[target] += 1
+        for target, count in shared.items():
+            scores[target] += genre_weight * count / math.sqrt(len(genres) * len(graph.target_genres[target]))
+
+    if played and genre_weight < 1:
+        # Paths source -> u -> b -> target, each step weighted as in N Nt N
+        history = defaultdict(float)
+        for u in played:
+            step = 1 / (math.sqrt(len(played)) * len(graph.back[u]))
+            for b in graph.back[u]:
+                weight = step / len(graph.edges[b])
+                for target in graph.edges[b]:
+                    if target in graph.eligible and target not in played:
+                        history[target] += weight / math.sqrt(len(graph.back[target]))
+        if history:
+            best = max(history.values())
+            for target, value in history.items():
+                scores[target] += (1 - genre_weight) * value / best
+
+    ranked = sorted(((target, score) for target, score in scores.items()
+                     if score > 0 and target not in played),
+                    key=lambda item: (-item[1], item[0]))
+    return ranked[:top_k]
+
+
+def rank_all_numpy(graph, top_k, genre_weight, cells=4000000):
+    # {source: [(target, score)]} for every source with NumPy/SciPy, in
+    # blocks of sources so a dense block stays under `cells` floats
+    sources = sorted(set(graph.edges) | set(graph.source_genres))
+    targets = sorted(set(graph.back) | set(graph.target_genres) | graph.eligible)
+    if not sources or not targets:
+        return {}
+    source_index = {source: i for i, source in enumerate(sources)}
+    target_index = {target: i for i, target in enumerate(targets)}
+    target_ids = np.array(targets)
+
+    def matrix(pairs, shape):
+        rows, columns = zip(*pairs) if pairs else ((), ())
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=shape)
+
+    played = matrix([(source_index[s], target_index[t]) for s, ts in graph.edges.items() for t in ts],
+                    (len(sources), len(targets)))
+
+    def scale(vector):
+        with np.errstate(divide='ignore'):
+            return sparse.diags(np.where(vector > 0, 1 / np.sqrt(vector), 0))
+
+    normalized = (scale(np.asarray(played.sum(axis=1)).ravel()) @ played
+                  @ scale(np.asarray(played.sum(axis=0)).ravel())).tocsr()
+
+    genre_ids = sorted({g for gs in graph.source_genres.values() for g in gs}
+                       | {g for gs in graph.target_genres.values() for g in gs})
+    genre_index = {genre: i for i, genre in enumerate(genre_ids)}
+
+    def genre_matrix(owners, owner_index, shape):
+        # Rows scaled to unit length, so products are cosines
+        pairs = [(owner_index[owner], genre_index[g]) for owner, gs in owners.items() for g in gs
+                 if owner in owner_index]
+        genres = matrix(pairs, shape)
+        return (scale(np.asarray(genres.sum(axis=1)).ravel()) @ genres).tocsr()
+
+    source_genres = genre_matrix(graph.source_genres, source_index, (len(sources), max(len(genre_ids), 1)))
+    target_genres_t = genre_matrix(graph.target_genres, target_index, (len(targets), max(len(genre_ids), 1))).T.tocsc()
+    eligible = np.isin(target_ids, list(graph.eligible))
+    normalized_t = normalized.T.tocsr()
+
+    results = {}
+    block = max(1, cells // len(targets))
+    for start in range(0, len(sources), block):
+        rows = slice(start, start + block)
+        excluded = ~eligible[None, :] | (played[rows].toarray() > 0)
+        history = ((normalized[rows] @ normalized_t) @ normalized).toarray()
+        history[excluded] = 0
+        best = history.max(axis=1, keepdims=True)
+        history = np.divide(history, best, out=np.zeros_like(history), where=best > 0)
+        scores = genre_weight * (source_genres[rows] @ target_genres_t).toarray() + (1 - genre_weight) * history
+        scores[excluded] = 0
+        for offset, row in enumerate(scores):
+            candidates = np.flatnonzero(row > 0)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-row[candidates], top_k - 1)[:top_k]]
+            order = np.lexsort((target_ids[candidates], -row[candidates]))
+            if len(order):
+                results[sources[start + offset]] = [
+                    (int(target_ids[candidates[i]]), float(row[candidates[i]])) for i in order]
+    return results
+
+
+class Recommender:
+
+    def __init__(self, db, Venue, Artist, Shows, Recommendation, RecommendationQueue,
+                 top_k=20, genre_weight=0.5):
+        self.db = db
+        self.Venue, self.Artist, self.Shows = Venue, Artist, Shows
+        self.Recommendation = Recommendation
+        self.Queue = RecommendationQueue
+        self.top_k = top_k
+        self.genre_weight = genre_weight
+        # kind -> (source model, target model, source Show column, target
+        # Show column, target "seeking" column)
+        self.sides = {
+            'artist': (Artist, Venue, Shows.artist_id, Shows.venue_id, Venue.seeking_talent),
+            'venue': (Venue, Artist, Shows.venue_id, Shows.artist_id, Artist.seeking_venue),
+        }
+
+    # Loading
+
+    def _live_shows(self):
+        # Filter clause leaving out the shows of deleted venues and artists
+        Shows, db = self.Shows, self.db
+        return db.and_(Shows.venue_id.notin_(deleted_ids(db, self.Venue)),
+                       Shows.artist_id.notin_(deleted_ids(db, self.Artist)))
+
+    def _genres(self, model, ids=None):
+        links = model.genre_list.property.secondary
+        owner = next(column for column in links.c if column.name != 'genre_id')
+        query = self.db.session.query(owner, links.c.genre_id).filter(
+            owner.notin_(deleted_ids(self.db, model)))
+        if ids is not None:
+            query = query.filter(owner.in_(list(ids)))
+        return query
+
+    def graphs(self):
+        # Both directions, from the whole catalog
+        Shows, db = self.Shows, self.db
+        by_kind = {kind: Graph() for kind in KINDS}
+        artists, venues = by_kind['artist'], by_kind['venue']
+        for artist_id, venue_id in db.session.query(Shows.artist_id, Shows.venue_id).filter(
+                self._live_shows()).distinct():
+            artists.edges[artist_id].add(venue_id)
+            artists.back[venue_id].add(artist_id)
+            venues.edges[venue_id].add(artist_id)
+            venues.back[artist_id].add(venue_id)
+        for artist_id, genre_id in self._genres(self.Artist):
+            artists.source_genres[artist_id].add(genre_id)
+            venues.target_genres[artist_id].add(genre_id)
+        for venue_id, genre_id in self._genres(self.Venue):
+            venues.source_genres[venue_id].add(genre_id)
+            artists.target_genres[venue_id].add(genre_id)
+        artists.eligible = {id for (id,) in db.session.query(self.Venue.id).filter(
+            self.Venue.seeking_talent, self.Venue.deleted_at.is_(None))}
+        venues.eligible = {id for (id,) in db.session.query(self.Artist.id).filter(
+            self.Artist.seeking_venue, self.Artist.deleted_at.is_(None))}
+        return by_kind
+
+    def neighbourhood(self, kind, source_id):
+        # The part of one direction's graph that rank() reads for one source
+        Source, Target, source_fk, target_fk, seeking = self.sides[kind]
+        db, graph = self.db, Graph()
+
+        def pairs(column, ids):
+            # Distinct (source, target) pairs of shows whose `column` is in ids
+            if not ids:
+                return []
+            return db.session.query(source_fk, target_fk).filter(
+                column.in_(list(ids)), self._live_shows()).distinct().all()
+
+        for source, target in pairs(source_fk, [source_id]):
+            graph.edges[source].add(target)
+        for source, target in pairs(target_fk, graph.edges[source_id]):
+            graph.back[target].add(source)
+        second = set().union(*graph.back.values()) if graph.back else set()
+        for source, target in pairs(source_fk, second):
+            graph.edges[source].add(target)
+        reached = set().union(*(graph.edges[source] for source in second)) if second else set()
+        for source, target in pairs(target_fk, reached - set(graph.back)):
+            graph.back[target].add(source)
+
+        for _, genre_id in self._genres(Source, [source_id]):
+            graph.source_genres[source_id].add(genre_id)
+        links = Target.genre_list.property.secondary
+        owner = next(column for column in links.c if column.name != 'genre_id')
+        tagged = db.session.query(owner).filter(links.c.genre_id.in_(list(graph.source_genres[source_id])))
+        candidates = reached | {id for (id,) in tagged}
+        for target, genre_id in self._genres(Target, candidates):
+            graph.target_genres[target].add(genre_id)
+        if candidates:
+            graph.eligible = {id for (id,) in db.session.query(Target.id).filter(
+                Target.id.in_(list(candidates)), seeking, Target.deleted_at.is_(None))}
+        return graph
+
+    # Writing
+
+    def _rows(self, kind, source_id, ranked):
+        return [{'kind': kind, 'source_id': source_id, 'rank': position, 'target_id': target,
+                 'score': round(score, 6)} for position, (target, score) in enumerate(ranked, 1)]
+
+    def build(self, chunk_size=5000):
+        # Recompute every list; the caller commits. Returns the number of
+        # lists written and whether NumPy/SciPy did the work.
+        table = self.Recommendation.__table__
+        count, rows = 0, []
+        queued = [id for ids in self.queued().values() for id in ids]
+        graphs = self.graphs()
+        self.db.session.execute(table.delete())
+        for kind, graph in graphs.items():
+            if np is not None:
+                ranked = rank_all_numpy(graph, self.top_k, self.genre_weight)
+            else:
+                index = graph.genre_index()
+                sources = set(graph.edges) | set(graph.source_genres)
+                ranked = {source: rank(graph, source, self.top_k, self.genre_weight, index)
+                          for source in sources}
+            for source_id in sorted(ranked):
+                if not ranked[source_id]:
+                    continue
+                count += 1
+                rows.extend(self._rows(kind, source_id, ranked[source_id]))
+                if len(rows) >= chunk_size:
+                    self.db.session.execute(table.insert(), rows)
+                    rows = []
+        if rows:
+            self.db.session.execute(table.insert(), rows)
+        for chunk in range(0, len(queued), chunk_size):
+            self._dequeue(queued[chunk:chunk + chunk_size])
+        return count, np is not None
+
+    def refresh(self, kind, source_id):
+        # Recompute one list, in the caller's transaction
+        Recommendation = self.Recommendation
+        ranked = rank(self.neighbourhood(kind, source_id), source_id, self.top_k, self.genre_weight)
+        self.db.session.query(Recommendation).filter(
+            Recommendation.kind == kind, Recommendation.source_id == source_id,
+        ).delete(synchronize_session=False)
+        if ranked:
+            self.db.session.execute(Recommendation.__table__.insert(), self._rows(kind, source_id, ranked))
+
+    def show_added(self, show):
+        # The pair now shares a show, and both sides' history changed: queue
+        # both lists, in the caller's transaction. A list may be queued more
+        # than once; inserts never conflict.
+        self.db.session.execute(self.Queue.__table__.insert(), [
+            {'kind': 'artist', 'source_id': show.artist_id},
+            {'kind': 'venue', 'source_id': show.venue_id},
+        ])
+
+    def queued(self, limit=None):
+        # {(kind, source id): [queue row ids]} of the first `limit` queued
+        # lists, oldest first
+        Queue, lists = self.Queue, {}
+        for row_id, kind, source_id in self.db.session.query(
+                Queue.id, Queue.kind, Queue.source_id).order_by(Queue.id):
+            if (kind, source_id) in lists:
+                lists[(kind, source_id)].append(row_id)
+            elif limit is None or len(lists) < limit:
+                lists[(kind, source_id)] = [row_id]
+        return lists
+
+    def _dequeue(self, ids):
+        # Only the rows read: a list queued again meanwhile stays queued
+        Queue = self.Queue
+        self.db.session.query(Queue).filter(Queue.id.in_(ids)).delete(synchronize_session=False)
+
+    def refresh_queued(self, limit=None):
+        # Recompute the queued lists, committing after each. Yields (kind,
+        # source id) as lists are written.
+        db = self.db
+        for (kind, source_id), ids in self.queued(limit).items():
+            try:
+                self.refresh(kind, source_id)
+                self._dequeue(ids)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            yield kind, source_id
+
+    def forget(self, kind, row_id):
+        # Drop a purged venue's or artist's list and its place in the lists
+        # of the other side, in the caller's transaction
+        Recommendation = self.Recommendation
+        other = next(other for other in KINDS if other != kind)
+        self.db.session.query(Recommendation).filter(self.db.or_(
+            self.db.and_(Recommendation.kind == kind, Recommendation.source_id == row_id),
+            self.db.and_(Recommendation.kind == other, Recommendation.target_id == row_id),
+        )).delete(synchronize_session=False)
+        self.db.session.query(self.Queue).filter(
+            self.Queue.kind == kind, self.Queue.source_id == row_id).delete(synchronize_session=False)
+
+    # Reading
+
+    def fetch(self, kind, source_id, limit):
+        # The first `limit` matches still seeking and not deleted, as dicts
+        # for the pages; one query
+        Recommendation = self.Recommendation
+        Target = self.sides[kind][1]
+        seeking = self.sides[kind][4]
+        rows = self.db.session.query(
+            Target.id, Target.name, Target.city, Target.state, Target.image_link, Recommendation.score,
+        ).join(Target, Target.id == Recommendation.target_id
+        ).filter(Recommendation.kind == kind, Recommendation.source_id == source_id, seeking,
+                 Target.deleted_at.is_(None)
+        ).order_by(Recommendation.rank).limit(limit)
+        return [{'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state,
+                 'image_link': row.image_link, 'score': row.score} for row in rows]
+
+
+def create_recommendations_cli(recommender, on_build=None, on_refresh=None):
+    # `on_build` runs after a build and `on_refresh` with {kind: [source
+    # ids]} after a refresh, e.g. to drop cached pages
+    db = recommender.db
+    cli = AppGroup('recommendations', help='Precompute artist / venue recommendations.')
+
+    @cli.command('build')
+    def build_command():
+        count, vectorized = recommender.build()
+        db.session.commit()
+        if on_build is not None:
+            on_build()
+        click.echo(f"{count} recommendation lists written ({'NumPy/SciPy' if vectorized else 'plain Python'})")
+
+    @cli.command('refresh')
+    @click.option('--limit', type=int, help='Most lists recomputed in this run.')
+    def refresh_command(limit):
+        refreshed = defaultdict(list)
+        for kind, source_id in recommender.refresh_queued(limit):
+            refreshed[kind].append(source_id)
+        if refreshed and on_refresh is not None:
+            on_refresh(dict(refreshed))
+        click.echo(f'{sum(map(len, refreshed.values()))} recommendation lists refreshed')
+
+    return cli
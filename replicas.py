@@ -0,0 +1,273 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# With REPLICA_DATABASE_URIS set, read-only requests (GET and HEAD, plus the
+# search form posts) run their queries on a replica, taken round-robin from
+# those that passed the last health check. Everything else uses the primary
+# (SQLALCHEMY_DATABASE_URI):
+#   - any other request, and code running outside a request (CLI jobs);
+#   - a request, from its first write (INSERT/UPDATE/DELETE, a flush or a
+#     locking SELECT) on, so it reads what it wrote;
+#   - a browser for READ_AFTER_WRITE_SECONDS after one of its requests
+#     wrote (a short-lived cookie), so it sees its own changes whatever
+#     the replication delay;
+#   - every request when no replica is healthy;
+#   - the rest of a request once it calls use_primary(): pages rendered
+#     into the page cache and rebuilt search indexes are served to every
+#     browser until the next write, so they are read from the primary
+#     rather than from a replica still missing the write that invalidated
+#     them.
+# A replica is healthy when it answers and, on PostgreSQL, replays the
+# primary's changes within REPLICA_MAX_LAG seconds. Replicas are checked
+# every REPLICA_CHECK_INTERVAL seconds by a background thread in each
+# process, so no request waits on a probe or has its queries counted
+# against its query budget; until the first check completes, reads go to
+# the primary. A replica whose connection fails is taken out until its
+# next check.
+#
+#   flask replicas status
+#
+# Replicas are Flask-SQLAlchemy binds named replica_0, replica_1, ... and
+# any two databases holding the same schema can stand in for a cluster.
+# Their connection pools report to /metrics under the same names.
+#----------------------------------------------------------------------------#
+
+import os
+import threading
+import time
+
+import click
+from flask import g, has_request_context, request
+from flask.cli import AppGroup
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, text
+
+READ_METHODS = ('GET', 'HEAD')
+# Set on a browser after one of its requests wrote, until when (epoch
+# seconds) its requests read from the primary
+PRIMARY_COOKIE = 'read_primary_until'
+
+# Seconds the replica is behind; 0 once it has replayed all it received,
+# as the replay timestamp stays put while the primary is idle
+POSTGRESQL_LAG = text('''
+    SELECT CASE
+      WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+      ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+''')
+
+
+def is_write(db_session, clause):
+    if db_session._flushing:
+        return True
+    if clause is None:
+        return False
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(SignallingSession):
+    # Lets the app's ReplicaRouter pick the engine of each statement
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        router = self.app.extensions.get('replicas')
+        if router is not None:
+            engine = router.bind_for(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class ReplicaRouter:
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.keys = []
+        self.healthy = []
+        self.status = {}
+        self._next = 0
+        self._engines = {}
+        self._lock = threading.Lock()
+        self._checker = None        # (pid, generation) of the running check thread
+        self._generation = 0
+        self._wake = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('REPLICA_DATABASE_URIS', [])
+        config.setdefault('REPLICA_MAX_LAG', 5.0)
+        config.setdefault('REPLICA_CHECK_INTERVAL', 10.0)
+        config.setdefault('READ_AFTER_WRITE_SECONDS', 10)
+        # Read-only endpoints reached by POST, and GET pages that must show
+        # the primary's data (edit forms)
+        config.setdefault('REPLICA_READ_ENDPOINTS', ())
+        config.setdefault('REPLICA_PRIMARY_ENDPOINTS', ())
+        self.app = app
+        app.extensions['replicas'] = self
+        app.before_request(self._route_request)
+        app.after_request(self._remember_write)
+        self.configure(config['REPLICA_DATABASE_URIS'])
+
+    def configure(self, uris):
+        # Serve the read-only requests from `uris` from now on; none sends
+        # everything to the primary
+        config = self.app.config
+        binds = {key: uri for key, uri in (config.get('SQLALCHEMY_BINDS') or {}).items()
+                 if not key.startswith('replica_')}
+        keys = [f'replica_{i}' for i in range(len(uris))]
+        binds.update(zip(keys, uris))
+        config['REPLICA_DATABASE_URIS'] = list(uris)
+        config['SQLALCHEMY_BINDS'] = binds or None
+        with self._lock:
+            engines, self._engines = self._engines, {}
+            self.keys, self.healthy, self.status = keys, [], {}
+            self._generation += 1       # the running check thread exits
+            self._checker = None
+        self._wake.set()
+        for engine in engines.values():
+            engine.dispose()
+        self._start_checks()
+
+    # Health
+
+    def engine(self, key):
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = self.db.get_engine(self.app, bind=key)
+            # A failed connection or statement takes the replica out of the
+            # rotation until the next check
+            event.listen(engine, 'handle_error', lambda context, key=key: self._failed(key, context))
+            engine.pool.label = key     # pool metrics per bind (instrumentation.py)
+            self._engines[key] = engine
+        return engine
+
+    def lag(self, connection):
+        if connection.dialect.name == 'postgresql':
+            return float(connection.execute(POSTGRESQL_LAG).scalar())
+        connection.execute(text('SELECT 1'))
+        return 0.0      # nothing to measure: the stand-in is always current
+
+    def check(self):
+        # Probe every replica; returns the healthy keys
+        status, keys = {}, self.keys
+        for key in keys:
+            start = time.perf_counter()
+            try:
+                with self.engine(key).connect() as connection:
+                    lag = self.lag(connection)
+            except Exception as error:
+                status[key] = {'healthy': False, 'lag': None, 'error': str(error).splitlines()[0]}
+                continue
+            status[key] = {
+                'healthy': lag <= self.app.config['REPLICA_MAX_LAG'],
+                'lag': round(lag, 3),
+                'check_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+        with self._lock:
+            if self.keys is keys:       # not reconfigured meanwhile
+                self.status = status
+                self.healthy = [key for key in keys if status[key]['healthy']]
+        return self.healthy
+
+    def _failed(self, key, context):
+        if context.is_disconnect or context.connection is None:
+            with self._lock:
+                self.healthy = [healthy for healthy in self.healthy if healthy != key]
+                self.status[key] = {'healthy': False, 'lag': None,
+                                    'error': str(context.original_exception).splitlines()[0]}
+
+    def _start_checks(self):
+        # Start this process's check thread, again in a forked worker (the
+        # parent's thread does not survive the fork)
+        with self._lock:
+            if not self.keys or self._checker == (os.getpid(), self._generation):
+                return
+            self._checker = (os.getpid(), self._generation)
+            self._wake.clear()
+            thread = threading.Thread(target=self._check_loop, args=(self._generation,),
+                                      name='replica-checks', daemon=True)
+        thread.start()
+
+    def _check_loop(self, generation):
+        while generation == self._generation:
+            try:
+                self.check()
+            except Exception:
+                self.app.logger.exception('Replica health check failed')
+            self._wake.wait(self.app.config['REPLICA_CHECK_INTERVAL'])
+
+    def choose(self):
+        # Round-robin over the healthy replicas, None when there are none
+        self._start_checks()
+        with self._lock:
+            if not self.healthy:
+                return None
+            key = self.healthy[self._next % len(self.healthy)]
+            self._next += 1
+            return key
+
+    # Routing
+
+    def _route_request(self):
+        g.db_replica = None
+        if not self.keys:
+            return
+        config = self.app.config
+        if request.endpoint in config['REPLICA_PRIMARY_ENDPOINTS']:
+            return
+        if request.method not in READ_METHODS and request.endpoint not in config['REPLICA_READ_ENDPOINTS']:
+            return
+        try:
+            if float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time():
+                return
+        except ValueError:
+            pass
+        g.db_replica = self.choose()
+
+    def bind_for(self, db_session, clause):
+        # The replica engine for this statement, or None for the primary
+        if not has_request_context():
+            return None
+        if is_write(db_session, clause):
+            g.db_wrote = True
+            g.db_replica = None
+            return None
+        key = g.get('db_replica')
+        return self.engine(key) if key is not None else None
+
+    def use_primary(self):
+        # Read the rest of this request from the primary, for results shared
+        # with other browsers (cache fills, index rebuilds)
+        if has_request_context():
+            g.db_replica = None
+
+    def _remember_write(self, response):
+        if self.keys and g.get('db_wrote'):
+            seconds = self.app.config['READ_AFTER_WRITE_SECONDS']
+            response.set_cookie(PRIMARY_COOKIE, str(round(time.time() + seconds, 3)), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(self.status.get(key, {'healthy': None})) for key in self.keys}
+
+
+def create_replicas_cli(router):
+    cli = AppGroup('replicas', help='Read replica health.')
+
+    @cli.command('status')
+    def status_command():
+        if not router.keys:
+            click.echo('no replicas configured (REPLICA_DATABASE_URIS)')
+            return
+        router.check()
+        for key, status in router.snapshot().items():
+            state = 'healthy' if status['healthy'] else 'unhealthy'
+            detail = status.get('error') or f"lag {status['lag']}s, {status['check_ms']} ms"
+            click.echo(f'{key}: {state} ({detail})')
+        if not router.healthy:
+            raise SystemExit(1)
+
+    return cli
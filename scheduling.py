@@ -0,0 +1,198 @@
+#----------------------------------------------------------------------------#
+# Show scheduling.
+#
+# A show occupies its venue and its artist from start_time to end_time
+# (half-open: a show may start when the previous one ends). Two shows
+# overlapping at the same venue or with the same artist are a conflict.
+#
+# No show lasts longer than MAX_SHOW_MINUTES, so the shows that can overlap
+# [start, end) all start within (start - MAX_SHOW_MINUTES, end): one bounded
+# range scan of the (venue_id, start_time) or (artist_id, start_time) index,
+# however many shows the venue or artist has. On PostgreSQL the exclusion
+# constraints added by migration f3a7d1c9b2e4 also reject conflicts that
+# two concurrent requests would each miss.
+#
+#   GET /api/v1/availability?venue_id=3&from=2026-11-01&to=2026-12-01
+#   flask schedule check    # list the conflicting shows already stored
+#----------------------------------------------------------------------------#
+
+import bisect
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+
+DEFAULT_SHOW_MINUTES = 120
+MIN_SHOW_MINUTES = 15
+MAX_SHOW_MINUTES = 12 * 60
+
+
+def overlaps(start, end, other_start, other_end):
+    return other_start < end and other_end > start
+
+
+class PendingShows:
+    # Intervals not yet in the database (a bulk import chunk being
+    # validated), per venue and per artist, sorted by start time
+
+    def __init__(self, max_duration=timedelta(minutes=MAX_SHOW_MINUTES)):
+        self.max_duration = max_duration
+        self.clear()
+
+    def clear(self):
+        self._intervals = {}
+
+    def add(self, venue_id, artist_id, start, end):
+        for key in (('venue', venue_id), ('artist', artist_id)):
+            bisect.insort(self._intervals.setdefault(key, []), (start, end))
+
+    def conflicts(self, venue_id, artist_id, start, end):
+        # The kinds ('venue', 'artist') that [start, end) clashes with
+        found = []
+        for kind, key in (('venue', venue_id), ('artist', artist_id)):
+            intervals = self._intervals.get((kind, key), ())
+            position = bisect.bisect_right(intervals, (start - self.max_duration,))
+            for other_start, other_end in intervals[position:]:
+                if other_start >= end:
+                    break
+                if overlaps(start, end, other_start, other_end):
+                    found.append(kind)
+                    break
+        return found
+
+
+class Schedule:
+
+    def __init__(self, db, Shows, max_duration=timedelta(minutes=MAX_SHOW_MINUTES)):
+        self.db = db
+        self.Shows = Shows
+        self.max_duration = max_duration
+        # Built once with bound parameters: the check runs on every show
+        # listed and imported, and building an ORM query costs more than
+        # the two index range scans it runs
+        self._conflicts = db.select(
+            Shows.id, Shows.venue_id, Shows.artist_id, Shows.start_time, Shows.end_time,
+        ).where(db.or_(self._overlapping(Shows.venue_id, db.bindparam('venue_id')),
+                       self._overlapping(Shows.artist_id, db.bindparam('artist_id')))
+        ).order_by(Shows.start_time, Shows.id)
+
+    def _overlapping(self, column, value):
+        Shows, db = self.Shows, self.db
+        return db.and_(column == value,
+                       Shows.start_time > db.bindparam('earliest'),
+                       Shows.start_time < db.bindparam('end'),
+                       Shows.end_time > db.bindparam('start'))
+
+    def conflicts(self, venue_id, artist_id, start, end, exclude_id=None):
+        # Stored shows overlapping [start, end) at the venue or with the
+        # artist, in one query
+        statement = self._conflicts
+        if exclude_id is not None:
+            statement = statement.where(self.Shows.id != exclude_id)
+        return self.db.session.execute(statement, {
+            'venue_id': venue_id, 'artist_id': artist_id,
+            'earliest': start - self.max_duration, 'start': start, 'end': end,
+        }).all()
+
+    def conflicts_for(self, shows):
+        # For each (venue_id, artist_id, start, end) of `shows`, the stored
+        # shows it would overlap, from one range query over all of them
+        Shows, db = self.Shows, self.db
+        if not shows:
+            return []
+        venue_ids = {show[0] for show in shows}
+        artist_ids = {show[1] for show in shows}
+        earliest = min(show[2] for show in shows)
+        rows = db.session.query(
+            Shows.id, Shows.venue_id, Shows.artist_id, Shows.start_time, Shows.end_time,
+        ).filter(
+            db.or_(Shows.venue_id.in_(venue_ids), Shows.artist_id.in_(artist_ids)),
+            Shows.start_time > earliest - self.max_duration,
+            Shows.start_time < max(show[3] for show in shows),
+            Shows.end_time > earliest,
+        ).order_by(Shows.start_time, Shows.id).all()
+        stored = {}
+        for row in rows:
+            for key in (('venue', row.venue_id), ('artist', row.artist_id)):
+                stored.setdefault(key, []).append(row)
+        starts = {key: [row.start_time for row in candidates] for key, candidates in stored.items()}
+        found = []
+        for venue_id, artist_id, start, end in shows:
+            clashes = {}
+            for key in (('venue', venue_id), ('artist', artist_id)):
+                candidates = stored.get(key, ())
+                position = bisect.bisect_right(starts.get(key, ()), start - self.max_duration)
+                for row in candidates[position:]:
+                    if row.start_time >= end:
+                        break
+                    if overlaps(start, end, row.start_time, row.end_time):
+                        clashes[row.id] = row
+            found.append(sorted(clashes.values(), key=lambda row: (row.start_time, row.id)))
+        return found
+
+    def busy(self, column, ids, start, end):
+        # {id: [(start, end), ...]} of the shows overlapping [start, end) for
+        # each of `ids` (venue or artist ids, by `column`), in one query
+        Shows = self.Shows
+        busy = {owner: [] for owner in ids}
+        rows = self.db.session.query(column, Shows.start_time, Shows.end_time).filter(
+            column.in_(list(busy)),
+            Shows.start_time > start - self.max_duration,
+            Shows.start_time < end,
+            Shows.end_time > start,
+        ).order_by(column, Shows.start_time)
+        for owner, show_start, show_end in rows:
+            busy[owner].append((show_start, show_end))
+        return busy
+
+    def free_slots(self, column, ids, start, end, min_length=timedelta(0)):
+        # {id: [(start, end), ...]}: the gaps between the shows in
+        # [start, end) at least `min_length` long
+        slots = {}
+        for owner, intervals in self.busy(column, ids, start, end).items():
+            free, cursor = [], start
+            for show_start, show_end in intervals:
+                if show_start > cursor and show_start - cursor >= min_length:
+                    free.append((cursor, show_start))
+                cursor = max(cursor, show_end)
+            if end > cursor and end - cursor >= min_length:
+                free.append((cursor, end))
+            slots[owner] = free
+        return slots
+
+    def stored_conflicts(self, column, limit=None):
+        # (show id, show id) pairs of overlapping shows sharing `column`
+        # (Shows.venue_id or Shows.artist_id): for each show, the later
+        # shows starting before it ends, one index range scan per show
+        Shows, db = self.Shows, self.db
+        other = db.aliased(Shows)
+        query = db.session.query(Shows.id, other.id).join(other, db.and_(
+            getattr(other, column.key) == column,
+            other.start_time >= Shows.start_time,
+            other.start_time < Shows.end_time,
+            db.or_(other.start_time > Shows.start_time, other.id > Shows.id),
+        )).order_by(Shows.id, other.id)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+
+def create_schedule_cli(schedule):
+    cli = AppGroup('schedule', help='Check show schedules for conflicts.')
+
+    @cli.command('check')
+    @click.option('--limit', default=100, show_default=True, help='Pairs listed per kind.')
+    def check_command(limit):
+        Shows = schedule.Shows
+        total, truncated = 0, False
+        for name, column in (('venue', Shows.venue_id), ('artist', Shows.artist_id)):
+            pairs = schedule.stored_conflicts(column, limit=limit)
+            total += len(pairs)
+            truncated = truncated or len(pairs) == limit
+            for first, second in pairs:
+                click.echo(f'shows {first} and {second} overlap with the same {name}')
+        click.echo(f'{total} conflicting pairs' + (' (lists truncated)' if truncated else ''))
+        if total:
+            raise SystemExit(1)
+
+    return cli
@@ -0,0 +1,237 @@
+#----------------------------------------------------------------------------#
+# Search.
+#
+# Case-insensitive partial matching over name, city, state and genres for
+# venues and artists, ranked with name hits first. PostgreSQL queries are
+# served by the pg_trgm GIN indexes from migration 3c1f2b7d9a41; other
+# databases (SQLite in tests) fall back to an in-memory trigram index with
+# the same API. Name typeahead is a prefix query on every database.
+# Deleted rows (deleted_at set, see deletions.py) never match.
+#----------------------------------------------------------------------------#
+
+from collections import defaultdict
+
+
+SEARCH_FIELDS = ('name', 'city', 'state', 'genres')
+
+
+def trigrams(text):
+    # Padded trigrams of a lowercased string, as pg_trgm builds them
+    text = f"  {text.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a, b):
+    # Jaccard similarity of two trigram sets (pg_trgm's similarity())
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+class SearchResult(dict):
+    # {"count": total hits, "data": [{"id", "name", "num_upcoming_shows"}]}
+    def __init__(self, count, data):
+        super().__init__(count=count, data=data)
+
+
+class TrigramSearch:
+    # Ranked search pushed entirely into PostgreSQL: the hit count (a window
+    # function) and the page of rows with their stored upcoming show counts
+    # come back in a single round trip.
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def invalidate(self):
+        pass    # the database indexes are always current
+
+    def search(self, term, page=1, per_page=20):
+        db, model = self.db, self.model
+        pattern = f"%{escape_like(term)}%"
+        columns = [getattr(model, field) for field in SEARCH_FIELDS]
+
+        rank = db.case((model.name.ilike(pattern, escape='\\'), 2.0), else_=0.0) \
+            + db.func.similarity(model.name, term)
+
+        rows = db.session.query(
+            model.id, model.name,
+            model.upcoming_shows_count.label('num_upcoming_shows'),
+            db.func.count().over().label('total'),
+        ).filter(
+            model.deleted_at.is_(None),
+            db.or_(*(column.ilike(pattern, escape='\\') for column in columns))
+        ).order_by(rank.desc(), model.name, model.id
+        ).limit(per_page).offset((page - 1) * per_page).all()
+
+        total = rows[0].total if rows else 0
+        if not rows and page > 1:
+            # Past the last page the window count is unavailable
+            total = db.session.query(model.id).filter(
+                model.deleted_at.is_(None),
+                db.or_(*(column.ilike(pattern, escape='\\') for column in columns))
+            ).count()
+        return SearchResult(total, [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows,
+        } for row in rows])
+
+
+class InMemorySearch:
+    # Pure-Python trigram inverted index for databases without pg_trgm.
+    # Candidates are the intersection of the posting lists of the term's
+    # trigrams, then verified as substrings, so a lookup only touches rows
+    # sharing every trigram with the term. The index is built lazily from
+    # one query and rebuilt after invalidate() is called by the write paths.
+    # `on_build` runs before that query, e.g. to read it from the primary.
+
+    def __init__(self, db, model, on_build=None):
+        self.db = db
+        self.model = model
+        self.on_build = on_build
+        self._docs = None
+        self._postings = None
+
+    def invalidate(self):
+        self._docs = None
+        self._postings = None
+
+    def _build(self):
+        if self.on_build is not None:
+            self.on_build()
+        columns = [getattr(self.model, field) for field in SEARCH_FIELDS]
+        docs = {}
+        postings = defaultdict(set)
+        rows = self.db.session.query(self.model.id, *columns).filter(self.model.deleted_at.is_(None))
+        for row in rows:
+            values = [(value or '').lower() for value in row[1:]]
+            docs[row[0]] = values
+            for value in values:
+                for gram in trigrams(value):
+                    postings[gram].add(row[0])
+        self._docs, self._postings = docs, postings
+
+    def _candidates(self, needle):
+        # Interior trigrams only: padding trigrams would require the term to
+        # sit at a word boundary, which substring matching does not.
+        grams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+        if not grams:
+            return self._docs.keys()
+        sets = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*sets)
+
+    def search(self, term, page=1, per_page=20):
+        if self._docs is None:
+            self._build()
+        needle = term.lower()
+        hits = []
+        for doc_id in self._candidates(needle):
+            name, *rest = self._docs[doc_id]
+            if needle in name:
+                hits.append((2.0 + similarity(name, needle), name, doc_id))
+            elif any(needle in value for value in rest):
+                hits.append((similarity(name, needle), name, doc_id))
+        hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+
+        page_ids = [doc_id for _, _, doc_id in hits[(page - 1) * per_page:page * per_page]]
+        return SearchResult(len(hits), self._fetch(page_ids))
+
+    def _fetch(self, ids):
+        # Names and upcoming show counts for one page of hits, in one query
+        if not ids:
+            return []
+        model = self.model
+        rows = self.db.session.query(
+            model.id, model.name, model.upcoming_shows_count,
+        ).filter(model.id.in_(ids), model.deleted_at.is_(None)).all()
+        by_id = {row[0]: row for row in rows}
+        return [{
+            "id": doc_id,
+            "name": by_id[doc_id][1],
+            "num_upcoming_shows": by_id[doc_id][2],
+        } for doc_id in ids if doc_id in by_id]
+
+
+class PrefixSearch:
+    # Names starting with a prefix, queried on every lookup so that each
+    # worker process sees the rows the others created, renamed or deleted.
+    # A range scan of the live lower(name) index from prefix_index().
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+
+    def lookup(self, prefix, limit=10):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        db, model = self.db, self.model
+        key = db.func.lower(model.name)
+        query = db.session.query(model.id, model.name, model.city, model.state).filter(
+            model.deleted_at.is_(None), key.like(escape_like(prefix) + '%', escape='\\'))
+        if db.engine.dialect.name == 'sqlite' and ord(prefix[-1]) < 0x10FFFF:
+            # SQLite only indexes LIKE under NOCASE; in its byte order the
+            # names with the prefix are one range of the index
+            query = query.filter(key >= prefix, key < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        rows = query.order_by(key, model.id).limit(limit)
+        return [{"id": row.id, "name": row.name, "city": row.city, "state": row.state} for row in rows]
+
+
+class Search:
+    # Picks the backend from the bound engine on first use, since the
+    # database URI is only known once the app config has been loaded.
+
+    def __init__(self, db, model, on_build=None):
+        self._args = (db, model)
+        self._on_build = on_build
+        self._backend = None
+        self.prefix_search = PrefixSearch(db, model)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            db = self._args[0]
+            if db.engine.dialect.name == 'postgresql':
+                self._backend = TrigramSearch(*self._args)
+            else:
+                self._backend = InMemorySearch(*self._args, on_build=self._on_build)
+        return self._backend
+
+    def search(self, term, page=1, per_page=20):
+        return self.backend.search(term.strip(), page=page, per_page=per_page)
+
+    def typeahead(self, prefix, limit=10):
+        return self.prefix_search.lookup(prefix, limit=limit)
+
+    def invalidate(self):
+        if self._backend is not None:
+            self._backend.invalidate()
+
+
+def trigram_indexes(db, table):
+    # GIN pg_trgm indexes over SEARCH_FIELDS, for a model's __table_args__,
+    # covering the rows not deleted. Other dialects ignore the postgresql_*
+    # options and get plain indexes.
+    return tuple(
+        db.Index(f'ix_{table}_{field}_trgm', field, postgresql_using='gin',
+                 postgresql_ops={field: 'gin_trgm_ops'},
+                 postgresql_where=db.text('deleted_at IS NULL'))
+        for field in SEARCH_FIELDS
+    )
+
+
+def prefix_index(db, model):
+    # Index on lower(name) over the live rows, serving PrefixSearch.
+    # text_pattern_ops lets PostgreSQL use it for LIKE 'prefix%' whatever
+    # the database collation.
+    table = model.__tablename__
+    return db.Index(f'ix_{table}_name_prefix', db.func.lower(model.name).label('name_lower'),
+                    postgresql_ops={'name_lower': 'text_pattern_ops'},
+                    postgresql_where=db.text('deleted_at IS NULL'), sqlite_where=db.text('deleted_at IS NULL'))
+
+
+def escape_like(term):
+    # Make %, _ and \ in user input match literally inside LIKE patterns
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
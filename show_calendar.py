@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Show calendar.
+#
+# A maintained summary table (ShowCalendar) holding one row per show with
+# the venue and artist fields the show listings display, indexed by start
+# time and by (city, state, start_time), plus a (genre, start_time) table of
+# the artists' genres. /shows and /api/v1/shows read only these tables.
+#
+# Rows are maintained incrementally in the transaction of each write: a new
+# show inserts its rows, a venue or artist edit rewrites the copies on its
+# shows. The whole table can be rebuilt from the base tables with
+#
+#   flask calendar refresh
+#
+# which bulk loads use, and which also repairs any drift. The shows of a
+# deleted venue or artist stay until purged (deletions.py); readers filter
+# them out with visible().
+#----------------------------------------------------------------------------#
+
+import click
+from flask.cli import AppGroup
+
+from deletions import deleted_ids
+
+
+class ShowCalendar:
+
+    def __init__(self, db, Entry, genre_table, Venue, Artist, Shows, Genre):
+        self.db = db
+        self.Entry = Entry
+        self.genres = genre_table
+        self.Venue, self.Artist, self.Shows, self.Genre = Venue, Artist, Shows, Genre
+
+    def _entries(self):
+        # SELECT producing calendar rows from the base tables
+        Venue, Artist, Shows = self.Venue, self.Artist, self.Shows
+        return self.db.select(
+            Shows.id, Shows.start_time,
+            Shows.venue_id, Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'),
+            Venue.city, Venue.state,
+            Shows.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+        ).join_from(Shows, Venue, Venue.id == Shows.venue_id
+        ).join(Artist, Artist.id == Shows.artist_id)
+
+    def _genre_rows(self):
+        # SELECT producing (show_id, genre, start_time) from the artist's genres
+        Shows, Genre = self.Shows, self.Genre
+        links = self.Artist.genre_list.property.secondary
+        return self.db.select(Shows.id, Genre.name, Shows.start_time
+        ).join_from(Shows, links, links.c.artist_id == Shows.artist_id
+        ).join(Genre, Genre.id == links.c.genre_id)
+
+    def _insert(self, where=None):
+        entry_columns = (
+            'show_id', 'start_time', 'venue_id', 'venue_name', 'venue_image_link',
+            'city', 'state', 'artist_id', 'artist_name', 'artist_image_link',
+        )
+        entries, genres = self._entries(), self._genre_rows()
+        if where is not None:
+            entries, genres = entries.where(where), genres.where(where)
+        self.db.session.execute(self.Entry.__table__.insert().from_select(entry_columns, entries))
+        self.db.session.execute(self.genres.insert().from_select(
+            ('show_id', 'genre', 'start_time'), genres))
+
+    # Incremental maintenance, called inside the write's transaction
+
+    def add_show(self, show):
+        self.db.session.flush()     # the show needs its id, links must be written
+        self._insert(self.Shows.id == show.id)
+
+    def venue_changed(self, venue):
+        self.db.session.flush()
+        table = self.Entry.__table__
+        self.db.session.execute(table.update().where(table.c.venue_id == venue.id).values(
+            venue_name=venue.name, venue_image_link=venue.image_link,
+            city=venue.city, state=venue.state,
+        ))
+
+    def artist_changed(self, artist):
+        self.db.session.flush()
+        table = self.Entry.__table__
+        self.db.session.execute(table.update().where(table.c.artist_id == artist.id).values(
+            artist_name=artist.name, artist_image_link=artist.image_link,
+        ))
+        # Genres may have changed: rewrite this artist's genre rows
+        show_ids = self.db.select(self.Shows.id).where(self.Shows.artist_id == artist.id)
+        self.db.session.execute(self.genres.delete().where(self.genres.c.show_id.in_(show_ids)))
+        genres = self._genre_rows().where(self.Shows.artist_id == artist.id)
+        self.db.session.execute(self.genres.insert().from_select(
+            ('show_id', 'genre', 'start_time'), genres))
+
+    def remove_shows(self, show_ids):
+        # Rows of shows being deleted, in the caller's transaction
+        self.db.session.execute(self.genres.delete().where(self.genres.c.show_id.in_(show_ids)))
+        table = self.Entry.__table__
+        self.db.session.execute(table.delete().where(table.c.show_id.in_(show_ids)))
+
+    # Reading
+
+    def visible(self):
+        # Filter clause leaving out the shows of deleted venues and artists;
+        # the rows awaiting purge are few, found through a partial index
+        Entry, db = self.Entry, self.db
+        return db.and_(Entry.venue_id.notin_(deleted_ids(db, self.Venue)),
+                       Entry.artist_id.notin_(deleted_ids(db, self.Artist)))
+
+    # Full rebuild
+
+    def refresh(self):
+        self.db.session.execute(self.genres.delete())
+        self.db.session.execute(self.Entry.__table__.delete())
+        self._insert()
+
+
+def create_calendar_cli(calendar, on_refresh=None):
+    cli = AppGroup('calendar', help='Maintain the show calendar table.')
+
+    @cli.command('refresh')
+    def refresh_command():
+        calendar.refresh()
+        calendar.db.session.commit()
+        if on_refresh is not None:
+            on_refresh()
+        count = calendar.db.session.query(calendar.Entry).count()
+        click.echo(f'{count} shows in the calendar')
+
+    return cli
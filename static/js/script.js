@@ -2,3 +2,34 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead for id inputs: <input list="..." data-typeahead="/venues/typeahead">
+// fills its datalist with the names starting with what was typed; picking
+// one puts its id in the input.
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-typeahead]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    input.addEventListener('input', function () {
+      var term = input.value.trim();
+      clearTimeout(timer);
+      if (!term || /^\d+$/.test(term)) {
+        return;
+      }
+      timer = setTimeout(function () {
+        fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(term))
+          .then(function (response) { return response.json(); })
+          .then(function (matches) {
+            list.innerHTML = '';
+            matches.forEach(function (match) {
+              var option = document.createElement('option');
+              option.value = match.id;
+              option.label = match.name + ' (' + match.city + ', ' + match.state + ')';
+              list.appendChild(option);
+            });
+          });
+      }, 150);
+    });
+  });
+});
@@ -0,0 +1,64 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as fyyur  # noqa: E402
+
+CITIES = (('San Francisco', 'CA'), ('New York', 'NY'), ('Fort Worth', 'TX'))
+
+
+@pytest.fixture
+def app(tmp_path):
+    # The app on a fresh SQLite database, with the per-process caches empty;
+    # config changed by a test is restored afterwards
+    config = dict(fyyur.app.config)
+    fyyur.app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        QUERY_BUDGET_STRICT=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'fyyur.db'}",
+    )
+    with fyyur.app.app_context():
+        fyyur.db.create_all()
+        fyyur.page_cache.clear()
+        for search in (fyyur.venue_search, fyyur.artist_search):
+            search.invalidate()
+        yield fyyur.app
+        fyyur.db.session.remove()
+        fyyur.db.engine.dispose()
+    fyyur.app.config.clear()
+    fyyur.app.config.update(config)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def catalog(app):
+    # 12 venues, 6 artists and 60 shows, half past and half upcoming, with
+    # the counters and the show calendar up to date. Each venue has shows
+    # with five different artists and each artist at ten different venues.
+    db = fyyur.db
+    venues = [fyyur.Venue(name=f'Venue {i}', city=CITIES[i % 3][0], state=CITIES[i % 3][1],
+                          address='1 Main St', seeking_talent=i % 2 == 0) for i in range(12)]
+    artists = [fyyur.Artist(name=f'Artist {i}', city='San Francisco', state='CA',
+                            seeking_venue=True) for i in range(6)]
+    for i, entity in enumerate(venues + artists):
+        fyyur.assign_genres(entity, ['Jazz', 'Rock n Roll'] if i % 2 else ['Jazz'])
+        db.session.add(entity)
+        db.session.flush()      # new genres are looked up by the next one
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for i in range(60):
+        db.session.add(fyyur.Shows(venue_id=venues[i % 12].id, artist_id=artists[(i + i // 12) % 6].id,
+                                   start_time=now + timedelta(days=i - 30, hours=i % 5)))
+    db.session.commit()
+    fyyur.show_counters.check(repair=True)
+    fyyur.show_calendar.refresh()
+    db.session.commit()
+    return {'venues': [venue.id for venue in venues], 'artists': [artist.id for artist in artists]}
@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.mark.parametrize('value', ['2026-11-01T00:00:00Z', '2026-11-01T00:00:00+02:00'])
+def test_availability_rejects_aware_times(client, catalog, value):
+    response = client.get('/api/v1/availability',
+                          query_string={'venue_id': catalog['venues'][0], 'from': value})
+    assert response.status_code == 400
+    assert 'UTC offset' in response.get_json()['error']['message']
+
+
+@pytest.mark.parametrize('minutes', ['-1', '999999999999', str(93 * 24 * 60)])
+def test_availability_rejects_out_of_range_min_minutes(client, catalog, minutes):
+    response = client.get(f"/api/v1/availability?venue_id={catalog['venues'][0]}&min_minutes={minutes}")
+    assert response.status_code == 400
+
+
+def test_availability_rejects_period_past_the_calendar(client, catalog):
+    response = client.get(f"/api/v1/availability?venue_id={catalog['venues'][0]}&from=9999-12-31")
+    assert response.status_code == 400
+
+
+def test_availability_lists_free_slots(client, catalog):
+    venue_id = catalog['venues'][0]
+    response = client.get(f'/api/v1/availability?venue_id={venue_id}'
+                          '&from=2026-11-01&to=2026-11-02&min_minutes=60')
+    assert response.status_code == 200
+    [venue] = response.get_json()['data']['venues']
+    assert venue['id'] == venue_id and venue['free']
@@ -0,0 +1,29 @@
+from flask import Flask
+
+from cache import PageCache
+
+
+def test_tags_keep_their_version_from_when_they_were_added():
+    app = Flask(__name__)
+    page_cache = PageCache(app)
+    artist = {'name': 'Old name'}
+    renders = []
+
+    @app.route('/venue')
+    @page_cache.cached('venue:1')
+    def venue():
+        name = artist['name']
+        page_cache.tag('artist:1')
+        if not renders:
+            # An edit committed after the artist was read and tagged, while
+            # the page is still being rendered
+            artist['name'] = 'New name'
+            page_cache.invalidate('artist:1')
+        renders.append(name)
+        return name
+
+    client = app.test_client()
+    assert client.get('/venue').data == b'Old name'
+    assert client.get('/venue').data == b'New name'     # the old page is stale
+    assert client.get('/venue').data == b'New name'
+    assert renders == ['Old name', 'New name']          # and the new one cached
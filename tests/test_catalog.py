@@ -0,0 +1,75 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import app as fyyur
+
+
+def test_import_skips_lines_that_are_not_json_objects(app, tmp_path):
+    path = tmp_path / 'venues.jsonl'
+    path.write_text(
+        '{"name": "Venue A", "city": "Austin", "state": "TX", "address": "1 Main St", "genres": "Jazz",'
+        ' "facebook_link": "https://www.facebook.com/a"}\n'
+        '{"name": "Venue B", "city": \n'
+        '["not", "an", "object"]\n'
+        '{"name": "Venue C", "city": "Austin", "state": "TX", "address": "2 Main St", "genres": "Jazz",'
+        ' "facebook_link": "https://www.facebook.com/c"}\n')
+    errors = tmp_path / 'errors.txt'
+    result = app.test_cli_runner().invoke(
+        args=['catalog', 'import', 'venues', str(path), '--errors', str(errors)])
+    assert result.exit_code == 0, result.output
+    assert 'venues: 2 imported, 2 rejected' in result.output
+    assert [line.split(': ')[0] for line in errors.read_text().splitlines()] == [f'{path}:2', f'{path}:3']
+    assert sorted(name for (name,) in fyyur.db.session.query(fyyur.Venue.name)) == ['Venue A', 'Venue C']
+
+
+def import_shows(app, path, lines):
+    # Runs the import, returning the rejected lines and the SELECTs it ran
+    path.write_text(''.join(json.dumps(line) + '\n' for line in lines))
+    errors = path.with_suffix('.errors')
+    selects = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            selects.append(statement)
+
+    event.listen(fyyur.db.engine, 'before_cursor_execute', count)
+    try:
+        result = app.test_cli_runner().invoke(
+            args=['catalog', 'import', 'shows', str(path), '--errors', str(errors)])
+    finally:
+        event.remove(fyyur.db.engine, 'before_cursor_execute', count)
+    assert result.exit_code == 0, result.output
+    lines = errors.read_text().splitlines() if errors.exists() else []
+    rejected = [line.split(': ', 1)[1] for line in lines]
+    return rejected, len(selects)
+
+
+def test_show_import_checks_each_chunk_in_bulk(app, catalog, tmp_path):
+    venues, artists = catalog['venues'], catalog['artists']
+    stored = fyyur.db.session.query(fyyur.Shows.id, fyyur.Shows.artist_id, fyyur.Shows.start_time).filter_by(
+        venue_id=venues[0]).order_by(fyyur.Shows.start_time).first()
+    start = datetime(2040, 1, 1, 20)
+
+    def show(venue, artist, days, **extra):
+        return dict(venue_id=venue, artist_id=artist, duration=60,
+                    start_time=(start + timedelta(days=days)).isoformat(), **extra)
+
+    rejected, selects = import_shows(app, tmp_path / 'small.jsonl', [
+        show(venues[0], artists[0], 0),
+        show(venues[1], artists[0], 0),                         # same artist, same time
+        show(99999, artists[1], 1),
+        dict(show(venues[2], stored.artist_id, 0), start_time=stored.start_time.isoformat()),
+    ])
+    assert rejected == [
+        "overlaps an earlier row's show with the same artist",
+        'venue_id: There is no venue with this ID.',
+        f'overlaps show {stored.id}',
+    ]
+    # Lookups per chunk, not per row
+    rejected, more_selects = import_shows(app, tmp_path / 'large.jsonl', [
+        show(venues[i % 12], artists[i % 6], 10 + i) for i in range(40)])
+    assert rejected == []
+    assert more_selects == selects
+    assert fyyur.Shows.query.count() == 60 + 1 + 40
@@ -0,0 +1,32 @@
+import pytest
+
+import app as fyyur
+from geo import city_name
+
+
+@pytest.mark.parametrize('typed, stored', [
+    ('lake placid', 'Lake Placid'),
+    ('LAKE  PLACID ', 'Lake Placid'),
+    ('Lake Placid', 'Lake Placid'),
+    ('McKinney', 'McKinney'),
+])
+def test_unknown_cities_are_case_normalized(typed, stored):
+    assert city_name(typed) == stored
+
+
+def test_locate_all_respells_unknown_cities(app):
+    db, Venue = fyyur.db, fyyur.Venue
+    for city in ('lake placid', 'Lake Placid', 'fort worth'):
+        db.session.add(Venue(name=f'Venue in {city}', city=city, state='NY', address='1 Main St'))
+    db.session.commit()
+    assert fyyur.venue_locator.locate_all() == (0, 2)
+    db.session.commit()
+    assert sorted(city for (city,) in db.session.query(Venue.city)) == ['Fort Worth', 'Lake Placid', 'Lake Placid']
+
+
+def test_nearby_finds_the_venues_of_the_covering_cells(app, catalog):
+    fyyur.venue_locator.locate_all()
+    fyyur.db.session.commit()
+    venues = fyyur.venue_locator.nearby(37.7749, -122.4194, 25)
+    assert sorted(venue['name'] for venue in venues) == ['Venue 0', 'Venue 3', 'Venue 6', 'Venue 9']
+    assert fyyur.venue_locator.nearby(32.7555, -97.3308, 5)[0]['city'] == 'Fort Worth'
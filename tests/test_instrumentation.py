@@ -0,0 +1,14 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import app as fyyur
+
+
+def test_failed_statements_leave_no_start_time_on_the_connection(app):
+    with fyyur.db.engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM no_such_table'))
+        connection.execute(text('SELECT 1'))
+        assert 'query_start' not in connection.info
@@ -0,0 +1,20 @@
+import pytest
+
+
+def test_venues_pages_through_each_area(app, client, catalog):
+    app.config['VENUES_PER_AREA'] = 3
+    first, second = client.get('/venues').data, client.get('/venues?page=2').data
+    assert b'Venue 0<' in first and b'Venue 9<' not in first
+    assert b'Venue 9<' in second and b'Venue 0<' not in second
+    assert client.get('/venues?page=1000').status_code == 200
+
+
+@pytest.mark.parametrize('url', [
+    '/venues?page=1001',
+    '/venues?page=99999999999999999999',
+    '/venues/search?search_term=venue&page=99999999999999999999',
+    '/artists/search?search_term=artist&page=99999999999999999999',
+    '/api/v1/venues/search?q=venue&page=99999999999999999999',
+])
+def test_pages_past_the_last_allowed_are_rejected(client, catalog, url):
+    assert client.get(url).status_code == 400
@@ -0,0 +1,4 @@
+def test_metrics_are_off_unless_enabled(app, client):
+    assert client.get('/metrics').status_code == 404
+    app.config['METRICS_ENABLED'] = True
+    assert set(client.get('/metrics').get_json()) == {'pools', 'requests', 'replicas'}
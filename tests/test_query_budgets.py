@@ -0,0 +1,69 @@
+import pytest
+from flask import request
+
+import app as fyyur
+from instrumentation import QueryBudgetExceeded
+
+# Every page and API route with a @query_budget, with arguments; {venue} and
+# {artist} are filled with seeded ids
+ROUTES = [
+    '/venues',
+    '/venues?genre=Jazz',
+    '/venues?city=San Francisco&state=CA',
+    '/venues/{venue}',
+    '/venues/search?search_term=venue',
+    '/venues/typeahead?q=ven',
+    '/venues/nearby?city=San Francisco&state=CA',
+    '/artists',
+    '/artists?genre=Jazz',
+    '/artists/{artist}',
+    '/artists/search?search_term=artist',
+    '/artists/typeahead?q=art',
+    '/shows',
+    '/api/v1/venues',
+    '/api/v1/venues/{venue}',
+    '/api/v1/venues/search?q=venue',
+    '/api/v1/artists',
+    '/api/v1/artists/{artist}',
+    '/api/v1/artists/search?q=artist',
+    '/api/v1/venues/nearby?city=San Francisco&state=CA',
+    '/api/v1/shows/nearby?city=San Francisco&state=CA',
+    '/api/v1/availability?venue_id={venue}',
+    '/api/v1/shows',
+]
+
+
+def endpoint(app, url):
+    with app.test_request_context(url):
+        return request.endpoint
+
+
+@pytest.fixture
+def strict(app, catalog):
+    # Budgets raise (QUERY_BUDGET_STRICT, see conftest.py); pages are rendered
+    # whole, as a streamed page's queries are only counted after the response
+    # is returned, and never served from the page cache
+    app.config.update(STREAM_TEMPLATES=False, CACHE_ENABLED=False)
+    fyyur.recommender.build()
+    fyyur.db.session.commit()
+    return {'venue': catalog['venues'][0], 'artist': catalog['artists'][0]}
+
+
+@pytest.mark.parametrize('route', ROUTES)
+def test_route_stays_within_its_query_budget(app, client, strict, route):
+    url = route.format(**strict)
+    assert client.get(url).status_code == 200
+    assert app.view_functions[endpoint(app, url)].query_budget is not None
+
+
+def test_every_budgeted_route_is_listed(app):
+    covered = {endpoint(app, route.format(venue=1, artist=1)) for route in ROUTES}
+    budgeted = {endpoint for endpoint, view in app.view_functions.items()
+                if getattr(view, 'query_budget', None) is not None}
+    assert budgeted <= covered
+
+
+def test_query_over_budget_fails_the_request(app, client, strict, monkeypatch):
+    monkeypatch.setattr(app.view_functions['show_venue'], 'query_budget', 1)
+    with client, pytest.raises(QueryBudgetExceeded):     # `with client` pops the failed request
+        client.get(f"/venues/{strict['venue']}")
@@ -0,0 +1,26 @@
+import app as fyyur
+
+
+def lists(kind, source_id):
+    return fyyur.recommender.fetch(kind, source_id, 20)
+
+
+def test_new_show_queues_both_lists_for_the_refresh_command(app, client, catalog):
+    db, Queue = fyyur.db, fyyur.RecommendationQueue
+    fyyur.recommender.build()
+    db.session.commit()
+    venue_id, artist_id = catalog['venues'][2], catalog['artists'][1]   # recommended, never played
+    before = lists('artist', artist_id)
+    assert venue_id in [venue['id'] for venue in before]
+
+    data = {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2031-01-01 20:00:00'}
+    assert b'successfully listed' in client.post('/shows/create', data=data).data
+    assert sorted(db.session.query(Queue.kind, Queue.source_id)) == [('artist', artist_id), ('venue', venue_id)]
+    assert lists('artist', artist_id) == before     # not recomputed in the request
+
+    result = app.test_cli_runner().invoke(args=['recommendations', 'refresh'])
+    assert '2 recommendation lists refreshed' in result.output
+    assert db.session.query(Queue).count() == 0
+    # They now share a show, so neither is recommended to the other
+    assert venue_id not in [venue['id'] for venue in lists('artist', artist_id)]
+    assert artist_id not in [artist['id'] for artist in lists('venue', venue_id)]
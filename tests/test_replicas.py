@@ -0,0 +1,79 @@
+import shutil
+import sqlite3
+import time
+
+import pytest
+
+import app as fyyur
+from instrumentation import InstrumentedQueuePool
+
+
+@pytest.fixture
+def replica(app, catalog, tmp_path):
+    # A second SQLite database holding a copy of the seeded catalog and never
+    # updated afterwards: a replica lagging behind every later write
+    fyyur.db.session.remove()
+    fyyur.db.engine.dispose()
+    shutil.copy(tmp_path / 'fyyur.db', tmp_path / 'replica.db')
+    fyyur.replicas.configure([f"sqlite:///{tmp_path / 'replica.db'}"])
+    deadline = time.monotonic() + 5
+    while fyyur.replicas.healthy != ['replica_0']:     # first background check
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    yield
+    fyyur.replicas.configure([])
+
+
+def names(client, url):
+    return [match['name'] for match in client.get(url).get_json()]
+
+
+def rename_venue(client, venue_id, name):
+    data = {'name': name, 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+            'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/venue'}
+    response = client.post(f'/venues/{venue_id}/edit', data=data)
+    assert response.status_code == 302
+
+
+def test_read_only_requests_use_the_replica(client, catalog, replica):
+    fyyur.Venue.query.get(catalog['venues'][0]).name = 'Renamed'
+    fyyur.db.session.commit()       # outside a request: on the primary
+    assert names(client, '/venues/typeahead?q=renamed') == []
+    assert names(client, '/venues/typeahead?q=venue 0') == ['Venue 0']
+
+
+def test_writer_reads_its_own_writes(app, client, catalog, replica):
+    rename_venue(client, catalog['venues'][0], 'Renamed')
+    assert names(client, '/venues/typeahead?q=renamed') == ['Renamed']
+    assert names(app.test_client(), '/venues/typeahead?q=renamed') == []
+
+
+def test_cache_fills_and_index_rebuilds_read_the_primary(app, client, catalog, replica):
+    venue_id = catalog['venues'][0]
+    other = app.test_client()      # a browser that never wrote
+    assert b'Venue 0' in other.get(f'/venues/{venue_id}').data
+    assert b'Venue 0' in other.post('/venues/search', data={'search_term': 'venue 0'}).data
+
+    rename_venue(client, venue_id, 'Renamed')
+    for _ in range(2):      # rendered, then served from the cache
+        page = other.get(f'/venues/{venue_id}').data
+        assert b'Renamed' in page and b'Venue 0' not in page
+    assert b'Renamed' in other.post('/venues/search', data={'search_term': 'renamed'}).data
+
+
+def test_pool_metrics_are_kept_per_bind(app):
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1)
+    pool.label = 'replica_0'
+    pool.connect().close()
+    pool.recreate().connect().close()
+    pools = fyyur.db_metrics.snapshot()['pools']
+    assert pools['replica_0']['checkouts'] == 2
+    assert pools['replica_0']['capacity'] == 1 + pool._max_overflow
+
+
+def test_health_checks_stay_out_of_requests(app, client, catalog, replica):
+    # Checks run continuously in the background; none lands in a request
+    # and its query budget (strict in the tests)
+    app.config['REPLICA_CHECK_INTERVAL'] = 0.001
+    for _ in range(50):
+        assert names(client, '/venues/typeahead?q=venue 0') == ['Venue 0']
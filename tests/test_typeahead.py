@@ -0,0 +1,35 @@
+import app as fyyur
+
+
+def names(client, url):
+    return [match['name'] for match in client.get(url).get_json()]
+
+
+def test_typeahead_matches_prefix_in_name_order(client, catalog):
+    assert names(client, '/venues/typeahead?q=venue 1') == ['Venue 1', 'Venue 10', 'Venue 11']
+    assert names(client, '/artists/typeahead?q=ARTIST 2') == ['Artist 2']
+    assert names(client, '/venues/typeahead?q=%25') == []
+    assert names(client, '/venues/typeahead?q=') == []
+
+
+def test_typeahead_sees_writes_made_elsewhere(client, catalog):
+    # Rows written by another process: nothing in this one is invalidated
+    assert names(client, '/venues/typeahead?q=venue 1') == ['Venue 1', 'Venue 10', 'Venue 11']
+    db = fyyur.db
+    db.session.add(fyyur.Venue(name='Venue 1b', city='New York', state='NY'))
+    fyyur.Venue.query.get(catalog['venues'][10]).name = 'Renamed'
+    fyyur.deletions.delete(fyyur.Venue.query.get(catalog['venues'][11]))
+    db.session.commit()
+    assert names(client, '/venues/typeahead?q=venue 1') == ['Venue 1', 'Venue 1b']
+
+
+def test_show_form_rejects_ids_deleted_elsewhere(client, catalog):
+    venue_id, artist_id = catalog['venues'][0], catalog['artists'][0]
+    data = {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2031-01-01 20:00:00'}
+    assert b'successfully listed' in client.post('/shows/create', data=data).data
+    fyyur.deletions.delete(fyyur.Venue.query.get(venue_id))
+    fyyur.db.session.commit()
+    data['start_time'] = '2031-02-01 20:00:00'
+    response = client.post('/shows/create', data=data)
+    assert b'There is no venue with this ID.' in response.data
+    assert fyyur.Shows.query.filter_by(venue_id=venue_id, start_time='2031-02-01 20:00:00').count() == 0